@@ -1,19 +1,142 @@
 # client.py
 import asyncio
+import threading
+import time
+from collections import deque
 import websockets
 from dotenv import load_dotenv
 import os
 from utils.logger import logger
+from utils.metrics import metrics
 load_dotenv()
 
+PUBLISH_RATE = float(os.getenv("PUBLISH_RATE", "15"))  # game-state messages per second
+RECONNECT_DELAY = 0.5  # first reconnect delay in seconds, doubled up to MAX_RECONNECT_DELAY
+MAX_RECONNECT_DELAY = 5
+MAX_QUEUED_EVENTS = 256  # messages carrying one-off events kept while the server is unreachable
+
 async def hello(message):
     async with websockets.connect(f"ws://localhost:{os.getenv('WEBSOCKET_PORT')}") as websocket:
+        # the server does not echo messages back to their sender
         await websocket.send(message)
-        response = await websocket.recv()
-        # logger.info(f"Received from server: {response}")
 
 def send(message):
-    asyncio.get_event_loop().run_until_complete(hello(message))
+    with metrics.timed("websocket_send_seconds"):
+        asyncio.get_event_loop().run_until_complete(hello(message))
+
+
+class GameStatePublisher:
+    """
+    Publishes game-state messages over one long-lived websocket connection.
+
+    A background thread owns the connection and its event loop, reconnecting
+    with exponential backoff when the server goes away. The game calls
+    `publish` from its frame loop and the thread sends without waiting for any
+    reply. Every message is a full snapshot, so only the latest one is kept,
+    except that messages carrying one-off events such as new conversations are
+    queued and all sent, in order, before it. `due` tells the game when
+    the next message is wanted, so it can skip building game states that
+    would never be sent.
+
+    Attributes:
+        sent (int): Messages sent.
+        replaced (int): Messages replaced by a newer one before they were sent.
+        dropped (int): Event messages dropped because MAX_QUEUED_EVENTS were waiting.
+        reconnects (int): Connection attempts after the first one.
+    """
+
+    def __init__(self, url=None, rate=PUBLISH_RATE):
+        self.url = url or f"ws://localhost:{os.getenv('WEBSOCKET_PORT')}"
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.sent = 0
+        self.replaced = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self._latest = None
+        self._events = deque()
+        self._next_due = 0.0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = asyncio.Event()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            ready.set()
+            self._loop.run_until_complete(self._run())
+
+        self._thread = threading.Thread(target=run, daemon=True, name="game-state-publisher")
+        self._thread.start()
+        ready.wait()
+
+    def due(self) -> bool:
+        """Return True once the next message should be published."""
+        return time.monotonic() >= self._next_due
+
+    def publish(self, message, replaceable=True):
+        """
+        Hand a message to the publisher thread.
+
+        Parameters:
+            message (str | bytes): The encoded game state.
+            replaceable (bool): False if the message carries events that must reach the
+                spectators; it is then queued rather than replaced by the next message.
+        """
+        self.start()
+        with self._lock:
+            # a newer snapshot supersedes the unsent one either way
+            if self._latest is not None:
+                self.replaced += 1
+                self._latest = None
+            if replaceable:
+                self._latest = message
+            else:
+                if len(self._events) == MAX_QUEUED_EVENTS:
+                    self._events.popleft()
+                    self.dropped += 1
+                self._events.append(message)
+            self._next_due = time.monotonic() + self.interval
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _take(self):
+        with self._lock:
+            if self._events:
+                return self._events.popleft()
+            message, self._latest = self._latest, None
+            return message
+
+    async def _run(self):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                async with websockets.connect(self.url) as websocket:
+                    logger.info(f"Publishing game state to {self.url}")
+                    delay = RECONNECT_DELAY
+                    while True:
+                        await self._wakeup.wait()
+                        self._wakeup.clear()
+                        while (message := self._take()) is not None:
+                            with metrics.timed("websocket_send_seconds"):
+                                await websocket.send(message)
+                            self.sent += 1
+            except (OSError, websockets.WebSocketException) as e:
+                logger.debug(f"Game state connection lost ({e}), retrying in {delay}s")
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def stats(self):
+        return {"sent": self.sent, "replaced": self.replaced, "dropped": self.dropped, "reconnects": self.reconnects}
+
+
+game_state_publisher = GameStatePublisher()
 
 if __name__ == "__main__":
-    send("Hello, Server!")
\ No newline at end of file
+    send("Hello, Server!")
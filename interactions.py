@@ -24,10 +24,17 @@ import time
 from utils.logger import logger
 from villager import Villager, Werewolf, Player
 from task_manager import TaskManager
+from utils.world_events import world_events
+from utils.token_budget import token_ledger
 
 TALK_DISTANCE_THRESHOLD = 30  # Adjust as needed
 TALK_PROBABILITY = 1  # Adjust as needed
 TALK_COOLDOWN_TIME = 60  # Time in seconds for cooldown period
+OBSERVATION_COOLDOWN_TIME = 10  # Time in seconds between two observations of the same kind
+
+def cooldown(agent_id, base):
+    """Scale a cooldown by the cognition profile the agent's token budget allows."""
+    return base * token_ledger.cognition(agent_id)["cooldown_factor"]
 
 def get_nearest_task_location(villager):
     """
@@ -48,7 +55,7 @@ def get_nearest_task_location(villager):
         min_distance, nearest_location = (distance, task_location) if distance < min_distance else (min_distance, nearest_location)
     return nearest_location
 
-def handle_meeting(villagers, conversations, villager_remove):
+def handle_meeting(villagers, conversations, villager_remove, vote_log=None):
     """
     Handle the meeting where villagers discuss and vote on who they suspect is the werewolf.
 
@@ -56,6 +63,7 @@ def handle_meeting(villagers, conversations, villager_remove):
         villagers (list): List of living villagers.
         conversations (list): List to store conversations.
         villager_remove (str): Villager ID to be removed based on voting results.
+        vote_log (list): Optional list receiving a (voter, suspect) tuple per vote cast.
 
     Returns:
         tuple: A tuple indicating whether the meeting was handled and the ID of the villager to remove.
@@ -65,20 +73,24 @@ def handle_meeting(villagers, conversations, villager_remove):
     voting_results = []
     villager_remove = None
     for villager in villagers:
-        initial_obs = f"You are in a meeting with all the villagers. Tell your suspicions about who the werewolf is followed by the reason. If you have no logical reason to suspect someone then don't make up facts. ONLY CHOOSE THE VILLAGER FROM THE FOLLOWING LIST : {','.join([v.agent_id for v in villagers if v.agent_id != villager.agent_id])}\n Last day the villager eliminated was {Villager.killed_villagers[-1].agent_id if Villager.killed_villagers else 'None' + ' near ' + dead_villager_locations[-1] if Villager.killed_villagers else 'None'}"
+        suspects = [v.agent_id for v in villagers if v.agent_id != villager.agent_id]
+        initial_obs = f"You are in a meeting with all the villagers. Tell your suspicions about who the werewolf is followed by the reason. If you have no logical reason to suspect someone then don't make up facts. ONLY CHOOSE THE VILLAGER FROM THE FOLLOWING LIST : {','.join(suspects)}\n Last day the villager eliminated was {Villager.killed_villagers[-1].agent_id if Villager.killed_villagers else 'None' + ' near ' + dead_villager_locations[-1] if Villager.killed_villagers else 'None'}"
         call_to_action_template = (
             "What would {agent_name} say?\n"
             "Respond in the format 'I suspect: NAME. REASON'\n\n"
         )
         response = ""
         try:
-            _, response = villager.agent.generate_reaction(observation=initial_obs, call_to_action_template=call_to_action_template)
+            # what the villager remembers about each suspect, looked up by name without embedding anything
+            _, response = villager.agent.generate_reaction(observation=initial_obs, call_to_action_template=call_to_action_template, entity_names=suspects)
             logger.info(f"{villager.agent_id}: {response}")
             response_lines = response.strip().split('.')
             for line in response_lines:
                 if line.startswith("I suspect"):
                     agent_name = line.split(":")[1].strip()
                     voting_results.append(f"{agent_name}")
+                    if vote_log is not None:
+                        vote_log.append((villager.agent_id, agent_name))
                     break
         except Exception as e:
             logger.error(f"Error parsing response from {villager.agent_id}: {e}")
@@ -114,7 +126,7 @@ def handle_player_interaction(player, villagers, conversations):
             if player.talking or villager.talking:
                 continue
             distance = ((player.x - villager.x) ** 2 + (player.y - villager.y) ** 2) ** 0.5
-            if distance < TALK_DISTANCE_THRESHOLD and random.random() < TALK_PROBABILITY and current_time - player.last_talk_attempt_time >= TALK_COOLDOWN_TIME:
+            if distance < TALK_DISTANCE_THRESHOLD and random.random() < TALK_PROBABILITY and current_time - player.last_talk_attempt_time >= cooldown(villager.agent_id, TALK_COOLDOWN_TIME):
                 player.talking = True
                 villager.talking = True
 
@@ -140,19 +152,25 @@ def handle_dead_villager_interaction(dead_villagers, villagers, conversations):
     """
     Handle interactions when a living villager encounters a dead villager.
 
+    Every villager who sees the same body next to the same suspect, or with nobody
+    around, shares one world event, worded for each witness.
+
     Args:
         dead_villagers (list): List of dead villagers.
         villagers (list): List of living villagers.
         conversations (list): List to store conversations.
     """
     for dead_villager in dead_villagers:
+        nearest_task_location = None
+        witnesses_by_suspect = {}  # suspect id, None when nobody is near the body -> witnesses
         for villager in villagers:
             if time.time() > villager.observation_countdown:
                 distance = ((dead_villager.x - villager.x) ** 2 + (dead_villager.y - villager.y) ** 2) ** 0.5
 
                 if distance < 5 * TALK_DISTANCE_THRESHOLD:
-                    villager.observation_countdown = time.time() + 10
-                    nearest_task_location = get_nearest_task_location(dead_villager)
+                    villager.observation_countdown = time.time() + cooldown(villager.agent_id, OBSERVATION_COOLDOWN_TIME)
+                    if nearest_task_location is None:
+                        nearest_task_location = get_nearest_task_location(dead_villager)
                     someone_else = False
                     distance_dict = {}
 
@@ -169,40 +187,57 @@ def handle_dead_villager_interaction(dead_villagers, villagers, conversations):
                         logger.info(f"{villager.agent_id} sees dead villager {dead_villager.agent_id} near {nearest_task_location.task}.")
                         logger.info(f"{villager.agent_id} also sees {someone_else.agent_id} near the dead villager in {nearest_task_location.task}. Suspicion arises.")
 
-                        villager.agent.memory.add_memory(f"You see {dead_villager.agent_id} dead near {someone_else.agent_id} in {nearest_task_location.task}. You suspect {someone_else.agent_id} is the werewolf.", agent_name=villager.agent_id)
+                        witnesses = witnesses_by_suspect.setdefault(someone_else.agent_id, {})
+                        witnesses[villager.agent_id] = (villager.agent.memory, f"You see {dead_villager.agent_id} dead near {someone_else.agent_id} in {nearest_task_location.task}. You suspect {someone_else.agent_id} is the werewolf.")
                     else:
                         logger.info(f"{villager.agent_id} sees dead villager {dead_villager.agent_id} near {nearest_task_location.task}.")
-                        villager.agent.memory.add_memory(f"You see {dead_villager.agent_id} dead near {nearest_task_location.task}.", agent_name=villager.agent_id)
+                        witnesses = witnesses_by_suspect.setdefault(None, {})
+                        witnesses[villager.agent_id] = (villager.agent.memory, f"You see {dead_villager.agent_id} dead near {nearest_task_location.task}.")
+
+        for suspect, witnesses in witnesses_by_suspect.items():
+            if suspect is None:
+                world_events.record(f"{dead_villager.agent_id} was found dead near {nearest_task_location.task}.", witnesses)
+            else:
+                world_events.record(f"{dead_villager.agent_id} was found dead near {suspect} at {nearest_task_location.task}. "
+                                    f"{suspect} is suspected of being the werewolf.", witnesses)
 
 def handle_villager_location_interactions(villagers):
     """
     Handle interactions based on the location of villagers.
 
+    Villagers who see the same villager near the same task share one world event.
+
     Args:
         villagers (list): List of living villagers.
     """
+    sightings = {}
     for villager1 in villagers:
         for villager2 in villagers:
             if villager1 != villager2:
                 distance = ((villager1.x - villager2.x) ** 2 + (villager1.y - villager2.y) ** 2) ** 0.5
                 if distance < 5 * TALK_DISTANCE_THRESHOLD and time.time() > villager1.location_observation_countdown:
-                    villager1.location_observation_countdown = time.time() + 10
+                    villager1.location_observation_countdown = time.time() + cooldown(villager1.agent_id, OBSERVATION_COOLDOWN_TIME)
                     nearest_task_location = get_nearest_task_location(villager2)
                     if nearest_task_location is not None:
                         logger.info(f"{villager1.agent_id} sees {villager2.agent_id} near {nearest_task_location.task}")
-                        villager1.agent.memory.add_memory(f"You see {villager2.agent_id} near {nearest_task_location.task}", agent_name=villager1.agent_id)
+                        witnesses = sightings.setdefault((villager2.agent_id, nearest_task_location.task), {})
+                        witnesses[villager1.agent_id] = (villager1.agent.memory, f"You see {villager2.agent_id} near {nearest_task_location.task}")
+
+    for (seen, task), witnesses in sightings.items():
+        world_events.record(f"{seen} was seen near {task}", witnesses)
 
 def handle_villager_interactions(player, villagers, dead_villagers, conversations):
     """
     Handle all interactions involving villagers, including with the player, dead villagers, and other living villagers.
 
     Args:
-        player (Player): The player object.
+        player (Player): The player object, None when there is no human player.
         villagers (list): List of living villagers.
         dead_villagers (list): List of dead villagers.
         conversations (list): List to store conversations.
     """
-    handle_player_interaction(player, villagers, conversations)
+    if player is not None:
+        handle_player_interaction(player, villagers, conversations)
     handle_dead_villager_interaction(dead_villagers, villagers, conversations)
     handle_villager_location_interactions(villagers)
 
@@ -215,7 +250,7 @@ def handle_villager_interactions(player, villagers, dead_villagers, conversation
                     continue
                 distance = ((villager1.x - villager2.x) ** 2 + (villager1.y - villager2.y) ** 2) ** 0.5
                 
-                if distance < TALK_DISTANCE_THRESHOLD and random.random() < TALK_PROBABILITY and current_time - villager1.last_talk_attempt_time >= TALK_COOLDOWN_TIME:
+                if distance < TALK_DISTANCE_THRESHOLD and random.random() < TALK_PROBABILITY and current_time - villager1.last_talk_attempt_time >= cooldown(villager1.agent_id, TALK_COOLDOWN_TIME):
                     villager1.talking = True
                     villager2.talking = True
 
@@ -7,20 +7,32 @@ import os
 from dotenv import load_dotenv
 from pygame import mixer
 import time
-import deepl
 from interactions import handle_villager_interactions,handle_meeting
 from threading import Thread
 from utils.task_locations import Path
-from utils.to_be_threaded_function import threaded_function
-from client import send
+from client import game_state_publisher
+from utils import wire
 import math
-from langchain.retrievers import TimeWeightedVectorStoreRetriever
-from langchain_mongodb import MongoDBAtlasVectorSearch
 load_dotenv()
-from utils.mongoClient import get_atlas_collection, get_atlas_collections
+from utils.mongoClient import set_run_id
+import utils.mongoClient as mongoClient
 from colorama import Fore
 from villager import Villager, Werewolf, Player
+from utils.agent_state import agent_states, DIRECTIONS
+from utils.walkability import walkability
+from utils.navigation import NavGrid
 from utils.agentmemory import AgentMemory
+from utils.memory_journal import memory_journal
+from utils.local_retriever import LocalTimeWeightedRetriever
+from utils.embedding_cache import CachedEmbeddings
+from utils.memory_compaction import start_compaction_job
+from utils.memory_tiers import ColdMemoryStore
+from utils.entity_index import EntityIndex
+from utils.token_budget import token_ledger
+from utils.metrics import metrics, start_metrics_server
+from utils.storage import get_storage
+from utils.translation import create_translation_service
+from utils.checkpoint import CHECKPOINT_DIR, save_checkpoint, load_checkpoint, snapshot_villager, restore_villager, checkpoint_run_id
 from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
 
 llm = AzureChatOpenAI(
@@ -32,14 +44,27 @@ llm = AzureChatOpenAI(
 # Constants
 SCREEN_WIDTH = 1500
 SCREEN_HEIGHT = 900
-DAY_DURATION = 90  # 60 seconds for a full day cycle
-NIGHT_DURATION = 90  # 60 seconds for a full night cycle
+DAY_DURATION = int(os.getenv("DAY_DURATION", "90"))  # 60 seconds for a full day cycle
+NIGHT_DURATION = int(os.getenv("NIGHT_DURATION", "90"))  # 60 seconds for a full night cycle
 TRANSITION_DURATION = 10  # 10 seconds for a transition period
-MORNING_MEETING_DURATION = 25
+MORNING_MEETING_DURATION = int(os.getenv("MORNING_MEETING_DURATION", "25"))
+MEETING_APPROACH_DISTANCE = 120  # closer than this to their place, villagers leave the paths and walk straight
+
+# Headless games have no window, sound, spectators or human player, e.g. when run by tournament.py
+HEADLESS = os.getenv("HEADLESS", "0") == "1"
+if HEADLESS:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+GAME_SEED = os.getenv("GAME_SEED")
+if GAME_SEED:
+    random.seed(int(GAME_SEED))
+MAX_GAME_DAYS = int(os.getenv("MAX_GAME_DAYS", "0"))  # headless games stop after this many days, 0 plays until a side wins
+GAME_RESULT_PATH = os.getenv("GAME_RESULT_PATH")  # where to write the outcome of the game as JSON
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # assets are found from any working directory
 
 # Load background images
-background_day = pygame.image.load("images/map3.png")
-background_night = pygame.image.load("images/night3.png")
+background_day = pygame.image.load(os.path.join(BASE_DIR, "images/map3.png"))
+background_night = pygame.image.load(os.path.join(BASE_DIR, "images/night3.png"))
 background_day = pygame.transform.scale(background_day, (SCREEN_WIDTH, SCREEN_HEIGHT))
 background_night = pygame.transform.scale(background_night, (SCREEN_WIDTH, SCREEN_HEIGHT))
 
@@ -47,82 +72,63 @@ background_night = pygame.transform.scale(background_night, (SCREEN_WIDTH, SCREE
 '''
 Initialize the mixer
 '''
-mixer.init()
-mixer.music.load('music/music.mp3')
+if not HEADLESS:
+    mixer.init()
+    mixer.music.load(os.path.join(BASE_DIR, 'music/music.mp3'))
 
 
 '''Initialize the pygame'''
 names=["Akio","Chiyo","Hana","Izumi","Kaio"]
 werewolf_names=["Katsumi","Madara"]
-convo_collection_names=["Akio_convo","Chiyo_convo","hana_convo","Izumi_convo","Kaio_convo"]
-werewolf_convo_collection_names=["Katsumi_convo","Madara_convo"]
+# A roster plays a subset of the characters, e.g. GAME_VILLAGERS=Akio,Hana,Kaio GAME_WEREWOLVES=Madara
+villager_roster = [i for i, name in enumerate(names) if name in os.getenv("GAME_VILLAGERS", ",".join(names)).split(",")]
+werewolf_roster = [i for i, name in enumerate(werewolf_names) if name in os.getenv("GAME_WEREWOLVES", ",".join(werewolf_names)).split(",")]
+names = [names[i] for i in villager_roster]
+werewolf_names = [werewolf_names[i] for i in werewolf_roster]
+
+'''Resume from a checkpoint when RESUME_CHECKPOINT points to one'''
+RESUME_CHECKPOINT = os.getenv("RESUME_CHECKPOINT")
 
 '''Initalize local memory'''
-memory_directory = "memories"
-if not os.path.exists(memory_directory):
-    os.makedirs(memory_directory)
-
-for name in names+werewolf_names:
-    file_path = f"{memory_directory}/{name}_memories.json"
-    with open(file_path,"w") as f:
-        json.dump([],f)
-
-
-'''Initialize the mongo connection'''
-ATLAS_CONNECTION_STRING=os.getenv("ATLAS_CONNECTION_STRING")
-deepl_auth_key = os.getenv("DEEPL_AUTH_KEY")
-mongo_connection_holder = {}
-client_holder = {}
-convo_holder = {}
-# Define collection and index name
-db_name = "langchain_db"
-collection_name = "test"
-convo_collection_name = "conversations"
-vector_search_index = "vector_index"
-
-# Connect to your Atlas cluster
-mongo_connection_thread = Thread(target=threaded_function, args=(client_holder, get_atlas_collection, (db_name, collection_name)))
-mongo_connection_thread.start()
-
-# Connect to your Atlas cluster
-convo_connection_thread = Thread(target=threaded_function, args=(convo_holder, get_atlas_collection, (db_name, convo_collection_name)))
-convo_connection_thread.start()
-
-collection_names = names+werewolf_names+convo_collection_names+werewolf_convo_collection_names
-collections_holder = {}
-
-villager_mongo_connection = Thread(target=threaded_function, args=(collections_holder, get_atlas_collections, (db_name, collection_names)))
-villager_mongo_connection.start()
-
-# Mongo connection thread
-mongo_connection_thread.join()
-convo_connection_thread.join()
-villager_mongo_connection.join()
-atlas_collection = client_holder["result"]
-convo_collection = convo_holder["result"]
-villager_connections = collections_holder["result"]
-
-villager_collections = {}
-
-for i,name in enumerate(names+werewolf_names):
-    villager_collections[name] = (villager_connections[i],villager_connections[len(names+werewolf_names)+i])
+MEMORIES_SENT_PER_AGENT = 50
+MAX_HOT_MEMORIES = 2000  # memories kept in RAM per agent, the rest is summarized to disk
+REFLECTION_THRESHOLD = 1.5  # accumulated importance (at most 0.15 per memory) that triggers a reflection
+if not RESUME_CHECKPOINT:
+    memory_journal.reset(names+werewolf_names)
+
+
+'''Initialize the storage backend'''
+translation_service = create_translation_service()
+
+# Every run writes to its own namespace, a resumed run continues the one it was saved by
+if RESUME_CHECKPOINT and checkpoint_run_id(RESUME_CHECKPOINT):
+    set_run_id(checkpoint_run_id(RESUME_CHECKPOINT))
+logger.info(f"Run id: {mongoClient.RUN_ID}")
+# the runs the checkpoints on disk were saved by stay resumable, their databases are kept
+mongoClient.keep_runs(checkpoint_run_id(directory) for directory in {CHECKPOINT_DIR, RESUME_CHECKPOINT}
+                      if directory and os.path.exists(os.path.join(directory, "state.json")))
+
+# Atlas, SQLite or in-memory depending on STORAGE_BACKEND
+storage = get_storage()
+
+# Define your embedding model, shared by every agent behind one embedding cache
+embeddings_model = CachedEmbeddings(
+    AzureOpenAIEmbeddings(
+        azure_deployment="text-embedding3",
+        api_version="2024-02-01"
+    ),
+    namespace="text-embedding3"
+)
 
 def create_new_memory_retriever(agent_name="Player"):
-    """Create a new vector store retriever unique to the agent."""
-    # Define your embedding model
+    """Create a new in-process retriever unique to the agent, mirrored to the storage backend."""
     print("creating memory retriever for",agent_name)
-    embeddings_model = AzureOpenAIEmbeddings(
-        azure_deployment="text-embedding3",
-        api_version="2024-02-01"
-    )
-    if(agent_name=="Player"):
-        agent_collection = atlas_collection
-    else:    
-        agent_collection = villager_collections[agent_name][0]
-    vectorstore = MongoDBAtlasVectorSearch(agent_collection, embeddings_model)
-
-    return TimeWeightedVectorStoreRetriever(
-        vectorstore=vectorstore, other_score_keys=["importance"], k=15, decay_rate=0.005
+
+    return LocalTimeWeightedRetriever(
+        embeddings=embeddings_model, mirror_collection=storage.memory_mirror(agent_name),
+        other_score_keys=["importance"], k=15, decay_rate=0.005,
+        max_hot_memories=MAX_HOT_MEMORIES, cold_store=ColdMemoryStore(memory_journal.directory, agent_name, reset=not RESUME_CHECKPOINT),
+        entity_index=EntityIndex(entity_names)
     )
 
 def team_selection_screen(screen):
@@ -136,11 +142,11 @@ def team_selection_screen(screen):
         bool: True if the player selected werewolf, False if villager.
     """
     # Load images
-    background_image = pygame.image.load('images/night3.png')
+    background_image = pygame.image.load(os.path.join(BASE_DIR, 'images/night3.png'))
     background_image = pygame.transform.scale(background_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
 
-    villager_image = pygame.image.load('images/akio.png')
-    werewolf_image = pygame.image.load('images/werewolf.png')
+    villager_image = pygame.image.load(os.path.join(BASE_DIR, 'images/akio.png'))
+    werewolf_image = pygame.image.load(os.path.join(BASE_DIR, 'images/werewolf.png'))
     
     # Scale images
     villager_image = pygame.transform.scale(villager_image, (200, 200))
@@ -187,9 +193,11 @@ villagers_threaded = []
 
 # Initialize Pygame
 pygame.init()
+# Tasks render their labels with a font, so they can only be created once pygame is initialized
+entity_names = names + werewolf_names + ["Player"] + [task.task for task in TaskManager().initialize_task_locations()]
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Villagers and Werewolves")
-is_werewolf = team_selection_screen(screen)
+is_werewolf = os.getenv("PLAYER_TEAM") == "werewolf" if HEADLESS else team_selection_screen(screen)
 font = pygame.font.Font(None, 36)
 kill_button = pygame.Rect(50, 50, 180, 40)  # Button coordinates and size
 button_text = font.render("Kill Villager", True, (255, 255, 255))
@@ -227,10 +235,12 @@ backgrounds = [
     "Keep an eye on other villagers while talking, and in the meeting, raise your suspicion on the werewolf"]
 ]
 
+backgrounds = [backgrounds[i] for i in villager_roster]
 werewolf_backgrounds = [
     ["I am Katsumi ","I am a werewolf and I am here to sabotage the tasks and eliminate villagers.","I DO NOT reveal my identity to anyone. DO NOT take the name of the werewolf in the meeting and blame others."],
     ["I am Uchiha Madara ","I am a werewolf and I am here to sabotage the tasks.","I DO NOT reveal my identity to anyone. DO NOT take the name of the werewolf in the meeting and blame others."]
 ]
+werewolf_backgrounds = [werewolf_backgrounds[i] for i in werewolf_roster]
 
 
 '''
@@ -273,6 +283,8 @@ paths = [
     Path(SCREEN_WIDTH//2 -90, SCREEN_HEIGHT // 2 , 30, 200)
 
 ]
+walkability.build(paths, SCREEN_WIDTH, SCREEN_HEIGHT)
+agent_states.walkable = walkability.walkable
 
 
 '''
@@ -293,7 +305,7 @@ for i in range(len(backgrounds)):
     background_texts = backgrounds[i]
     ". ".join(a for a in background_texts)
 
-    villager_memory = AgentMemory(llm=llm, memory_retriever=create_new_memory_retriever(names[i]))
+    villager_memory = AgentMemory(llm=llm, memory_retriever=create_new_memory_retriever(names[i]), reflection_threshold=REFLECTION_THRESHOLD, owner=names[i])
     villager = Villager(names[i], x, y, background_texts=background_texts,llm=llm,memory=villager_memory,meeting_location=(x,y),paths=paths)
     villager.last_talk_attempt_time = 0  # Initialize last talk attempt time
     villagers.append(villager)
@@ -305,8 +317,8 @@ for i in range(len(werewolf_backgrounds)):
     y = int(center_y + radius * math.sin(angle))
     background_texts = werewolf_backgrounds[i]
     ". ".join(a for a in background_texts)
-    werewolf_memory = AgentMemory(llm=llm, memory_retriever=create_new_memory_retriever(werewolf_names[i]))
-    werewolf = Werewolf(werewolf_names[i], x, y, background_texts=background_texts,llm=llm,memory=werewolf_memory,meeting_location=(x,y))
+    werewolf_memory = AgentMemory(llm=llm, memory_retriever=create_new_memory_retriever(werewolf_names[i]), reflection_threshold=REFLECTION_THRESHOLD, owner=werewolf_names[i])
+    werewolf = Werewolf(werewolf_names[i], x, y, background_texts=background_texts,llm=llm,memory=werewolf_memory,meeting_location=(x,y),paths=paths)
     werewolf.last_talk_attempt_time = 0  # Initialize last talk attempt time
     villagers.append(werewolf)
     j+=1
@@ -314,9 +326,14 @@ for i in range(len(werewolf_backgrounds)):
 '''
 Initialize the player
 '''
-player_memory = AgentMemory(llm=llm, memory_retriever=create_new_memory_retriever())
+player_memory = AgentMemory(llm=llm, memory_retriever=create_new_memory_retriever(), owner="Player")
 player = Player("Player", SCREEN_WIDTH // 2+100, SCREEN_HEIGHT // 2 + 100, ["I am Aditya.I am the village head. I am just on a round to make sure everything is going good"], llm,memory = player_memory, meeting_location=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2),paths=paths,is_werewolf=is_werewolf)
 
+'''
+Merge near-duplicate memories in the background
+'''
+start_compaction_job({agent.agent_id: agent.agent.memory for agent in villagers + [player]})
+
 
 def villager_info(villagers):
     info = []
@@ -341,14 +358,13 @@ def save_game_state(villagers, filename="game_state.json"):
     with open(filename, 'w') as f:
         json.dump(villager_info(villagers), f, indent=4)
 
-# Function to save conversations to MongoDB
-def save_conversations_to_mongodb(conversations):
+# Function to save conversations to the storage backend
+def save_conversations_to_storage(conversations):
     if conversations:
-        convo_collection.insert_many(conversations)
-        if conversations[0]["villager1"] in villager_collections:
-            villager_collections[conversations[0]["villager1"]][1].insert_many(conversations)
+        with metrics.timed("storage_write_seconds", target="conversations"):
+            storage.append_conversations(conversations, day=game_day, meeting=meeting_number)
         
-        logger.info(f"Saved {len(conversations)} conversations to MongoDB.")
+        logger.info(f"Saved {len(conversations)} conversations to {type(storage).__name__}.")
         
     else:
         logger.info("No new conversations to save.")
@@ -376,6 +392,8 @@ def blend_images(image1, image2, blend_factor):
 
 # Function to display text on the screen with a white background
 def display_text(screen, text, duration, font_size=50):
+    if HEADLESS:
+        return
     font = pygame.font.Font(None, font_size)
     rendered_text = font.render(text, True, (255, 0, 0))  # Red color text
     text_rect = rendered_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
@@ -392,6 +410,15 @@ def display_text(screen, text, duration, font_size=50):
 # Initialize task locations
 task_manager = TaskManager()
 task_locations = task_manager.tasks
+
+'''
+Navigation grid, with flow fields towards every task and the meeting point computed in the background
+'''
+meeting_point = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+navigation = NavGrid(walkability, SCREEN_WIDTH, SCREEN_HEIGHT)
+navigation.precompute([(task.x, task.y) for task in task_locations] + [meeting_point])
+meeting_field = navigation.field_index(*meeting_point)
+agent_states.navigation = navigation
 global meetCheck
 meetCheck = False
 
@@ -440,37 +467,28 @@ def send_game_state():
             "sabotaged": task.sabotaged
         })
     
-    conversations = []
-    if not os.path.exists("conversations.json"):
-        with open("conversations.json","w") as f:
-            json.dump([],f)  
-    with open ("conversations.json","r") as f:
-        conversations = json.load(f)
+    # every conversation since the last publish, in the order they were held
+    conversations = list(pending_conversations)
+    pending_conversations.clear()
         
     villager_memories = {}
     for villager in villagers:
-        with open(f"memories/{villager.agent_id}_memories.json", 'r') as file:
-            try:
-                memories = json.load(file)
-            except:
-                memories = []
-                villager_memories[villager.agent_id] = memories
-        
+        villager_memories[villager.agent_id] = memory_journal.tail(villager.agent_id, MEMORIES_SENT_PER_AGENT)
+
 
     isConvo=False
     result = ""
+    # translations are cached by content and fetched in the background, attached once ready
+    for convo in conversations:
+        split_text = convo['conversation'].split(':', 1)
+        conversation_text = split_text[-1].strip()  # Remove the speaker and leading/trailing whitespace
+        convo["translationId"] = translation_service.key(conversation_text)
+        convo["translatedText"] = translation_service.translate(conversation_text) or ""
     if conversations:
         isConvo=True
-        translator = deepl.Translator(deepl_auth_key)
-        print(conversations[0]['conversation'])
-        split_text = conversations[0]['conversation'].split(':', 1)
-        if len(split_text) > 1:
-            conversation_text = split_text[1].strip()  # Remove leading/trailing whitespace
-        else:
-            conversation_text = split_text[0].strip() 
-        if conversation_text:
-            result = translator.translate_text(conversation_text, target_lang="JA")
-            print("Translated text: ", result.text)
+        result = conversations[0]["translatedText"]
+    # the translations finished since the last publish, for conversations sent before they were ready
+    translations = translation_service.take_completed()
           
       
     game_state = {
@@ -481,20 +499,24 @@ def send_game_state():
         "blendFactor": blend_factor,
         "isConvo":isConvo,
         "conversations": conversations,
-        "translatedText":result.text if result else "",
+        "translatedText":result,
+        "translations": translations,
         "is_morning_meeting": meetCheck,
         "villager_memories":villager_memories
     }
 
-    # convert game_state to json
-    game_state = json.dumps(game_state)
-    send(game_state)
+    # the server re-encodes for each spectator's negotiated encoding
+    game_state = wire.encode(game_state, wire.WIRE_ENCODING)
+    metrics.observe("game_state_bytes", len(game_state))
+    # positions are replaced by the next snapshot, conversations and translations must reach the spectators
+    game_state_publisher.publish(game_state, replaceable=not (conversations or translations))
 
 '''
 Task assignment thread
 '''
 assign_first_task(villagers,task_locations,task_manager.completed_tasks(),task_manager.incomplete_tasks())
 conversations = []  # List to store conversations
+pending_conversations = []  # conversations not yet published to the spectators
 
 def assign_task_thread(villager, current_task=None):
     global task_locations
@@ -540,13 +562,19 @@ def morning_meeting(villagers,conversations,elapsed_time):
         dx, dy = villager.meeting_location[0] - villager.x, villager.meeting_location[1] - villager.y
         dist = (dx**2 + dy**2)**0.5
         if dist > 2:
-            villager.x += 2*dx / dist
-            villager.y += 2*dy / dist
+            # far away villagers follow the paths towards the meeting point, then walk straight to their place
+            code = navigation.direction(meeting_field, villager.x, villager.y) if dist > MEETING_APPROACH_DISTANCE else -1
+            if code >= 0:
+                villager.x += 2*DIRECTIONS[code][0]
+                villager.y += 2*DIRECTIONS[code][1]
+            else:
+                villager.x += 2*dx / dist
+                villager.y += 2*dy / dist
             reached = False    
     if reached and elapsed_time>5:
         logger.info("All villagers have gathered for the morning meeting.")
         display_text(screen,"Meeting Going On......", 1)
-        meeting_complete,villager_remove =handle_meeting(villagers, conversations,villager_remove)
+        meeting_complete,villager_remove =handle_meeting(villagers, conversations,villager_remove,vote_log=meeting_votes)
         elapsed_time = temp
         return meeting_complete,elapsed_time + MORNING_MEETING_DURATION,villager_remove
     return meeting_complete,elapsed_time,villager_remove
@@ -556,11 +584,79 @@ def end_morning_meeting(villagers):
     is_morning_meeting = False
     for villager in villagers:
         villager.talking = False    
+    # the meeting has discussed the night's victims, they stay in the game state as dead villagers
+    dead_villagers.extend(Villager.killed_villagers)
     Villager.killed_villagers.clear()
     assign_first_task(villagers, task_locations,task_manager.completed_tasks(),task_manager.incomplete_tasks())
 
-
-mixer.music.play(-1)
+'''
+Checkpoint and resume
+'''
+def checkpoint_game(elapsed_time):
+    """Snapshot the game in the main thread and write it to disk in the background."""
+    game_state = {
+        "run_id": mongoClient.RUN_ID,
+        "is_day": is_day,
+        "game_day": game_day,
+        "meeting_number": meeting_number,
+        "elapsed_time": elapsed_time,
+        "villagers": [snapshot_villager(villager) for villager in villagers],
+        "killed_villagers": [snapshot_villager(villager) for villager in Villager.killed_villagers],
+        "dead_villagers": [snapshot_villager(villager) for villager in dead_villagers],
+        "player": snapshot_villager(player),
+        "tasks": [{"task": task.task, "completed": task.completed, "sabotaged": task.sabotaged} for task in task_locations],
+        "conversations": list(pending_conversations),
+        # what the journals and cold tiers held at this point, anything later is dropped on resume
+        "journal_entries": memory_journal.counts(),
+        "cold_rows": {},
+    }
+    memories = {}
+    for agent in villagers + Villager.killed_villagers + dead_villagers + [player]:
+        retriever = agent.agent.memory.memory_retriever
+        # evictions move memories from the hot stream to the cold tier under this lock
+        with retriever.lock:
+            memories[agent.agent_id] = retriever.export_state()
+            if retriever.cold_store is not None:
+                game_state["cold_rows"][agent.agent_id] = len(retriever.cold_store)
+    Thread(target=save_checkpoint, args=(game_state, memories)).start()
+
+def resume_game(directory):
+    """Restore villagers, tasks, memories and the clock from a checkpoint. Returns the saved elapsed time."""
+    global villagers, is_day, game_day, meeting_number
+    started = time.time()
+    game_state, memories = load_checkpoint(directory)
+    all_agents = {agent.agent_id: agent for agent in villagers + [player]}
+    tasks = {task.task: task for task in task_locations}
+
+    for task_state in game_state["tasks"]:
+        tasks[task_state["task"]].completed = task_state["completed"]
+        tasks[task_state["task"]].sabotaged = task_state["sabotaged"]
+    dead_states = game_state.get("dead_villagers", [])
+    for state in game_state["villagers"] + game_state["killed_villagers"] + dead_states + [game_state["player"]]:
+        restore_villager(all_agents[state["agent_id"]], state, tasks)
+    for agent_name, (documents, embeddings) in memories.items():
+        all_agents[agent_name].agent.memory.memory_retriever.restore_state(documents, embeddings)
+    # forget what the crashed run wrote after the checkpoint
+    for agent_name, count in game_state.get("journal_entries", {}).items():
+        memory_journal.truncate(agent_name, count)
+    for agent_name, count in game_state.get("cold_rows", {}).items():
+        all_agents[agent_name].agent.memory.memory_retriever.cold_store.truncate(count)
+
+    villagers = [all_agents[state["agent_id"]] for state in game_state["villagers"]]
+    Villager.killed_villagers[:] = [all_agents[state["agent_id"]] for state in game_state["killed_villagers"]]
+    dead_villagers[:] = [all_agents[state["agent_id"]] for state in dead_states]
+    pending_conversations.extend(game_state["conversations"])
+    is_day = game_state["is_day"]
+    game_day = game_state.get("game_day", 1)
+    meeting_number = game_state.get("meeting_number", 0)
+    token_ledger.set_day(game_day)
+    logger.info(f"Resumed from {directory} in {time.time() - started:.2f}s")
+    return game_state["elapsed_time"]
+
+
+if not HEADLESS:
+    mixer.music.play(-1)
+start_metrics_server()
 
 '''
 MAIN GAME LOOP
@@ -568,18 +664,29 @@ MAIN GAME LOOP
 running = True
 start_time = time.time()
 is_day = True
+game_day = 1
+meeting_number = 0
 blend_factor = 0
 is_morning_meeting = False
 meeting_complete = False
 message = None
 message_start_time = None
 message_duration = 5
-dead_villagers = []
+dead_villagers = []  # killed villagers the morning meetings already discussed
+winner = None
+meeting_votes = []  # (voter, suspect) of every vote cast in a meeting
+eliminations = []  # agents voted out, with the meeting and whether they were a werewolf
+game_started = time.time()
+if RESUME_CHECKPOINT:
+    start_time = time.time() + MORNING_MEETING_DURATION - resume_game(RESUME_CHECKPOINT)
 player_coordinates = (player.x, player.y)
 
 while running:
+    frame_started = time.perf_counter()
 
-    send_game_state()
+    # published at PUBLISH_RATE by a background thread, not on every frame
+    if not HEADLESS and game_state_publisher.due():
+        send_game_state()
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False       
@@ -614,6 +721,7 @@ while running:
         if elapsed_time < MORNING_MEETING_DURATION:
             if not is_morning_meeting:
                 meetCheck=True
+                meeting_number += 1
                 logger.info("Starting morning meeting...")   
             meeting_complete,_,remove_villager = morning_meeting(villagers,conversations,elapsed_time)
 
@@ -622,6 +730,7 @@ while running:
                 for villager in villagers:
                     if villager.agent_id == remove_villager:
                         villagers.remove(villager)
+                        eliminations.append({"meeting": meeting_number, "agent": villager.agent_id, "werewolf": isinstance(villager, Werewolf)})
                         message = f"{villager.agent_id} was kicked out"
                         message_start_time = time.time()
                         break
@@ -633,12 +742,15 @@ while running:
             temp = elapsed_time
             end_morning_meeting(villagers)
             elapsed_time = temp    
+            checkpoint_game(elapsed_time)
 
 
     else:
         if elapsed_time >= NIGHT_DURATION:
             is_day = True
             start_time = curr
+            game_day += 1
+            token_ledger.set_day(game_day)
         elif elapsed_time >= NIGHT_DURATION - TRANSITION_DURATION:
             blend_factor = (elapsed_time - (NIGHT_DURATION - TRANSITION_DURATION)) / TRANSITION_DURATION
 
@@ -649,10 +761,13 @@ while running:
             thread.start()
             
         villager.update()
+    # one vectorized step moves every agent, the player included, towards its task
+    agent_states.step()
 
         # Handle villager interactions
     
-    Thread(target=handle_villager_interactions, args=(player,villagers,Villager.killed_villagers,conversations)).start()
+    # nobody answers the player's prompts in a headless game
+    Thread(target=handle_villager_interactions, args=(None if HEADLESS else player,villagers,Villager.killed_villagers,conversations)).start()
 
     # Save game state periodically
     save_game_state(villagers)
@@ -661,20 +776,23 @@ while running:
         print(Fore.RED + "\nconversations")
         for convo in conversations:
             print(Fore.RED+ convo['villager1'] + " to " +  convo['villager2'] + " : " + convo['conversation'].split(":")[-1])
-        save_conversations_to_mongodb(conversations)
+        save_conversations_to_storage(conversations)
+    if not HEADLESS:
+        pending_conversations.extend(conversations)
     conversations.clear()  # Clear the list after saving
 
     # Render game state
-    if is_day:
-        blend_images(background_day, background_night, blend_factor)
-    else:
-        blend_images(background_night, background_day, blend_factor)
+    if not HEADLESS:
+        if is_day:
+            blend_images(background_day, background_night, blend_factor)
+        else:
+            blend_images(background_night, background_day, blend_factor)
 
-    for villager in [player]+villagers+Villager.killed_villagers:
-        villager.draw(screen)
+        for villager in [player]+villagers+Villager.killed_villagers:
+            villager.draw(screen)
 
-    for task_location in task_locations:
-        task_location.draw(screen)
+        for task_location in task_locations:
+            task_location.draw(screen)
 
     # for p in paths:
     #     p.draw(screen)
@@ -685,27 +803,63 @@ while running:
 
     else:
         # Check for win conditions
-        if len([villager for villager in villagers if isinstance(villager, Villager)])<=2:
+        # Werewolf is a Villager subclass, only the townsfolk count towards the werewolves' win
+        if len([villager for villager in villagers if not isinstance(villager, Werewolf)])<=2:
             message = "Werewolves won the game!"
             message_start_time = time.time()
+            winner = "werewolves"
             # Remove all villagers
             
 
         elif all(not isinstance(villager, Werewolf) for villager in villagers):
             message = "Townsfolk won the game!"
             message_start_time = time.time()
+            winner = "townsfolk"
 
         elif task_manager.all_tasks_completed():
             message = "Townsfolk won the game!"
             message_start_time = time.time()
+            winner = "townsfolk"
+
+    # a headless game ends with its first winner, or after MAX_GAME_DAYS
+    if HEADLESS and (winner or (MAX_GAME_DAYS and game_day > MAX_GAME_DAYS)):
+        running = False
 
-    if is_werewolf:
+    if is_werewolf and not HEADLESS:
         # Drawing the button
         pygame.draw.rect(screen, (255, 0, 0), kill_button)
         screen.blit(button_text, (55, 55))
 
     
     pygame.display.flip()
+    metrics.observe("frame_seconds", time.perf_counter() - frame_started)
     clock.tick(60)
 
+logger.info(f"Embedding cache: {embeddings_model.stats()}")
+logger.info(f"Token spend: {token_ledger.report()}")
+logger.info(f"Latency quantiles: {metrics.summary()}")
+logger.info(f"Game state publisher: {game_state_publisher.stats()}")
+logger.info(f"Translations: {translation_service.stats()}")
+for agent in villagers + [player]:
+    logger.info(f"Retrieval cache of {agent.agent_id}: {agent.agent.memory.retrieval_cache.stats()}")
+
+if GAME_RESULT_PATH:
+    llm_usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+    for totals in token_ledger.report()["by_call_site"].values():
+        for key in llm_usage:
+            llm_usage[key] += totals.get(key, 0)
+    with open(GAME_RESULT_PATH, "w") as f:
+        json.dump({
+            "run_id": mongoClient.RUN_ID,
+            "seed": GAME_SEED,
+            "villagers": names,
+            "werewolves": werewolf_names,
+            "winner": winner,
+            "days": game_day,
+            "duration_seconds": time.time() - game_started,
+            "votes_cast": len(meeting_votes),
+            "votes_correct": sum(suspect in werewolf_names for _, suspect in meeting_votes),
+            "eliminations": eliminations,
+            "llm": llm_usage,
+        }, f, indent=4)
 pygame.quit()
\ No newline at end of file
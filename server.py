@@ -2,27 +2,138 @@ import asyncio
 import websockets
 from dotenv import load_dotenv
 import os
+from utils.logger import logger
+from utils import wire
 load_dotenv()
 
-connected_clients = set()
+CLIENT_QUEUE_SIZE = int(os.getenv("CLIENT_QUEUE_SIZE", "4"))  # messages waiting per client
+MAX_CLIENT_LAG = int(os.getenv("MAX_CLIENT_LAG", "120"))  # consecutive dropped messages before disconnecting
+SEND_TIMEOUT = 5  # seconds a single send may take before the client is disconnected
 
-async def echo(websocket, path):
-    # Add the client to the set of connected clients
-    connected_clients.add(websocket)
-    try:
-        async for message in websocket:
-            # Echo the message to all connected clients
-            for client in connected_clients:
-                await client.send(message)
-    finally:
-        # Remove the client from the set of connected clients when the connection is closed
-        connected_clients.remove(websocket)
 
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
+class ClientChannel:
+    """
+    Outgoing side of one websocket connection.
 
-start_server = websockets.serve(echo, "localhost", os.getenv("WEBSOCKET_PORT"))
+    Messages wait in a small bounded queue drained by the channel's own writer
+    task, so a slow client only ever delays itself.
 
-print('Server started at ws://localhost:' + os.getenv("WEBSOCKET_PORT"))
-loop.run_until_complete(start_server)
-loop.run_forever()
+    Attributes:
+        encoding (str): Wire encoding the client negotiated, see utils.wire.
+        lag (int): Messages dropped since the last successful send.
+        dropped (int): Messages dropped over the lifetime of the connection.
+    """
+
+    def __init__(self, websocket, queue_size=CLIENT_QUEUE_SIZE, encoding=wire.JSON):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lag = 0
+        self.dropped = 0
+        self.writer = None
+
+    def offer(self, message):
+        """Queue a message, dropping the oldest queued one when full: every message is a full snapshot, the latest wins."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.lag += 1
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class BroadcastHub:
+    """
+    Fan-out of game-state messages to every connected spectator.
+
+    `publish` never awaits a client: it offers the message to each client's
+    channel and returns. Each channel's writer sends concurrently with the
+    others. Clients whose queue keeps overflowing, or whose sends stall, are
+    disconnected rather than slowing the game down.
+
+    Each client picks its encoding with an `?encoding=` query parameter or a
+    hello message, JSON by default. A message is decoded at most once per
+    publish and encoded once per encoding in use.
+    """
+
+    def __init__(self, queue_size=CLIENT_QUEUE_SIZE, max_lag=MAX_CLIENT_LAG, send_timeout=SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.max_lag = max_lag
+        self.send_timeout = send_timeout
+        self.channels = {}
+
+    def register(self, websocket, encoding=wire.JSON):
+        channel = ClientChannel(websocket, self.queue_size, encoding)
+        channel.writer = asyncio.create_task(self._write(channel))
+        self.channels[websocket] = channel
+        logger.info(f"Client connected with {encoding} encoding ({len(self.channels)} connected)")
+        return channel
+
+    def unregister(self, websocket):
+        channel = self.channels.pop(websocket, None)
+        if channel is not None:
+            # a writer unregistering its own client still has to close the connection
+            if channel.writer is not asyncio.current_task():
+                channel.writer.cancel()
+            logger.info(f"Client disconnected after {channel.dropped} dropped messages ({len(self.channels)} connected)")
+
+    def publish(self, message, sender=None):
+        """Offer a message to every client but its sender, in the client's encoding."""
+        state = None
+        payloads = {}
+        if isinstance(message, str):
+            payloads[wire.JSON] = message
+        # iterate over a copy, clients come and go while publishing
+        for websocket, channel in list(self.channels.items()):
+            if websocket is sender:
+                continue
+            payload = payloads.get(channel.encoding)
+            if payload is None:
+                if state is None:
+                    state = wire.decode(message)
+                payload = payloads[channel.encoding] = wire.encode(state, channel.encoding)
+            channel.offer(payload)
+            if channel.lag > self.max_lag:
+                logger.warning(f"Disconnecting a client {channel.lag} messages behind")
+                self.unregister(websocket)
+                asyncio.create_task(websocket.close(code=1008, reason="too slow"))
+
+    async def _write(self, channel):
+        try:
+            while True:
+                message = await channel.queue.get()
+                await asyncio.wait_for(channel.websocket.send(message), self.send_timeout)
+                channel.lag = 0
+        except asyncio.CancelledError:
+            pass
+        except (asyncio.TimeoutError, websockets.ConnectionClosed) as e:
+            logger.info(f"Dropping client: {type(e).__name__}")
+            self.unregister(channel.websocket)
+            await channel.websocket.close()
+
+    async def handler(self, websocket, path=None):
+        channel = self.register(websocket, wire.encoding_from_path(path or getattr(websocket, "path", "")))
+        try:
+            async for message in websocket:
+                encoding = wire.hello_encoding(message)
+                if encoding is not None:
+                    channel.encoding = encoding
+                    continue
+                try:
+                    self.publish(message, sender=websocket)
+                except ValueError as e:
+                    logger.warning(f"Dropping a malformed message: {e}")
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.unregister(websocket)
+
+
+async def serve(port):
+    hub = BroadcastHub()
+    async with websockets.serve(hub.handler, "localhost", port):
+        print('Server started at ws://localhost:' + str(port))
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(os.getenv("WEBSOCKET_PORT")))
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# game modules read their configuration when first imported: keep telemetry and storage off the network and the repo
+os.environ.setdefault("TELEMETRY_TARGETS", "jsonl")
+os.environ.setdefault("TELEMETRY_DIR", tempfile.mkdtemp(prefix="telemetry-"))
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
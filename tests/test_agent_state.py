@@ -0,0 +1,125 @@
+import math
+import random
+
+import numpy as np
+import pygame
+import pytest
+
+from utils.agent_state import SPEED, AgentStateStore
+
+
+def reference_step(x, y, target, walkable=None):
+    """The per-villager move this store replaced: the first of 8 directions that gets closer, else a +SPEED nudge along the paths."""
+    current = math.hypot(target[0] - x, target[1] - y)
+    for dx, dy in [(0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (-1, 1), (1, -1), (1, 1)]:
+        next_x, next_y = x + SPEED * dx, y + SPEED * dy
+        if math.hypot(target[0] - next_x, target[1] - next_y) < current:
+            return next_x, next_y
+    if walkable is not None and walkable(x + SPEED, y):
+        return x + SPEED, y
+    return x, y
+
+
+def test_step_matches_the_scalar_move():
+    rng = random.Random(0)
+    store = AgentStateStore(capacity=4)
+    agents = []
+    for _ in range(50):
+        slot = store.allocate(rng.randrange(200), rng.randrange(200))
+        target = (float(rng.randrange(200)), float(rng.randrange(200)))
+        store.tasked[slot] = True
+        store.set_target(slot, target)
+        agents.append((slot, target))
+
+    for _ in range(120):
+        expected = [reference_step(store.x[slot], store.y[slot], target) for slot, target in agents]
+        store.step()
+        assert [(store.x[slot], store.y[slot]) for slot, _ in agents] == expected
+
+
+def test_stuck_agents_are_nudged_along_the_paths():
+    walkable = lambda xs, ys: np.asarray(xs) < 105
+    store = AgentStateStore(walkable=walkable)
+    on_path = store.allocate(100, 100, uses_paths=True)
+    off_path = store.allocate(104, 100, uses_paths=True)
+    no_paths = store.allocate(100, 100)
+    for slot in (on_path, off_path, no_paths):
+        store.tasked[slot] = True
+        store.set_target(slot, (store.x[slot], store.y[slot]))
+
+    store.step()
+
+    assert store.x[on_path] == 100 + SPEED
+    assert store.x[off_path] == 104
+    assert store.x[no_paths] == 100
+
+
+def test_only_moving_agents_step():
+    store = AgentStateStore()
+    slots = [store.allocate(0, 0) for _ in range(5)]
+    for slot in slots:
+        store.tasked[slot] = True
+        store.set_target(slot, (50, 0))
+    store.alive[slots[0]] = False
+    store.talking[slots[1]] = True
+    store.doing[slots[2]] = True
+    store.tasked[slots[3]] = False
+
+    assert store.moving().tolist() == [slots[4]]
+    store.step()
+    assert store.x[:5].tolist() == [0, 0, 0, 0, SPEED]
+
+
+def test_grow_keeps_existing_slots():
+    store = AgentStateStore(capacity=2)
+    first = store.allocate(1, 2, speed=3, uses_paths=True)
+    store.set_target(first, (7, 8))
+    store.tasked[first] = True
+    second = store.allocate(4, 5)
+    third = store.allocate(6, 7)
+
+    assert (first, second, third) == (0, 1, 2)
+    assert len(store.x) == 4
+    assert (store.x[first], store.y[first], store.speed[first]) == (1, 2, 3)
+    assert (store.target_x[first], store.target_y[first]) == (7, 8)
+    assert store.tasked[first] and store.uses_paths[first] and store.alive[third]
+    assert np.isnan(store.x[3]) and not store.alive[3] and store.field[3] == -1
+
+
+@pytest.fixture
+def villager():
+    pygame.font.init()
+    from villager import Villager
+    return Villager("Akio", 10, 20, "", llm=None, memory=None, state=AgentStateStore(capacity=1))
+
+
+def test_villager_fields_are_views_of_its_slot(villager):
+    store, slot = villager.state, villager.slot
+    assert (villager.x, villager.y, villager.speed) == (10.0, 20.0, SPEED)
+
+    villager.x = 12.5
+    store.y[slot] = 30
+    villager.alive = False
+    villager.task_doing = True
+
+    assert store.x[slot] == 12.5 and villager.y == 30.0
+    assert villager.alive is False and not store.alive[slot]
+    assert villager.task_doing is True and store.doing[slot]
+
+
+def test_villager_task_round_trips(villager):
+    store, slot = villager.state, villager.slot
+    assert villager.current_task is None and villager.task_location is None
+
+    villager.current_task = "Cook food"
+    villager.task_location = (40, 50)
+
+    assert villager.current_task == "Cook food" and store.tasked[slot]
+    assert villager.task_location == (40.0, 50.0)
+    assert isinstance(villager.task_location[0], float)
+
+    villager.current_task = None
+    villager.task_location = None
+
+    assert not store.tasked[slot]
+    assert villager.task_location is None and store.field[slot] == -1
@@ -0,0 +1,77 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from utils.agentmemory import AgentMemory
+from utils.local_retriever import LocalTimeWeightedRetriever
+from utils.memory_journal import memory_journal
+
+TOPICS = "1. Who was near the well?\n2. What is Kaio doing?"
+INSIGHTS = "1. Kaio spends time at the well (because of 1)\n2. Kaio is busy (because of 1)"
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers each memory prompt with a canned reply, with the usage metadata token_tracker reads."""
+
+    prompts: list = []
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        if "salient high-level questions" in prompt:
+            reply = TOPICS
+        elif "high-level novel insights" in prompt:
+            reply = INSIGHTS
+        else:
+            reply = "7"
+        usage = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        message = AIMessage(content=reply, response_metadata={"token_usage": usage, "model_name": "fake"})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@pytest.fixture
+def memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_journal, "directory", str(tmp_path))
+    retriever = LocalTimeWeightedRetriever(embeddings=DeterministicFakeEmbedding(size=16), other_score_keys=["importance"], k=5)
+    return AgentMemory(llm=FakeChatModel(prompts=[]), memory_retriever=retriever, owner="Akio")
+
+
+def test_pause_to_reflect_writes_insights_back(memory):
+    memory.add_memory("Akio saw Kaio near the well", agent_name="Akio")
+
+    insights = memory.pause_to_reflect(agent_name="Akio")
+
+    # two topics, two insights each, parsed from the numbered lists
+    assert sorted(insights) == sorted(["Kaio spends time at the well (because of 1)", "Kaio is busy (because of 1)"] * 2)
+    stream = [doc.page_content for doc in memory.memory_retriever.memory_stream]
+    assert stream[0] == "Akio saw Kaio near the well"
+    assert sorted(stream[1:]) == sorted(insights)
+    assert all(doc.metadata["importance"] == pytest.approx(0.7 * memory.importance_weight)
+               for doc in memory.memory_retriever.memory_stream)
+    assert sum("Who was near the well?" in prompt for prompt in memory.llm.prompts) == 1
+
+
+def test_fetch_memories_about_adds_entity_mentions(tmp_path, monkeypatch):
+    from utils.entity_index import EntityIndex
+
+    monkeypatch.setattr(memory_journal, "directory", str(tmp_path))
+    retriever = LocalTimeWeightedRetriever(embeddings=DeterministicFakeEmbedding(size=16), other_score_keys=["importance"], k=1,
+                                           entity_index=EntityIndex(["Kaio", "Hana"]))
+    memory = AgentMemory(llm=FakeChatModel(prompts=[]), memory_retriever=retriever, owner="Akio", entity_memories_per_name=2)
+    memory.add_memories(["Kaio ran from the barn", "Kaio hid near the well", "Kaio fixed the fence", "Hana cooked food", "It rained"],
+                        agent_name="Akio")
+
+    related = memory.fetch_memories("It rained")
+    about = memory.fetch_memories_about("It rained", ["Kaio", "Hana"])
+
+    assert [doc.page_content for doc in about[:len(related)]] == [doc.page_content for doc in related]
+    mentions = [doc.page_content for doc in about[len(related):]]
+    assert len(mentions) == len(set(mentions))
+    assert sum("Kaio" in text for text in mentions) <= 2
+    assert "Hana cooked food" in [doc.page_content for doc in about]
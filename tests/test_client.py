@@ -0,0 +1,37 @@
+import asyncio
+
+from client import GameStatePublisher
+
+
+def publisher():
+    publisher = GameStatePublisher(url="ws://localhost:1", rate=0)
+    # a loop that never runs: messages stay queued for _take
+    publisher._loop = asyncio.new_event_loop()
+    publisher._wakeup = asyncio.Event()
+    publisher._thread = object()
+    return publisher
+
+
+def drain(publisher):
+    messages = []
+    while (message := publisher._take()) is not None:
+        messages.append(message)
+    return messages
+
+
+def test_only_the_latest_snapshot_is_kept():
+    p = publisher()
+    for message in ("a", "b", "c"):
+        p.publish(message)
+    assert drain(p) == ["c"]
+    assert p.replaced == 2
+
+
+def test_messages_with_events_are_all_sent_in_order():
+    p = publisher()
+    p.publish("positions-1")
+    p.publish("convo-1", replaceable=False)
+    p.publish("positions-2")
+    p.publish("convo-2", replaceable=False)
+    p.publish("positions-3")
+    assert drain(p) == ["convo-1", "convo-2", "positions-3"]
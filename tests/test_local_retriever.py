@@ -0,0 +1,43 @@
+import datetime
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from utils import local_retriever
+from utils.local_retriever import LocalTimeWeightedRetriever
+from utils.vector_db import VectorDatabase
+
+pytestmark = pytest.mark.skipif(local_retriever.hnswlib is None, reason="hnswlib is not installed")
+
+
+def fill(retriever, count):
+    now = datetime.datetime.now()
+    retriever.add_documents([Document(page_content=f"memory number {i}", metadata={"importance": 0.0}) for i in range(count)],
+                            current_time=now)
+
+
+def test_ann_replaces_exact_search_past_the_threshold():
+    retriever = LocalTimeWeightedRetriever(embeddings=DeterministicFakeEmbedding(size=32), k=3, ann_threshold=100)
+    fill(retriever, 99)
+    assert retriever._ann is None
+    fill(retriever, 1)
+    assert retriever._ann is not None and retriever._ann.size == 100
+
+    # the fake embedding maps equal texts to equal vectors, so the exact text is the nearest neighbour
+    query = VectorDatabase._normalize(retriever.embeddings.embed_query("memory number 42"))
+    ids, scores = retriever._ann.query(query, 1)
+    assert retriever._by_id[int(ids[0][0])].page_content == "memory number 42"
+    assert scores[0][0] == pytest.approx(1.0, abs=1e-4)
+    assert retriever.invoke("memory number 42")[0].page_content == "memory number 42"
+
+
+def test_ann_threshold_is_reachable_under_the_hot_cap():
+    retriever = LocalTimeWeightedRetriever(embeddings=DeterministicFakeEmbedding(size=32), k=3, ann_threshold=2048,
+                                           max_hot_memories=200)
+    for _ in range(5):
+        fill(retriever, 100)
+
+    assert len(retriever.memory_stream) <= 200
+    assert retriever._ann is not None
+    assert retriever._ann.size == len(retriever._vectors)
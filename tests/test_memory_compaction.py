@@ -0,0 +1,73 @@
+import datetime
+import threading
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from utils.local_retriever import LocalTimeWeightedRetriever
+from utils.memory_compaction import compact_memories, template_key
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.inserted = []
+
+    def insert_many(self, documents):
+        self.inserted.extend(documents)
+
+
+def retriever_with(texts, **kwargs):
+    retriever = LocalTimeWeightedRetriever(embeddings=DeterministicFakeEmbedding(size=16), k=2, **kwargs)
+    start = datetime.datetime(2024, 1, 1, 12)
+    for minute, text in enumerate(texts):
+        retriever.add_documents([Document(page_content=text, metadata={"importance": 0.01 * minute})],
+                                current_time=start + datetime.timedelta(minutes=minute))
+    return retriever
+
+
+def test_template_key():
+    assert template_key("You see Akio near Cook food") == template_key("You see Akio near Collect wood") == "you see akio"
+
+
+def test_duplicates_are_merged_with_a_count():
+    texts = ["You see Akio near the well"] * 3 + ["Hana cooked food", "You see Kaio near the barn"]
+    retriever = retriever_with(texts)
+
+    result = compact_memories(retriever)
+
+    assert result == {"before": 5, "after": 3, "clusters": 1}
+    merged = [doc for doc in retriever.memory_stream if doc.metadata.get("count")]
+    assert len(merged) == 1 and merged[0].metadata["count"] == 3
+    assert merged[0].metadata["importance"] == 0.02
+    assert merged[0].metadata["first_seen"] == datetime.datetime(2024, 1, 1, 12)
+    created = [doc.metadata["created_at"] for doc in retriever.memory_stream]
+    assert created == sorted(created)
+    assert compact_memories(retriever)["clusters"] == 0
+
+
+def test_merged_memories_are_not_mirrored():
+    collection = RecordingCollection()
+    retriever = retriever_with(["You see Akio near the well"] * 3, mirror_collection=collection)
+
+    compact_memories(retriever)
+    retriever._mirror_executor.submit(lambda: None).result()  # one worker: every earlier write is done
+
+    assert [record["text"] for record in collection.inserted] == ["You see Akio near the well"] * 3
+    assert "count" not in collection.inserted[-1]
+
+
+def test_compaction_holds_the_retriever_lock():
+    retriever = retriever_with(["You see Akio near the well"] * 3)
+    seen = []
+    get_embeddings = retriever.get_embeddings
+
+    def check_lock(ids):
+        # another thread cannot take the lock while the pass runs
+        blocked = threading.Thread(target=lambda: seen.append(retriever.lock.acquire(timeout=0.05)))
+        blocked.start()
+        blocked.join()
+        return get_embeddings(ids)
+
+    object.__setattr__(retriever, "get_embeddings", check_lock)
+    compact_memories(retriever)
+    assert seen == [False]
@@ -0,0 +1,41 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.memory_journal import AgentJournal
+from utils.memory_tiers import ColdMemoryStore
+
+
+def unit_vectors(count, dim=4):
+    vectors = np.eye(dim, dtype=np.float32)
+    return vectors[np.arange(count) % dim]
+
+
+def test_cold_store_truncate_drops_later_memories(tmp_path):
+    store = ColdMemoryStore(str(tmp_path), "Akio")
+    store.append([Document(page_content=f"memory {i}") for i in range(3)], unit_vectors(3))
+    store.append([Document(page_content="after the checkpoint")], unit_vectors(1) * -1)
+
+    store.truncate(3)
+    store.truncate(5)  # a count past the end keeps everything
+
+    reopened = ColdMemoryStore(str(tmp_path), "Akio")
+    assert len(store) == len(reopened) == 3
+    assert sorted(doc.page_content for doc, _ in reopened.search(unit_vectors(1)[0], 4)) == ["memory 0", "memory 1", "memory 2"]
+
+
+def test_journal_truncate_keeps_the_first_entries(tmp_path):
+    path = str(tmp_path / "Akio.jsonl")
+    journal = AgentJournal(path, index_stride=4)
+    for i in range(10):
+        journal.append({"text": f"memory {i}"})
+
+    journal.truncate(6)
+    journal.append({"text": "resumed"})
+    journal.close()
+
+    reopened = AgentJournal(path, index_stride=4)
+    assert reopened.count == 7
+    assert [entry["text"] for entry in reopened.tail(3)] == ["memory 4", "memory 5", "resumed"]
+    reopened.truncate()
+    assert reopened.count == 0 and reopened.read_all() == []
+    reopened.close()
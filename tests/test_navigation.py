@@ -0,0 +1,99 @@
+import time
+
+import numpy as np
+
+from utils.agent_state import DIRECTIONS, AgentStateStore
+from utils.navigation import NavGrid
+from utils.task_locations import Path
+from utils.walkability import WalkabilityMap
+
+CELL = 10
+# an L of paths: along the top row, then down the right column of a 20 x 20 cell map
+PATHS = [Path(0, 0, 200, 10), Path(190, 0, 10, 200)]
+
+
+def nav_grid():
+    return NavGrid(WalkabilityMap(PATHS, 200, 200), 200, 200, cell_size=CELL, off_path_cost=4)
+
+
+def follow(grid, codes, cell, limit=1000):
+    """Walk the flow field from a cell, returning the visited cells."""
+    visited = [cell]
+    while codes[cell] != -1 and len(visited) < limit:
+        dx, dy = DIRECTIONS[codes[cell]]
+        cell = (cell[0] + int(dy), cell[1] + int(dx))
+        visited.append(cell)
+    return visited
+
+
+def wait_for(grid, index, timeout=10):
+    deadline = time.time() + timeout
+    while (grid.flow[index] == -1).sum() > 1:
+        assert time.time() < deadline, "flow field never computed"
+        time.sleep(0.01)
+
+
+def test_walkable_cells_follow_the_paths():
+    grid = nav_grid()
+    assert grid.walkable[0].all() and grid.walkable[:, -1].all()
+    assert not grid.walkable[1:, :-1].any()
+    assert grid.cost[0, 0] == 1 and grid.cost[5, 5] == 4
+
+
+def test_every_cell_reaches_the_target():
+    grid = nav_grid()
+    target = (19, 19)
+    codes = grid._flow_field(target)
+
+    assert codes[target] == -1
+    assert (codes == -1).sum() == 1
+    for row in range(grid.rows):
+        for col in range(grid.cols):
+            assert follow(grid, codes, (row, col))[-1] == target
+
+
+def test_agents_on_the_paths_stay_on_them():
+    grid = nav_grid()
+    route = follow(grid, grid._flow_field((19, 19)), (0, 0))
+    # cutting the corner is shorter but off the paths, where every cell costs 4 times as much
+    assert all(grid.walkable[cell] for cell in route)
+
+
+def test_field_index_computes_each_target_once_in_the_background():
+    grid = nav_grid()
+    targets = [(15 + 10 * i, 5) for i in range(12)]
+    grid.precompute(targets)
+    indexes = [grid.field_index(x + 2, y + 2) for x, y in targets]  # same cells
+
+    assert indexes == list(range(12))
+    assert len(grid.flow) >= 12
+    wait_for(grid, indexes[-1])
+    np.testing.assert_array_equal(grid.flow[indexes[-1]], grid._flow_field(grid.cell(*targets[-1])))
+
+
+def test_directions_match_direction():
+    grid = nav_grid()
+    index = grid.field_index(195, 195)
+    wait_for(grid, index)
+    xs, ys = np.array([5.0, 100.0, 195.0, 3.0]), np.array([5.0, 100.0, 50.0, 150.0])
+    codes = grid.directions(np.full(4, index), xs, ys)
+    assert codes.tolist() == [grid.direction(index, x, y) for x, y in zip(xs, ys)]
+
+
+def test_store_follows_the_flow_far_from_the_target():
+    grid = nav_grid()
+    store = AgentStateStore(navigation=grid)
+    far = store.allocate(5, 5)
+    near = store.allocate(190, 180)
+    for slot in (far, near):
+        store.tasked[slot] = True
+        store.set_target(slot, (195, 195))
+    wait_for(grid, store.field[far])
+
+    code = grid.direction(store.field[far], 5, 5)
+    store.step()
+
+    dx, dy = DIRECTIONS[code]
+    assert (store.x[far], store.y[far]) == (5 + 2 * dx, 5 + 2 * dy)
+    # within two cells of the target the greedy step takes over: straight down first
+    assert (store.x[near], store.y[near]) == (190, 182)
@@ -0,0 +1,86 @@
+import asyncio
+
+from server import BroadcastHub
+
+
+class StubWebSocket:
+    def __init__(self, stall=False):
+        self.stall = stall
+        self.sent = []
+        self.closed = False
+
+    async def send(self, message):
+        if self.stall:
+            await asyncio.Event().wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=""):
+        await asyncio.sleep(0)
+        self.closed = True
+
+
+def test_slow_clients_are_unregistered_and_closed():
+    async def scenario():
+        hub = BroadcastHub(send_timeout=0.05)
+        slow, fast = StubWebSocket(stall=True), StubWebSocket()
+        slow_channel = hub.register(slow)
+        hub.register(fast)
+
+        hub.publish('{"villagers": []}')
+        await asyncio.sleep(0.2)
+
+        assert slow not in hub.channels and fast in hub.channels
+        assert slow.closed and slow_channel.writer.done()
+        assert fast.sent == ['{"villagers": []}'] and not fast.closed
+        hub.unregister(fast)
+
+    asyncio.run(scenario())
+
+
+def test_unregister_cancels_the_writer():
+    async def scenario():
+        hub = BroadcastHub()
+        websocket = StubWebSocket()
+        channel = hub.register(websocket)
+        hub.unregister(websocket)
+        await asyncio.sleep(0)
+        assert channel.writer.cancelled()
+
+    asyncio.run(scenario())
+
+
+class StubPublisher(StubWebSocket):
+    """The game's connection: yields its messages to the handler, then ends."""
+
+    def __init__(self, messages):
+        super().__init__()
+        self.messages = messages
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for message in self.messages:
+            yield message
+
+
+def test_malformed_messages_do_not_close_the_sender():
+    from utils import wire
+
+    state = {"numVillagers": 0, "villagers": [], "tasks": [], "isDay": True, "isConvo": False, "is_morning_meeting": False, "blendFactor": 0.0}
+    binary = wire.encode(state, wire.BINARY)
+
+    async def scenario():
+        hub = BroadcastHub()
+        spectator = StubWebSocket()
+        hub.register(spectator, wire.BINARY)
+        game = StubPublisher(['{"chat": "not a game state"}', binary[:10], wire.encode(state)])
+
+        await hub.handler(game, "/")
+        await asyncio.sleep(0.05)
+
+        # both malformed messages were dropped, the valid one still went through
+        assert [wire.decode(message) for message in spectator.sent] == [state]
+        hub.unregister(spectator)
+
+    asyncio.run(scenario())
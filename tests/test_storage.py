@@ -0,0 +1,110 @@
+import datetime
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import utils.storage as storage
+from utils.conversation_store import MEETING
+from utils.local_retriever import LocalTimeWeightedRetriever
+from utils.storage import InMemoryStorage, SQLiteStorage, configure_storage, get_storage, get_storage_backend
+
+NOW = datetime.datetime(2024, 1, 1, 12)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        backend = InMemoryStorage("run-1")
+    else:
+        backend = SQLiteStorage("run-1", path=str(tmp_path / "game.sqlite"))
+    yield backend
+    backend.close()
+
+
+def convo(speaker, listener, text):
+    return {"villager1": speaker, "villager2": listener, "conversation": text}
+
+
+def test_conversations_round_trip(backend):
+    backend.append_conversations([convo("Akio", "Hana", "Hello"), convo("Hana", "Akio", "Hi"), convo("Akio", "Kaio", "Hey")],
+                                 day=1, now=NOW)
+    backend.append_conversations([convo("Akio", "Hana", "Tomorrow")], day=2, now=NOW)
+    backend.append_conversations([convo("Hana", MEETING, "I suspect Kaio"), convo("Akio", MEETING, "So do I")],
+                                 day=2, meeting=3, now=NOW)
+
+    dialogue = backend.dialogue_between("Hana", "Akio", 1)
+    assert [(u["speaker"], u["listener"], u["text"]) for u in dialogue] == [("Akio", "Hana", "Hello"), ("Hana", "Akio", "Hi")]
+    assert dialogue[0]["time"] == NOW and dialogue[0]["day"] == 1 and dialogue[0]["meeting"] is None
+    assert [u["text"] for u in backend.dialogue_between("Akio", "Hana", 2)] == ["Tomorrow"]
+    assert [(u["speaker"], u["text"]) for u in backend.meeting_transcript(3)] == [("Hana", "I suspect Kaio"), ("Akio", "So do I")]
+    assert backend.meeting_transcript(4) == []
+
+
+def test_record_usage(backend):
+    backend.record_usage([{"model": "gpt-3.5-turbo", "total_tokens": 42, "time": NOW}])
+    if isinstance(backend, InMemoryStorage):
+        assert backend.usage == [{"model": "gpt-3.5-turbo", "total_tokens": 42, "time": NOW}]
+    else:
+        rows = backend._db.execute("SELECT run_id, time FROM token_usage").fetchall()
+        assert rows == [("run-1", str(NOW))]
+
+
+def test_search_memories_finds_the_closest_records(backend):
+    assert backend.search_memories("Akio", np.ones(4)) == []
+    backend.add_memories("Akio", [
+        {"text": "well", "embedding": [1.0, 0.0, 0.0, 0.0], "importance": 0.5},
+        {"text": "barn", "embedding": [0.0, 1.0, 0.0, 0.0], "importance": 0.1},
+    ])
+    backend.add_memories("Akio", [{"text": "field", "embedding": [0.0, 0.0, 1.0, 0.0], "importance": 0.2}])
+    backend.add_memories("Hana", [{"text": "other agent", "embedding": [0.0, 1.0, 0.0, 0.0]}])
+
+    results = backend.search_memories("Akio", np.array([0.1, 0.9, 0.0, 0.0]), k=2)
+    assert [record["text"] for record, _ in results] == ["barn", "well"]
+    assert results[0][0]["importance"] == 0.1
+    assert results[0][1] == pytest.approx(0.9 / np.hypot(0.1, 0.9))
+    assert [record["text"] for record, _ in backend.search_memories("Akio", np.array([0.0, 0.0, 1.0, 0.0]), k=1)] == ["field"]
+
+
+def test_sqlite_search_reloads_stored_memories(tmp_path):
+    path = str(tmp_path / "game.sqlite")
+    writer = SQLiteStorage("run-1", path=path)
+    writer.add_memories("Akio", [{"text": "well", "embedding": [1.0, 0.0]}, {"text": "barn", "embedding": [0.0, 1.0]}])
+    writer.close()
+
+    reader = SQLiteStorage("run-1", path=path)
+    assert [record["text"] for record, _ in reader.search_memories("Akio", np.array([0.0, 1.0]), k=1)] == ["barn"]
+    assert SQLiteStorage("run-2", path=path).search_memories("Akio", np.array([0.0, 1.0])) == []
+    reader.close()
+
+
+def test_memory_mirror_receives_retriever_memories(backend):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    retriever = LocalTimeWeightedRetriever(embeddings=embeddings, k=2, mirror_collection=backend.memory_mirror("Akio"))
+    retriever.add_documents([Document(page_content=text, metadata={"importance": 0.1})
+                             for text in ("You see Hana near the well", "Kaio cooked food")], current_time=NOW)
+    retriever._mirror_executor.submit(lambda: None).result()  # one worker: every earlier write is done
+
+    results = backend.search_memories("Akio", embeddings.embed_query("Kaio cooked food"), k=1)
+    assert results[0][0]["text"] == "Kaio cooked food"
+    assert results[0][1] == pytest.approx(1.0)
+
+
+def test_get_storage_creates_one_backend(monkeypatch):
+    monkeypatch.setattr(storage, "_storage", None)
+    first = get_storage()
+    assert isinstance(first, InMemoryStorage) and get_storage() is first
+
+    configured = InMemoryStorage("run-2")
+    configure_storage(configured)
+    assert get_storage() is configured
+
+
+def test_get_storage_backend_kinds(tmp_path):
+    assert isinstance(get_storage_backend("memory", run_id="run-1"), InMemoryStorage)
+    sqlite_backend = get_storage_backend("sqlite", run_id="run-1", path=str(tmp_path / "game.sqlite"))
+    assert isinstance(sqlite_backend, SQLiteStorage) and sqlite_backend.run_id == "run-1"
+    sqlite_backend.close()
+    with pytest.raises(ValueError):
+        get_storage_backend("redis", run_id="run-1")
@@ -0,0 +1,25 @@
+import pytest
+
+from tournament import DEFAULT_CONFIG, plan_games
+
+
+def test_plan_games_cycles_configs_and_rosters():
+    rosters = [{"villagers": ["Akio", "Hana", "Kaio"], "werewolves": ["Madara"]}]
+    configs = [{"name": "a", "env": {}}, {"name": "b", "env": {"MAX_GAME_DAYS": "2"}}]
+
+    plan = plan_games(3, seed=10, rosters=rosters, configs=configs)
+
+    assert [game["seed"] for game in plan] == [10, 11, 12]
+    assert [game["config"] for game in plan] == ["a", "b", "a"]
+    assert plan[0]["env"] == DEFAULT_CONFIG
+    assert plan[1]["env"]["MAX_GAME_DAYS"] == "2"
+
+
+@pytest.mark.parametrize("roster", [
+    {"villagers": ["Akio", "Hana"], "werewolves": ["Madara"]},
+    {"villagers": ["Akio", "Hana", "Kaio"], "werewolves": []},
+    {"villagers": ["Akio", "Hana", "Nobody"], "werewolves": ["Madara"]},
+])
+def test_plan_games_rejects_decided_rosters(roster):
+    with pytest.raises(ValueError):
+        plan_games(1, rosters=[roster])
@@ -0,0 +1,38 @@
+import os
+import time
+
+from utils.translation import StubBackend, TranslationService
+
+
+def wait_for_completed(service, timeout=5):
+    deadline = time.time() + timeout
+    completed = {}
+    while not completed and time.time() < deadline:
+        completed = service.take_completed()
+        time.sleep(0.01)
+    return completed
+
+
+def test_translations_are_handed_out_once_by_id():
+    service = TranslationService(StubBackend(), target_lang="JA", cache_path=None, batch_delay=0)
+
+    assert service.translate("Good morning") is None
+    assert wait_for_completed(service) == {service.key("Good morning"): "[JA] Good morning"}
+    assert service.take_completed() == {}
+    # cached from now on, so it is sent with the conversation itself
+    assert service.translate("Good morning") == "[JA] Good morning"
+    assert service.take_completed() == {}
+
+
+def test_cache_survives_restarts(tmp_path):
+    path = str(tmp_path / "translations.jsonl")
+    service = TranslationService(StubBackend(), cache_path=path, batch_delay=0)
+    service.translate("Hello")
+    wait_for_completed(service)
+    deadline = time.time() + 5
+    while not (os.path.exists(path) and os.path.getsize(path)) and time.time() < deadline:
+        time.sleep(0.01)
+
+    restarted = TranslationService(StubBackend(), cache_path=path, batch_delay=0)
+    assert restarted.translate("Hello") == "[JA] Hello"
+    assert restarted.stats()["requests"] == 0
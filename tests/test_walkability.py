@@ -0,0 +1,49 @@
+import random
+
+import numpy as np
+
+from utils.task_locations import Path
+from utils.walkability import WalkabilityMap
+
+PATHS = [Path(10, 20, 50, 5), Path(40, 0, 6, 100), Path(90, 90, 40, 40)]  # the last one crosses the map's edge
+
+
+def on_any_path(x, y, paths, width=100, height=100):
+    return 0 <= x < width and 0 <= y < height and any(path.rect.collidepoint(x, y) for path in paths)
+
+
+def test_queries_match_the_rects():
+    rng = random.Random(0)
+    walkability = WalkabilityMap(PATHS, 100, 100)
+    points = [(rng.uniform(-10, 110), rng.uniform(-10, 110)) for _ in range(2000)]
+    points += [(10, 20), (59.9, 24.9), (60, 20), (45.5, 99.5), (99, 99), (100, 95)]
+
+    expected = [on_any_path(int(x // 1), int(y // 1), PATHS) for x, y in points]
+    assert [walkability.is_walkable(x, y) for x, y in points] == expected
+    xs, ys = np.array(points).T
+    assert walkability.walkable(xs, ys).tolist() == expected
+
+
+def test_coarse_resolution_covers_partial_cells():
+    walkability = WalkabilityMap([Path(5, 5, 2, 2)], 20, 20, resolution=4)
+    assert walkability.bitmap.shape == (5, 5)
+    assert walkability.is_walkable(4, 4) and walkability.is_walkable(7.9, 7.9)
+    assert not walkability.is_walkable(8, 8) and not walkability.is_walkable(3.9, 5)
+
+
+def test_extent_defaults_to_the_paths():
+    walkability = WalkabilityMap([Path(0, 0, 30, 10)])
+    assert walkability.bitmap.shape == (10, 30)
+    assert not walkability.is_walkable(30, 5)
+
+
+def test_ensure_rebuilds_only_when_the_layout_changed():
+    paths = [Path(0, 0, 10, 10)]
+    walkability = WalkabilityMap(paths, 50, 50)
+    bitmap = walkability.bitmap
+
+    assert walkability.ensure(paths).bitmap is bitmap
+    paths.append(Path(20, 20, 10, 10))
+    assert walkability.ensure(paths).is_walkable(25, 25)
+    other = [Path(40, 40, 5, 5)]
+    assert walkability.ensure(other).is_walkable(42, 42) and not walkability.is_walkable(5, 5)
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from utils import wire
+
+STATE = {
+    "numVillagers": 2,
+    "villagers": [{"agent_id": "Akio", "x": 10.5, "y": 20.0, "alive": True},
+                  {"agent_id": "Madara", "x": 3.0, "y": 4.25, "alive": False}],
+    "tasks": [{"x": 100.0, "y": 50.0, "label": "Cook food", "completed": True, "sabotaged": False},
+              {"x": 7.0, "y": 8.0, "label": "Fix fence", "completed": False, "sabotaged": True}],
+    "isDay": True,
+    "blendFactor": 0.5,
+    "isConvo": False,
+    "conversations": [{"villager1": "Akio", "villager2": "Hana", "conversation": "Akio : こんにちは"}],
+    "translatedText": "",
+    "translations": {"abc": "[JA] hello"},
+    "is_morning_meeting": True,
+    "villager_memories": {"Akio": ["saw Hana"]},
+}
+
+
+@pytest.mark.parametrize("encoding", [wire.JSON, wire.BINARY])
+def test_round_trip(encoding):
+    payload = wire.encode(STATE, encoding)
+    assert isinstance(payload, str if encoding == wire.JSON else bytes)
+    assert wire.decode(payload) == STATE
+
+
+def test_binary_is_smaller_than_json():
+    assert len(wire.encode(STATE, wire.BINARY)) < len(wire.encode(STATE, wire.JSON).encode("utf-8"))
+
+
+@pytest.mark.parametrize("payload", [
+    "not json",
+    wire.encode(STATE, wire.BINARY)[:20],
+    wire.encode(STATE, wire.BINARY)[:-5],
+    wire.MAGIC + bytes([wire.VERSION + 1]) + bytes(20),
+    b"\x81\xa1a\x01" if wire.msgpack is None else b"\xc1",
+])
+def test_malformed_payloads_raise_value_error(payload):
+    with pytest.raises(ValueError):
+        wire.decode(payload)
+
+
+@pytest.mark.parametrize("state", [{"hello": "world"}, [1, 2], {**STATE, "numVillagers": 70000}])
+def test_states_outside_the_binary_layout_raise_value_error(state):
+    with pytest.raises(ValueError):
+        wire.encode(state, wire.BINARY)
+
+
+def test_negotiation():
+    assert wire.encoding_from_path("/?encoding=binary") == wire.BINARY
+    assert wire.encoding_from_path("/") == wire.JSON
+    assert wire.hello_encoding(json.dumps({"hello": {"encoding": "binary"}})) == wire.BINARY
+    assert wire.hello_encoding('{"hello": 1}') is None
+    assert wire.hello_encoding('{"villagers": []}') is None
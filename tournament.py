@@ -0,0 +1,207 @@
+# tournament.py
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import runpy
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+'''
+Plays many headless games in parallel worker processes and summarizes them.
+
+Only the standard library is imported here: workers are spawned, and every
+game module reads its configuration from the environment when first imported,
+so nothing of the game may be imported before a worker has set it up.
+'''
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_PATH = os.path.join(BASE_DIR, "main.py")
+TOURNAMENT_DIR = os.getenv("TOURNAMENT_DIR", "tournaments")
+VILLAGERS = ["Akio", "Chiyo", "Hana", "Izumi", "Kaio"]
+WEREWOLVES = ["Katsumi", "Madara"]
+# environment of every tournament game, a config may override any of it.
+# The game clock is wall time even headless: a day lasts DAY_DURATION + NIGHT_DURATION seconds, the
+# morning meeting taking the first MORNING_MEETING_DURATION of the day. With the interactive 90s + 90s,
+# 5 days take 15 minutes; shortened nights and days play them in 7.5, leaving the meeting its full time
+DEFAULT_CONFIG = {
+    "MAX_GAME_DAYS": "5", "DAY_DURATION": "60", "NIGHT_DURATION": "30",
+    "METRICS_PORT": "0", "TELEMETRY_TARGETS": "jsonl", "STORAGE_BACKEND": "sqlite",
+}
+
+
+def validate_roster(roster):
+    """
+    Reject a roster whose game would be decided before it starts.
+
+    main.py gives the werewolves the win once two or fewer townsfolk are left, and the
+    townsfolk the win once no werewolf is, and it silently ignores unknown names.
+
+    Raises:
+        ValueError: If the roster names unknown agents, has fewer than 3 villagers or no werewolf.
+    """
+    unknown = [name for name in roster["villagers"] if name not in VILLAGERS]
+    unknown += [name for name in roster["werewolves"] if name not in WEREWOLVES]
+    if unknown:
+        raise ValueError(f"Unknown agents in roster: {', '.join(unknown)}")
+    if len(set(roster["villagers"])) <= 2:
+        raise ValueError(f"A roster needs at least 3 villagers, got {roster['villagers']}")
+    if not roster["werewolves"]:
+        raise ValueError("A roster needs at least one werewolf")
+
+
+def plan_games(games, seed=0, rosters=None, configs=None):
+    """
+    Plan the games of a tournament.
+
+    Parameters:
+        games (int): Number of games.
+        seed (int): Seed of the first game, game i plays with seed + i.
+        rosters (list): {"villagers": [...], "werewolves": [...]} dicts, cycled through; the full cast by default.
+        configs (list): {"name": ..., "env": {...}} dicts of environment overrides, cycled through with the rosters.
+
+    Returns:
+        list: One {"name", "seed", "villagers", "werewolves", "config", "env"} dict per game.
+
+    Raises:
+        ValueError: If a roster could not make a game, see validate_roster.
+    """
+    rosters = rosters or [{"villagers": VILLAGERS, "werewolves": WEREWOLVES}]
+    for roster in rosters:
+        validate_roster(roster)
+    configs = configs or [{"name": "default", "env": {}}]
+    variants = itertools.cycle(itertools.product(configs, rosters))
+    plan = []
+    for i, (config, roster) in zip(range(games), variants):
+        plan.append({
+            "name": f"game-{i:03d}",
+            "seed": seed + i,
+            "villagers": roster["villagers"],
+            "werewolves": roster["werewolves"],
+            "config": config["name"],
+            "env": {**DEFAULT_CONFIG, **config.get("env", {})},
+        })
+    return plan
+
+
+def run_game(game, directory):
+    """
+    Play one headless game in this worker process.
+
+    The game runs in its own working directory, so its conversations, storage,
+    checkpoints and caches never collide with the other games.
+
+    Returns:
+        dict: The game's result as written by main.py, with the game's plan and, on failure, the error.
+    """
+    game_dir = os.path.abspath(os.path.join(directory, game["name"]))
+    os.makedirs(game_dir, exist_ok=True)
+    result_path = os.path.join(game_dir, "result.json")
+    os.environ.update(game["env"])
+    os.environ.update({
+        "HEADLESS": "1",
+        "GAME_SEED": str(game["seed"]),
+        "GAME_VILLAGERS": ",".join(game["villagers"]),
+        "GAME_WEREWOLVES": ",".join(game["werewolves"]),
+        "GAME_RESULT_PATH": result_path,
+        "RUN_ID": f"{os.path.basename(os.path.abspath(directory))}-{game['name']}",
+    })
+    os.chdir(game_dir)
+    sys.path.insert(0, BASE_DIR)
+    random.seed(game["seed"])
+    started = time.time()
+    try:
+        runpy.run_path(MAIN_PATH, run_name="__main__")
+        with open(result_path) as f:
+            result = json.load(f)
+    except (Exception, SystemExit) as e:  # main.py may call quit()
+        result = {"error": f"{type(e).__name__}: {e}"}
+    result.update({"game": game["name"], "config": game["config"], "wall_seconds": time.time() - started})
+    return result
+
+
+def summarize(results):
+    """
+    Aggregate game results per config.
+
+    Returns:
+        dict: Per config: games, failures, wins by side, undecided games, mean days,
+              vote accuracy and mean LLM calls, tokens and cost per game.
+    """
+    summary = {}
+    for config in sorted({result["config"] for result in results}):
+        games = [result for result in results if result["config"] == config]
+        played = [result for result in games if "error" not in result]
+        votes_cast = sum(result["votes_cast"] for result in played)
+        per_game = lambda key: sum(result["llm"][key] for result in played) / len(played) if played else 0
+        summary[config] = {
+            "games": len(games),
+            "failures": len(games) - len(played),
+            "townsfolk_wins": sum(result["winner"] == "townsfolk" for result in played),
+            "werewolf_wins": sum(result["winner"] == "werewolves" for result in played),
+            "undecided": sum(result["winner"] is None for result in played),
+            "mean_days": sum(result["days"] for result in played) / len(played) if played else 0,
+            "vote_accuracy": sum(result["votes_correct"] for result in played) / votes_cast if votes_cast else None,
+            "llm_calls_per_game": per_game("calls"),
+            "tokens_per_game": per_game("prompt_tokens") + per_game("completion_tokens"),
+            "cost_per_game": per_game("cost"),
+        }
+    return summary
+
+
+def run_tournament(plan, directory, workers=None):
+    """
+    Play the planned games on a process pool and write results.json and summary.json.
+
+    Parameters:
+        plan (list): Games, as returned by plan_games.
+        directory (str): Directory of the tournament, one subdirectory per game.
+        workers (int): Worker processes, one per core by default.
+
+    Returns:
+        dict: The summary.
+    """
+    os.makedirs(directory, exist_ok=True)
+    results = []
+    # a fresh spawned process per game: game modules keep per-run state at module level
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as pool:
+        futures = {pool.submit(run_game, game, directory): game for game in plan}
+        for future in as_completed(futures):
+            game = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:  # the worker process died
+                result = {"game": game["name"], "config": game["config"], "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            print(f"{result['game']} ({result['config']}): {result.get('error') or result['winner'] or 'undecided'} "
+                  f"[{len(results)}/{len(plan)}]")
+
+    results.sort(key=lambda result: result["game"])
+    summary = summarize(results)
+    with open(os.path.join(directory, "results.json"), "w") as f:
+        json.dump(results, f, indent=4)
+    with open(os.path.join(directory, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play headless games in parallel and summarize them.")
+    parser.add_argument("--games", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per core by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spec", help='JSON file with optional "rosters" and "configs" lists, see plan_games')
+    parser.add_argument("--out", default=os.path.join(TOURNAMENT_DIR, time.strftime("%Y%m%d-%H%M%S")))
+    args = parser.parse_args()
+
+    spec = {}
+    if args.spec:
+        with open(args.spec) as f:
+            spec = json.load(f)
+    plan = plan_games(args.games, args.seed, spec.get("rosters"), spec.get("configs"))
+    summary = run_tournament(plan, args.out, args.workers)
+    print(json.dumps(summary, indent=4))
@@ -4,6 +4,7 @@ from typing import Any, Dict, List, Optional, Tuple
 from langchain_core.language_models import BaseLanguageModel
 from utils.agentmemory import AgentMemory
 from utils.track_tokens import token_tracker
+from utils.token_budget import token_ledger
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 from utils.prompts import agentPromptJson
@@ -48,17 +49,28 @@ class Agent:
             self.chain(prompt).invoke({"entity":entity_name, "observation":observation})
         )
     
+    def _fetch_related_memories(self, observation: str, entity_names: Optional[List[str]] = None) -> List[Any]:
+        """Fetch the memories relevant to an observation, and to the agents or tasks it names when given."""
+        if entity_names:
+            return self.memory.fetch_memories_about(observation, entity_names)
+        return self.memory.fetch_memories(observation=observation)
+
     @token_tracker
-    def summarize_related_memories(self, observation: str) -> str:
+    def summarize_related_memories(self, observation: str, entity_names: Optional[List[str]] = None) -> str:
         """Summarize memories that are most relevant to an observation."""
         prompt = PromptTemplate.from_template(agentPromptJson['summarize_related_memories'])
         entity_name = self._get_entity_from_observation(observation)
         entity_action = self._get_entity_action(observation, entity_name)
-        relevant_memories = self.memory.fetch_memories(observation=observation)
+        relevant_memories = self._fetch_related_memories(observation, entity_names)
         q1 = f"What is the relationship between {self.name} and {entity_name}"
         q2 = f"{entity_name} is {entity_action}"
         return self.chain(prompt=prompt).invoke({"q1":q1, "queries":[q1, q2], "relevant_memories" : relevant_memories})
     
+    def _list_related_memories(self, observation: str, entity_names: Optional[List[str]] = None) -> str:
+        """List the memories most relevant to an observation, without summarizing them with the LLM."""
+        relevant_memories = self._fetch_related_memories(observation, entity_names)
+        return "\n".join([self.memory._format_memory_detail(memory) for memory in relevant_memories])
+
     def _clean_response(self, text: str) -> str:
         return re.sub(f"^{self.name} ", "", text.strip()).strip()
     
@@ -85,7 +97,7 @@ class Agent:
         since_refresh = (current_time - self.last_refreshed).seconds
         if (
             not self.summary
-            or since_refresh >= self.summary_refresh_seconds
+            or (since_refresh >= self.summary_refresh_seconds and token_ledger.cognition(self.name)["refresh_summary"])
             or force_refresh
         ):
             self.summary = self._compute_agent_summary()
@@ -99,14 +111,21 @@ class Agent:
     
     @token_tracker
     def _generate_reaction(
-        self, observation: str, suffix: str, now: Optional[datetime] = None, last_k : Optional[int] = 15
+        self, observation: str, suffix: str, now: Optional[datetime] = None, last_k : Optional[int] = 15,
+        entity_names: Optional[List[str]] = None
     ) -> str:
         """React to a given observation or dialogue act."""
         prompt = PromptTemplate.from_template(agentPromptJson['_generate_reaction'] + suffix)
+        # agents close to their token budget think with fewer and cheaper calls
+        cognition = token_ledger.cognition(self.name)
+        last_k = min(last_k, cognition["last_k"])
 
         with ThreadPoolExecutor() as executor:
             agent_summary_thread = executor.submit(self.get_summary, now=now)
-            relevant_memories_thread = executor.submit(self.summarize_related_memories, observation)
+            if cognition["summarize_related_memories"]:
+                relevant_memories_thread = executor.submit(self.summarize_related_memories, observation, entity_names)
+            else:
+                relevant_memories_thread = executor.submit(self._list_related_memories, observation, entity_names)
 
             agent_summary_description = agent_summary_thread.result()
             relevant_memories_str = relevant_memories_thread.result()
@@ -144,12 +163,12 @@ class Agent:
     def generate_reaction(
         self, observation: str, now: Optional[datetime] = None,
         call_to_action_template = (agentPromptJson['generate_reaction']),
-        villager = "None"
+        villager = "None", entity_names: Optional[List[str]] = None
     ) -> Tuple[bool, str]:
-        """React to a given observation."""
+        """React to a given observation, recalling what the agent remembers about `entity_names` when given."""
      
         full_result = self._generate_reaction(
-            observation, call_to_action_template, now=now
+            observation, call_to_action_template, now=now, entity_names=entity_names
         )
         result = full_result.strip().split("\n")[0]
 
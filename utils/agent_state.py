@@ -0,0 +1,150 @@
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+SPEED = 2
+ARRIVAL_DISTANCE = 2  # agents within this distance of their target start their task
+# tried in order, an agent takes the first direction that brings it closer to its target
+DIRECTIONS = np.array([
+    (0, -1), (0, 1), (-1, 0), (1, 0),
+    (-1, -1), (-1, 1), (1, -1), (1, 1)
+], dtype=np.float64)
+
+
+class AgentStateStore:
+    """
+    Structure-of-arrays state of every agent in the game.
+
+    Positions, task targets, speeds and status flags live in NumPy arrays
+    indexed by a slot allocated per agent. `step` moves every agent with a
+    task in one vectorized pass, and Villager objects read and write their
+    slot through `StateField` descriptors.
+
+    With a navigation grid attached, agents follow the flow field towards
+    their target and only step greedily where the field has no direction.
+
+    Attributes:
+        size (int): Slots allocated.
+        walkable (callable): Optional `walkable(xs, ys) -> bool array`, used when no direction brings an agent closer.
+        navigation (NavGrid): Optional navigation grid, see utils.navigation.
+    """
+
+    FLOAT_FIELDS = ("x", "y", "target_x", "target_y", "speed")
+    BOOL_FIELDS = ("alive", "talking", "doing", "tasked", "uses_paths")
+    INT_FIELDS = ("field",)
+
+    def __init__(self, capacity: int = 64, walkable: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None, navigation=None):
+        self.size = 0
+        self.walkable = walkable
+        self.navigation = navigation
+        for name in self.FLOAT_FIELDS:
+            setattr(self, name, np.full(capacity, np.nan))
+        for name in self.BOOL_FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=bool))
+        for name in self.INT_FIELDS:
+            setattr(self, name, np.full(capacity, -1, dtype=np.int64))
+
+    def _grow(self):
+        capacity = 2 * len(self.x)
+        for name in self.FLOAT_FIELDS + self.BOOL_FIELDS + self.INT_FIELDS:
+            array = getattr(self, name)
+            fill = np.nan if name in self.FLOAT_FIELDS else (False if name in self.BOOL_FIELDS else -1)
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def allocate(self, x: float, y: float, speed: float = SPEED, uses_paths: bool = False) -> int:
+        """
+        Allocate the slot of a new agent.
+
+        Parameters:
+            x (float): Starting X-coordinate.
+            y (float): Starting Y-coordinate.
+            speed (float): Distance moved per step.
+            uses_paths (bool): Whether the agent may fall back to stepping along walkable paths.
+
+        Returns:
+            int: The agent's slot.
+        """
+        if self.size == len(self.x):
+            self._grow()
+        slot = self.size
+        self.size += 1
+        self.x[slot], self.y[slot], self.speed[slot] = x, y, speed
+        self.alive[slot] = True
+        self.uses_paths[slot] = uses_paths
+        return slot
+
+    def set_target(self, slot: int, location: Optional[Tuple[float, float]]):
+        """Set or clear the target of an agent, with the flow field towards it when navigating."""
+        if location is None:
+            self.target_x[slot] = self.target_y[slot] = np.nan
+            self.field[slot] = -1
+            return
+        self.target_x[slot], self.target_y[slot] = location
+        self.field[slot] = self.navigation.field_index(*location) if self.navigation is not None else -1
+
+    def moving(self) -> np.ndarray:
+        """Return the slots of agents heading to a task: alive, tasked, not talking and not doing it yet."""
+        n = self.size
+        mask = self.alive[:n] & self.tasked[:n] & ~self.talking[:n] & ~self.doing[:n] & ~np.isnan(self.target_x[:n])
+        return np.flatnonzero(mask)
+
+    def step(self):
+        """Move every moving agent one step towards its target."""
+        idx = self.moving()
+        if not idx.size:
+            return
+        x, y = self.x[idx], self.y[idx]
+        tx, ty = self.target_x[idx], self.target_y[idx]
+        speed = self.speed[idx]
+        current = np.hypot(tx - x, ty - y)
+
+        codes = np.full(idx.size, -1)
+        fields = self.field[idx]
+        navigating = fields >= 0
+        if self.navigation is not None:
+            # the last couple of cells are walked greedily, so agents don't bounce off the target cell's border
+            navigating &= current > 2 * self.navigation.cell_size
+        if self.navigation is not None and navigating.any():
+            codes[navigating] = self.navigation.directions(fields[navigating], x[navigating], y[navigating])
+        following = codes >= 0
+
+        next_x = x[:, None] + speed[:, None] * DIRECTIONS[:, 0]
+        next_y = y[:, None] + speed[:, None] * DIRECTIONS[:, 1]
+        closer = np.hypot(tx[:, None] - next_x, ty[:, None] - next_y) < current[:, None]
+        moved = closer.any(axis=1)
+        first = closer.argmax(axis=1)
+        rows = np.arange(idx.size)
+        new_x = np.where(moved, next_x[rows, first], x)
+        new_y = np.where(moved, next_y[rows, first], y)
+        new_x[following] = next_x[rows[following], codes[following]]
+        new_y[following] = next_y[rows[following], codes[following]]
+
+        stuck = np.flatnonzero(~moved & ~following & self.uses_paths[idx])
+        if stuck.size and self.walkable is not None:
+            nudged = x[stuck] + speed[stuck]
+            on_path = self.walkable(nudged, y[stuck])
+            new_x[stuck[on_path]] = nudged[on_path]
+
+        self.x[idx] = new_x
+        self.y[idx] = new_y
+
+
+class StateField:
+    """Descriptor exposing one store array as an attribute of the object owning a slot."""
+
+    def __init__(self, array: str, cast: Callable = float):
+        self.array = array
+        self.cast = cast
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return self.cast(getattr(obj.state, self.array)[obj.slot])
+
+    def __set__(self, obj, value):
+        getattr(obj.state, self.array)[obj.slot] = value
+
+
+agent_states = AgentStateStore()
@@ -2,24 +2,32 @@ import re
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 from utils.track_tokens import token_tracker
-from langchain.retrievers import TimeWeightedVectorStoreRetriever
+from langchain_core.retrievers import BaseRetriever
 from langchain.schema import BaseMemory, Document
+from langchain_core.pydantic_v1 import Field
 from langchain.utils import mock_now
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.prompts import PromptTemplate
 from concurrent.futures import ThreadPoolExecutor
 import concurrent.futures
-import json
 from utils.prompts import agentMemoryPromptJson
+from utils.memory_journal import memory_journal
+from utils.reflection_queue import reflection_queue
+from utils.retrieval_cache import RetrievalCache
+from utils.metrics import metrics
 
 class AgentMemory(BaseMemory):
 
     llm : BaseLanguageModel
-    memory_retriever : TimeWeightedVectorStoreRetriever
+    memory_retriever : BaseRetriever
     reflection_threshold : Optional[float] = None
     current_plan : List[str] = []
     importance_weight : float = 0.15
     aggregate_importance: float = 0.0
+    owner : str = "agent"
+    memory_version: int = 0
+    retrieval_cache: RetrievalCache = Field(default_factory=RetrievalCache)
+    entity_memories_per_name : int = 3
 
     # meta data
     # input keys
@@ -39,13 +47,14 @@ class AgentMemory(BaseMemory):
     def chain(self, prompt : PromptTemplate):
         return prompt | self.llm
     
-    def token_tracked_chain(self, prompt, variables):
-        @token_tracker
-        def invoke(prompt, variables):
-            response = self.chain(prompt).invoke(variables)
+    def token_tracked_chain(self, prompt, variables, call_site: str = "token_tracked_chain"):
+        def invoke(memory, prompt, variables):
+            response = memory.chain(prompt).invoke(variables)
             return response
-        
-        return invoke(prompt, variables)
+        # token usage is accounted to the owner of the memory and the calling method
+        invoke.__name__ = call_site
+
+        return token_tracker(invoke)(self, prompt, variables)
     
     def _parse_list(self, text: str) -> List[str]:
         """Parse a newline-separated string into a list of strings."""
@@ -60,19 +69,19 @@ class AgentMemory(BaseMemory):
         #     logger.info("Character is reflecting")
         new_insights = []
         topics = self._get_topics_of_reflection()
-        with ThreadPoolExecutor as executor:
+        with ThreadPoolExecutor() as executor:
             insights_threads = [executor.submit(self._get_insights_on_topic, topic, now=now) for topic in topics]
             for insights in concurrent.futures.as_completed(insights_threads):
-                for insight in insights:
-                    self.add_memory(insight, now=now,agent_name=agent_name)
-                new_insights.extend(insights)
+                new_insights.extend(insights.result())
+        # write every insight back in a single batch
+        self.add_memories(new_insights, now=now, agent_name=agent_name)
         return new_insights
 
     def _score_memory_importance(self, memory_content: str) -> float:
         """Score the absolute importance of the given memory."""
         prompt = PromptTemplate.from_template(agentMemoryPromptJson["_score_memory_importance"])
         variables = {"memory_content":memory_content}
-        score = self.token_tracked_chain(prompt, variables)
+        score = self.token_tracked_chain(prompt, variables, call_site="_score_memory_importance")
         match = re.search(r"^\D*(\d+)", score)
         # if self.verbose:
         #     logger.info(f"Importance score: {score}")
@@ -85,34 +94,74 @@ class AgentMemory(BaseMemory):
         self, memory_content: str, now: Optional[datetime] = None,agent_name: str = "agent"
     ) -> List[str]:
         """Add an observation or memory to the agent's memory."""
-        with open(f"memories/{agent_name}_memories.json", 'r+') as file:
-                # print(f"saving memory of{agent_name}")
-                memories = json.load(file)
-                memories.append({'memory': memory_content, 'timestamp': datetime.now().isoformat()})
-                file.seek(0)
-                json.dump(memories, file, indent=4)
-        
+        memory_journal.append(agent_name, memory_content)
+
         importance_score = self._score_memory_importance(memory_content)
         self.aggregate_importance += importance_score
         document = Document(
             page_content=memory_content, metadata={"importance": importance_score}
         )
         result = self.memory_retriever.add_documents([document], current_time=now)
+        self.memory_version += 1
+        self._maybe_reflect(now=now, agent_name=agent_name)
+        return result
+
+    def add_shared_memory(
+        self, memory_content: str, embedding: List[float], importance_score: float,
+        event_id: Optional[int] = None, now: Optional[datetime] = None, agent_name: str = "agent"
+    ) -> List[str]:
+        """Add this agent's wording of a world event, reusing the event's embedding and importance score."""
+        memory_journal.append(agent_name, memory_content, event_id=event_id)
+        self.aggregate_importance += importance_score
+        document = Document(
+            page_content=memory_content, metadata={"importance": importance_score, "event_id": event_id}
+        )
+        if hasattr(self.memory_retriever, "add_embedded_documents"):
+            result = self.memory_retriever.add_embedded_documents([document], [embedding], current_time=now)
+        else:
+            result = self.memory_retriever.add_documents([document], current_time=now)
+        self.memory_version += 1
+        self._maybe_reflect(now=now, agent_name=agent_name)
+        return result
 
+    def _maybe_reflect(self, now: Optional[datetime] = None, agent_name: str = "agent"):
         if (
             self.reflection_threshold is not None
             and self.aggregate_importance > self.reflection_threshold
             and not self.reflecting
         ):
+            # Reflection runs in the background; clear the importance that triggered it
             self.reflecting = True
-            self.pause_to_reflect(now=now,agent_name=agent_name)
-            # Hack to clear the importance from reflection
             self.aggregate_importance = 0.0
-            self.reflecting = False
+            reflection_queue.submit(self, agent_name, now=now)
+
+    def add_memories(
+        self, memory_contents: List[str], now: Optional[datetime] = None,agent_name: str = "agent"
+    ) -> List[str]:
+        """Add several memories at once, scoring them concurrently and embedding them in one call.
+
+        Unlike add_memory this never triggers a reflection, as it is how reflections write back their insights.
+        """
+        if not memory_contents:
+            return []
+        for memory_content in memory_contents:
+            memory_journal.append(agent_name, memory_content)
+        with ThreadPoolExecutor() as executor:
+            importance_scores = list(executor.map(self._score_memory_importance, memory_contents))
+        documents = [
+            Document(page_content=memory_content, metadata={"importance": importance_score})
+            for memory_content, importance_score in zip(memory_contents, importance_scores)
+        ]
+        result = self.memory_retriever.add_documents(documents, current_time=now)
+        self.memory_version += 1
         return result
-    
+
     def _format_memory_detail(self, memory: Document, prefix: str = "") -> str:
         created_time = memory.metadata["created_at"].strftime("%B %d, %Y, %I:%M %p")
+        count = memory.metadata.get("count", 1)
+        if count > 1:
+            first_seen = memory.metadata["first_seen"].strftime("%I:%M %p")
+            return f"{prefix}[{created_time}] {memory.page_content.strip()} (seen {count} times since {first_seen})"
         return f"{prefix}[{created_time}] {memory.page_content.strip()}"
     
     def _get_topics_of_reflection(self, last_k: int = 50) -> List[str]:
@@ -123,21 +172,56 @@ class AgentMemory(BaseMemory):
             [self._format_memory_detail(o) for o in observations]
         )
         variables = {"observations" : observation_str}
-        result = self.token_tracked_chain(prompt, variables)
-        return self._parse_list(result.content)
+        result = self.token_tracked_chain(prompt, variables, call_site="_get_topics_of_reflection")
+        return self._parse_list(result)
     
     # working with warning
     def fetch_memories(
         self, observation: str, now: Optional[datetime] = None
     ) -> List[Document]:
-        """Fetch related memories."""
+        """Fetch related memories, answering repeated queries between two writes from the retrieval cache."""
+        # the retriever's own version also covers compaction and eviction
+        version = (self.memory_version, getattr(self.memory_retriever, "version", None), now)
+        cached = self.retrieval_cache.get(observation, version)
+        if cached is not None:
+            return cached
         # remove mock now, uneccessarily complicating
-        if now is not None:
-            with mock_now(now):
-                return self.memory_retriever.invoke(observation)
-        else:
-            return self.memory_retriever.invoke(observation)
-    
+        with metrics.timed("retrieval_seconds", kind="vector"):
+            if now is not None:
+                with mock_now(now):
+                    documents = self.memory_retriever.invoke(observation)
+            else:
+                documents = self.memory_retriever.invoke(observation)
+        self.retrieval_cache.put(observation, version, documents)
+        return documents
+
+    def fetch_entity_memories(self, entity_name: str) -> List[Document]:
+        """Fetch the memories mentioning an agent or task, without embedding anything."""
+        if getattr(self.memory_retriever, "entity_index", None) is None:
+            return self.fetch_memories(entity_name)
+        version = (self.memory_version, getattr(self.memory_retriever, "version", None), "entity")
+        cached = self.retrieval_cache.get(entity_name, version)
+        if cached is not None:
+            return cached
+        with metrics.timed("retrieval_seconds", kind="entity"):
+            documents = self.memory_retriever.get_entity_documents(entity_name)
+        self.retrieval_cache.put(entity_name, version, documents)
+        return documents
+
+    def fetch_memories_about(
+        self, observation: str, entity_names: List[str], now: Optional[datetime] = None
+    ) -> List[Document]:
+        """Fetch the memories related to an observation, followed by the top memories mentioning each named agent or task."""
+        documents = list(self.fetch_memories(observation, now=now))
+        seen = {doc.metadata.get("buffer_idx", doc.page_content) for doc in documents}
+        for entity_name in entity_names:
+            for doc in self.fetch_entity_memories(entity_name)[:self.entity_memories_per_name]:
+                key = doc.metadata.get("buffer_idx", doc.page_content)
+                if key not in seen:
+                    seen.add(key)
+                    documents.append(doc)
+        return documents
+
     def _get_insights_on_topic(
         self, topic: str, now: Optional[datetime] = None
     ) -> List[str]:
@@ -156,9 +240,9 @@ class AgentMemory(BaseMemory):
             "related_statements":related_statements
         }
 
-        result = self.token_tracked_chain(prompt, variables)
+        result = self.token_tracked_chain(prompt, variables, call_site="_get_insights_on_topic")
         # TODO: Parse the connections between memories and insights
-        return self._parse_list(result.content)
+        return self._parse_list(result)
     
     def clear(self) -> None:
         return
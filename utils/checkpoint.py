@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.logger import logger
+from utils.memory_tiers import decode_metadata, encode_metadata
+from villager import Werewolf
+
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "checkpoints/latest")
+_save_lock = threading.Lock()  # saves run in background threads and share the .tmp and .old directories
+
+
+def snapshot_villager(villager) -> Dict[str, Any]:
+    """Capture the position, task and status of a villager, werewolf or player."""
+    now = time.time()
+    state = {
+        "agent_id": villager.agent_id,
+        "x": villager.x,
+        "y": villager.y,
+        "alive": villager.alive,
+        "current_task": villager.current_task,
+        "task_location": villager.task_location,
+        "time_to_complete_task": villager.time_to_complete_task,
+        "task_doing": villager.task_doing,
+        "task_remaining": villager.task_end_time - now if villager.task_doing else None,
+        "last_talk_attempt_age": now - villager.last_talk_attempt_time,
+        "summary": villager.agent.summary,
+        "aggregate_importance": villager.agent.memory.aggregate_importance,
+    }
+    if hasattr(villager, "kill_cooldown"):
+        state["kill_cooldown_remaining"] = villager.kill_cooldown - now
+    return state
+
+
+def restore_villager(villager, state: Dict[str, Any], tasks: Dict[str, Any]):
+    """
+    Restore a villager captured by `snapshot_villager`.
+
+    Parameters:
+        villager (Villager): Freshly created villager with the same agent_id.
+        state (dict): The snapshot.
+        tasks (dict): Task objects keyed by task name, used to rebind the task callback.
+    """
+    now = time.time()
+    villager.x, villager.y = state["x"], state["y"]
+    villager.alive = state["alive"]
+    villager.current_task = state["current_task"]
+    villager.task_location = tuple(state["task_location"]) if state["task_location"] else None
+    villager.time_to_complete_task = state["time_to_complete_task"]
+    villager.task_doing = state["task_doing"]
+    if state["task_remaining"] is not None:
+        villager.task_start_time = now
+        villager.task_end_time = now + state["task_remaining"]
+    villager.last_talk_attempt_time = now - state["last_talk_attempt_age"]
+    villager.agent.summary = state["summary"]
+    villager.agent.memory.aggregate_importance = state["aggregate_importance"]
+    if "kill_cooldown_remaining" in state:
+        villager.kill_cooldown = now + state["kill_cooldown_remaining"]
+    task = tasks.get(state["current_task"])
+    if task is not None:
+        villager.task_complete_function = task.sabotage if isinstance(villager, Werewolf) else task.complete
+
+
+def save_checkpoint(game_state: Dict[str, Any], memories: Dict[str, Any], directory: str = CHECKPOINT_DIR):
+    """
+    Write a checkpoint directory.
+
+    The game state goes to `state.json`. Each agent's hot memory stream goes to
+    `{agent}.memories.json` and its normalized embeddings to `{agent}.embeddings.npy`
+    (with the buffer indexes in `{agent}.ids.npy`), which can be memory-mapped when
+    loaded. The checkpoint is written next to the target and swapped in at the end,
+    so a crash while saving never corrupts the previous checkpoint. Saves from
+    concurrent threads are serialized, as they share the temporary directories.
+
+    Parameters:
+        game_state (dict): JSON serialisable game state.
+        memories (dict): Exported (documents, embeddings) pairs keyed by agent name.
+        directory (str): Where to write the checkpoint.
+    """
+    with _save_lock:
+        started = time.time()
+        tmp_directory = directory + ".tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+
+        for agent_name, (documents, embeddings) in memories.items():
+            np.save(os.path.join(tmp_directory, f"{agent_name}.embeddings.npy"), embeddings)
+            np.save(os.path.join(tmp_directory, f"{agent_name}.ids.npy"),
+                    np.array([doc.metadata["buffer_idx"] for doc in documents], dtype=np.int64))
+            with open(os.path.join(tmp_directory, f"{agent_name}.memories.json"), "w") as f:
+                json.dump([{"text": doc.page_content, "metadata": encode_metadata(doc.metadata)} for doc in documents], f)
+
+        with open(os.path.join(tmp_directory, "state.json"), "w") as f:
+            json.dump({"saved_at": time.time(), "agents": list(memories), **game_state}, f)
+
+        old_directory = directory + ".old"
+        shutil.rmtree(old_directory, ignore_errors=True)
+        if os.path.exists(directory):
+            os.replace(directory, old_directory)
+        os.replace(tmp_directory, directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+        logger.info(f"Checkpoint saved to {directory} in {time.time() - started:.2f}s")
+
+
+def checkpoint_run_id(directory: str = CHECKPOINT_DIR):
+    """Return the run id a checkpoint was saved by, or None for checkpoints without one."""
+    with open(os.path.join(directory, "state.json"), "r") as f:
+        return json.load(f).get("run_id")
+
+
+def load_checkpoint(directory: str = CHECKPOINT_DIR) -> Tuple[Dict[str, Any], Dict[str, Tuple[List[Document], np.ndarray]]]:
+    """
+    Read a checkpoint written by `save_checkpoint`.
+
+    Returns:
+        tuple: (game state, (documents, memory-mapped embeddings) keyed by agent name).
+    """
+    with open(os.path.join(directory, "state.json"), "r") as f:
+        game_state = json.load(f)
+
+    memories = {}
+    for agent_name in game_state["agents"]:
+        embeddings = np.load(os.path.join(directory, f"{agent_name}.embeddings.npy"), mmap_mode="r")
+        ids = np.load(os.path.join(directory, f"{agent_name}.ids.npy"))
+        with open(os.path.join(directory, f"{agent_name}.memories.json"), "r") as f:
+            entries = json.load(f)
+        documents = []
+        for buffer_idx, entry in zip(ids.tolist(), entries):
+            metadata = decode_metadata(entry["metadata"])
+            metadata["buffer_idx"] = buffer_idx
+            documents.append(Document(page_content=entry["text"], metadata=metadata))
+        memories[agent_name] = (documents, embeddings)
+    return game_state, memories
@@ -0,0 +1,100 @@
+import datetime
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+from utils.logger import logger
+
+BUCKET_SIZE = 200  # utterances per bucket document
+MEETING = "meeting"  # the listener of everything said in a meeting
+
+
+class ConversationStore:
+    """
+    Bucketed conversation storage.
+
+    Utterances are grouped into bucket documents, one bucket per run, game day,
+    pair of participants and meeting, holding at most `bucket_size` utterances:
+
+        {"run_id", "day", "meeting", "participants": [a, b], "count",
+         "first_at", "last_at", "utterances": [{"speaker", "listener", "text", "time"}]}
+
+    Participants are sorted, so both directions of a dialogue share a bucket.
+    Utterances said in a meeting have the meeting number set and the speaker as
+    their only participant. Compound indexes on (run_id, day, participants) and
+    (run_id, meeting) answer the queries below without a collection scan.
+    """
+
+    def __init__(self, collection, run_id: str, bucket_size: int = BUCKET_SIZE):
+        self.collection = collection
+        self.run_id = run_id
+        self.bucket_size = bucket_size
+        self._indexed = False
+
+    def ensure_indexes(self):
+        if self._indexed:
+            return
+        self.collection.create_index([("run_id", ASCENDING), ("day", ASCENDING), ("participants", ASCENDING)])
+        self.collection.create_index([("run_id", ASCENDING), ("meeting", ASCENDING)])
+        self._indexed = True
+
+    @staticmethod
+    def _participants(speaker: str, listener: str) -> List[str]:
+        if listener == MEETING:
+            return [speaker]
+        return sorted({speaker, listener})
+
+    def append(self, conversations: List[Dict[str, Any]], day: int, meeting: Optional[int] = None, now: Optional[datetime.datetime] = None):
+        """
+        Store a batch of utterances with one bulk write.
+
+        Parameters:
+            conversations (list): {"villager1", "villager2", "conversation"} dicts, as produced by the game.
+            day (int): Current game day.
+            meeting (int): Number of the current meeting, applied to utterances addressed to the meeting.
+            now (datetime): Time of the utterances.
+        """
+        if not conversations:
+            return
+        self.ensure_indexes()
+        now = now or datetime.datetime.now()
+        buckets: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+        for convo in conversations:
+            speaker, listener = convo["villager1"], convo["villager2"]
+            bucket_meeting = meeting if listener == MEETING else None
+            key = (tuple(self._participants(speaker, listener)), bucket_meeting)
+            buckets.setdefault(key, []).append({"speaker": speaker, "listener": listener, "text": convo["conversation"], "time": now})
+
+        operations = []
+        for (participants, bucket_meeting), utterances in buckets.items():
+            for start in range(0, len(utterances), self.bucket_size):
+                chunk = utterances[start:start + self.bucket_size]
+                operations.append(UpdateOne(
+                    {"run_id": self.run_id, "day": day, "participants": list(participants), "meeting": bucket_meeting,
+                     "count": {"$lte": self.bucket_size - len(chunk)}},
+                    {"$push": {"utterances": {"$each": chunk}}, "$inc": {"count": len(chunk)},
+                     "$min": {"first_at": now}, "$max": {"last_at": now}},
+                    upsert=True,
+                ))
+        self.collection.bulk_write(operations, ordered=False)
+        logger.debug(f"Stored {len(conversations)} utterances in {len(operations)} buckets")
+
+    def _utterances(self, filter: Dict[str, Any]) -> List[Dict[str, Any]]:
+        utterances = []
+        for bucket in self.collection.find({"run_id": self.run_id, **filter}, {"utterances": 1, "_id": 0}):
+            utterances.extend(bucket["utterances"])
+        utterances.sort(key=lambda utterance: utterance["time"])
+        return utterances
+
+    def dialogue_between(self, a: str, b: str, day: int) -> List[Dict[str, Any]]:
+        """Return everything a and b said to each other on a game day, oldest first."""
+        return self._utterances({"day": day, "participants": self._participants(a, b), "meeting": None})
+
+    def meeting_transcript(self, meeting: int) -> List[Dict[str, Any]]:
+        """Return everything said in a meeting, oldest first."""
+        return self._utterances({"meeting": meeting})
+
+    def said_by(self, agent: str, day: int) -> List[Dict[str, Any]]:
+        """Return every utterance of an agent on a game day, meetings included."""
+        return [u for u in self._utterances({"day": day, "participants": agent}) if u["speaker"] == agent]
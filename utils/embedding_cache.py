@@ -0,0 +1,146 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite")
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-hash keyed cache in front of an embedding model.
+
+    Lookups go through an in-memory LRU first and an on-disk SQLite store second,
+    so embeddings survive restarts. Only texts missing from both are sent to the
+    underlying model, in a single batch per call.
+
+    Attributes:
+        underlying (Embeddings): The embedding model being cached.
+        namespace (str): Prefix mixed into every key, e.g. the deployment name.
+        query_namespace (str): Separate prefix for query embeddings. None shares
+            the document cache, which is correct for models such as OpenAI's where
+            a query and a document with the same text embed identically.
+        hits (int): Lookups answered from memory.
+        disk_hits (int): Lookups answered from disk.
+        misses (int): Texts sent to the underlying model.
+    """
+
+    def __init__(self, underlying: Embeddings, namespace: str = "", path: Optional[str] = EMBEDDING_CACHE_PATH,
+                 max_entries: int = 10000, query_namespace: Optional[str] = None):
+        self.underlying = underlying
+        self.namespace = namespace
+        self.query_namespace = query_namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._db.commit()
+
+    def _key(self, text: str, namespace: str) -> str:
+        return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vector
+            self.hits += len(found)
+            missing = [key for key in keys if key not in found]
+            if self._db is None:
+                return found
+            # SQLite caps the number of bound parameters per statement
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._remember(key, vector)
+                    found[key] = vector
+                self.disk_hits += len(rows)
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            if self._db is not None:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()],
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to persist {len(vectors)} embeddings: {e}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text, self.namespace) for text in texts]
+        unique = list(dict.fromkeys(keys))
+        found = self._lookup(unique)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            with metrics.timed("embedding_seconds", kind="documents"):
+                vectors = self.underlying.embed_documents(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            self._store(new)
+            found.update(new)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        namespace = self.namespace if self.query_namespace is None else self.query_namespace
+        key = self._key(text, namespace)
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+        with self._lock:
+            self.misses += 1
+        with metrics.timed("embedding_seconds", kind="query"):
+            vector = self.underlying.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "entries_in_memory": len(self._lru),
+        }
@@ -0,0 +1,65 @@
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class EntityIndex:
+    """
+    Inverted index from known entity names to the memories mentioning them.
+
+    Entities are the agent names and task names of the game. Every memory added
+    to a retriever is scanned once with a single word-boundary regex, so looking
+    up "what do I know about Kaio" is a set union rather than a vector search.
+
+    Attributes:
+        entities (list): Canonical entity names, as given.
+    """
+
+    def __init__(self, entities: Iterable[str]):
+        self.entities = list(dict.fromkeys(entities))
+        self._canonical = {entity.lower(): entity for entity in self.entities}
+        # longest names first so "Cook food" wins over a shorter overlapping name
+        alternatives = sorted(self._canonical, key=len, reverse=True)
+        self._pattern = re.compile(r"\b(" + "|".join(re.escape(a) for a in alternatives) + r")\b", re.IGNORECASE) if alternatives else None
+        self._postings: Dict[str, Set[int]] = {entity: set() for entity in self.entities}
+        self._mentions: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def entities_in(self, text: str) -> Set[str]:
+        """Return the canonical names of the entities mentioned in a text."""
+        if self._pattern is None:
+            return set()
+        return {self._canonical[match.lower()] for match in self._pattern.findall(text)}
+
+    def as_entity(self, text: str) -> Optional[str]:
+        """Return the canonical entity name if the text is nothing but an entity name."""
+        return self._canonical.get(text.strip().strip("?.!").lower())
+
+    def add(self, item_id: int, text: str):
+        mentioned = self.entities_in(text)
+        if not mentioned:
+            return
+        with self._lock:
+            self._mentions[item_id] = mentioned
+            for entity in mentioned:
+                self._postings[entity].add(item_id)
+
+    def remove(self, item_ids: Iterable[int]):
+        with self._lock:
+            for item_id in item_ids:
+                for entity in self._mentions.pop(item_id, ()):
+                    self._postings[entity].discard(item_id)
+
+    def clear(self):
+        with self._lock:
+            self._mentions.clear()
+            for postings in self._postings.values():
+                postings.clear()
+
+    def ids_for(self, entities: Iterable[str]) -> List[int]:
+        """Return the ids of the memories mentioning any of the entities."""
+        with self._lock:
+            ids = set()
+            for entity in entities:
+                ids |= self._postings.get(entity, set())
+            return list(ids)
@@ -0,0 +1,440 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.pydantic_v1 import Field, PrivateAttr
+from langchain_core.retrievers import BaseRetriever
+
+from utils.logger import logger
+from utils.memory_tiers import summarize_memories
+from utils.metrics import metrics
+from utils.vector_db import VectorDatabase
+
+try:
+    import hnswlib
+except ImportError:  # exact search is used when hnswlib is not installed
+    hnswlib = None
+
+EVICT_TO = 0.9  # eviction shrinks an overflowing hot tier to this fraction of max_hot_memories
+
+
+class HNSWIndex:
+    """
+    Thin wrapper around an hnswlib inner-product index over normalized vectors.
+
+    Attributes:
+        dim (int): Dimension of the indexed vectors.
+        size (int): Number of live (not deleted) vectors.
+    """
+
+    def __init__(self, dim, capacity=4096, M=16, ef_construction=200, ef=128):
+        self.dim = dim
+        self.size = 0
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.init_index(max_elements=capacity, ef_construction=ef_construction, M=M, allow_replace_deleted=True)
+        self.index.set_ef(ef)
+
+    def add(self, vectors, ids):
+        needed = self.index.get_current_count() + len(ids)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, ids, replace_deleted=True)
+        self.size += len(ids)
+
+    def delete(self, ids):
+        for item_id in ids:
+            self.index.mark_deleted(item_id)
+        self.size -= len(ids)
+
+    def query(self, vectors, k):
+        """Return (ids, cosine similarities) of the `k` nearest vectors."""
+        k = min(k, self.size)
+        if k == 0:
+            return np.zeros((len(vectors), 0), dtype=np.int64), np.zeros((len(vectors), 0), dtype=np.float32)
+        labels, distances = self.index.knn_query(vectors, k=k)
+        return labels.astype(np.int64), 1.0 - distances
+
+
+class LocalTimeWeightedRetriever(BaseRetriever):
+    """
+    In-process replacement for TimeWeightedVectorStoreRetriever.
+
+    Documents are scored with the same formula as the langchain retriever,
+    (1 - decay_rate) ** hours_since_last_access + other score keys + relevance,
+    but the vectors live in this process: an exact VectorDatabase for small
+    memory streams and an HNSW index once the stream grows past
+    `ann_threshold`. Recency and salience are kept in arrays indexed by
+    `buffer_idx` so a query is rescored with a handful of vector operations.
+    Writes can optionally be mirrored to a storage backend in the background,
+    in the same document shape MongoDBAtlasVectorSearch uses.
+
+    When `max_hot_memories` is set, the hot tier is bounded: once it overflows,
+    the memories with the lowest recency x importance are summarized and moved
+    to `cold_store` on disk, and queries fall back to the cold tier when the hot
+    tier has nothing relevant enough.
+    """
+
+    embeddings: Embeddings
+    """Embedding model used for documents and queries."""
+
+    memory_stream: List[Document] = Field(default_factory=list)
+    """Live documents, oldest first."""
+
+    search_k: int = 100
+    """Number of nearest neighbours to rescore, like search_kwargs['k']."""
+
+    decay_rate: float = 0.01
+    """The exponential decay factor used as (1.0-decay_rate)**(hrs_passed)."""
+
+    k: int = 4
+    """The maximum number of documents to retrieve in a given call."""
+
+    other_score_keys: List[str] = []
+    """Other keys in the metadata to factor into the score, e.g. 'importance'."""
+
+    default_salience: Optional[float] = None
+    """The relevance given to recent memories that the vector search did not return."""
+
+    ann_threshold: int = 1024
+    """Number of memories after which the HNSW index replaces exact search, capped to what eviction leaves in the hot tier."""
+
+    mirror_collection: Optional[Any] = None
+    """Optional collection-like object (insert_many) receiving a copy of every memory."""
+
+    max_hot_memories: Optional[int] = None
+    """Size of the in-RAM hot tier. None keeps every memory in RAM."""
+
+    cold_store: Optional[Any] = None
+    """ColdMemoryStore receiving the memories evicted from the hot tier."""
+
+    cold_fallback_relevance: float = 0.8
+    """Search the cold tier when no hot memory reaches this relevance."""
+
+    entity_index: Optional[Any] = None
+    """EntityIndex used to pre-filter candidates by the agents and tasks a query mentions."""
+
+    _vectors: Optional[VectorDatabase] = PrivateAttr(default=None)
+    _ann: Optional[HNSWIndex] = PrivateAttr(default=None)
+    _by_id: Dict[int, Document] = PrivateAttr(default_factory=dict)
+    _last_accessed: Any = PrivateAttr(default=None)
+    _salience: Any = PrivateAttr(default=None)
+    _next_id: int = PrivateAttr(default=0)
+    _version: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    _mirror_executor: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._last_accessed = np.zeros(1024, dtype=np.float64)
+        self._salience = np.zeros(1024, dtype=np.float64)
+        if self.mirror_collection is not None:
+            self._mirror_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-mirror")
+
+    def __len__(self):
+        return len(self.memory_stream)
+
+    @property
+    def version(self) -> int:
+        """Incremented on every change to the memory stream, used to invalidate cached retrievals."""
+        return self._version
+
+    def _grow(self, needed):
+        capacity = self._last_accessed.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._last_accessed = np.resize(self._last_accessed, capacity)
+        self._salience = np.resize(self._salience, capacity)
+
+    def _document_salience(self, document: Document) -> float:
+        return sum(document.metadata.get(key, 0.0) for key in self.other_score_keys)
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[int]:
+        """Embed documents and add them to the memory stream."""
+        if not documents:
+            return []
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        return self.add_embedded_documents(documents, vectors, **kwargs)
+
+    def add_embedded_documents(self, documents: List[Document], vectors, **kwargs: Any) -> List[int]:
+        """
+        Add documents whose embeddings are already known.
+
+        Parameters:
+            documents (list): Documents to add. They are copied, never mutated.
+            vectors (array-like): One embedding per document.
+            current_time (datetime): Creation time of the documents, defaults to now.
+            mirror (bool): Whether to copy the documents to `mirror_collection`, True by default.
+
+        Returns:
+            list: The buffer_idx of each added document.
+        """
+        current_time = kwargs.get("current_time")
+        if current_time is None:
+            current_time = datetime.datetime.now()
+        dup_docs = [deepcopy(d) for d in documents]
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        with self._lock:
+            ids = list(range(self._next_id, self._next_id + len(dup_docs)))
+            self._next_id += len(dup_docs)
+            self._grow(self._next_id)
+            for item_id, doc in zip(ids, dup_docs):
+                doc.metadata.setdefault("last_accessed_at", current_time)
+                doc.metadata.setdefault("created_at", current_time)
+                doc.metadata["buffer_idx"] = item_id
+                self._by_id[item_id] = doc
+                self._last_accessed[item_id] = doc.metadata["last_accessed_at"].timestamp()
+                self._salience[item_id] = self._document_salience(doc)
+                if self.entity_index is not None:
+                    self.entity_index.add(item_id, doc.page_content)
+
+            if self._vectors is None:
+                self._vectors = VectorDatabase(vectors.shape[1])
+            self._vectors.add_batch(vectors, [doc.page_content for doc in dup_docs], ids=ids)
+            if self._ann is not None:
+                self._ann.add(self._vectors.embeddings(ids), ids)
+            elif hnswlib is not None and len(self._vectors) >= self._ann_size():
+                self._build_ann()
+            self.memory_stream.extend(dup_docs)
+            self._version += 1
+            if self.max_hot_memories is not None and len(self.memory_stream) > self.max_hot_memories:
+                self._evict(current_time)
+
+        if self._mirror_executor is not None and kwargs.get("mirror", True):
+            self._mirror_executor.submit(self._mirror, dup_docs, vectors.tolist())
+        return ids
+
+    def _ann_size(self) -> int:
+        # a threshold above the evicted-to size would never be reached with a bounded hot tier
+        if self.max_hot_memories is None:
+            return self.ann_threshold
+        return min(self.ann_threshold, int(self.max_hot_memories * EVICT_TO))
+
+    def _build_ann(self):
+        ids = self._vectors.ids().copy()
+        self._ann = HNSWIndex(self._vectors.dim, capacity=max(2 * len(ids), 4096))
+        self._ann.add(self._vectors.embeddings(), ids)
+        logger.info(f"Built HNSW index over {len(ids)} memories")
+
+    def _mirror(self, documents: List[Document], vectors: List[List[float]]):
+        try:
+            with metrics.timed("storage_write_seconds", target="memory_mirror"):
+                self.mirror_collection.insert_many([
+                    {"text": doc.page_content, "embedding": vector, **doc.metadata}
+                    for doc, vector in zip(documents, vectors)
+                ])
+        except Exception as e:
+            logger.error(f"Failed to mirror {len(documents)} memories: {e}")
+
+    def remove_documents(self, ids: List[int]):
+        """Remove documents from the memory stream and the vector indexes."""
+        with self._lock:
+            removed = [item_id for item_id in ids if self._by_id.pop(item_id, None) is not None]
+            for item_id in removed:
+                self._vectors.delete(item_id)
+            if self._ann is not None and removed:
+                self._ann.delete(removed)
+            if self.entity_index is not None:
+                self.entity_index.remove(removed)
+            removed = set(removed)
+            self.memory_stream[:] = [doc for doc in self.memory_stream if doc.metadata["buffer_idx"] not in removed]
+            self._version += 1
+
+    def replace_documents(self, remove_ids: List[int], documents: List[Document], vectors) -> List[int]:
+        """
+        Atomically swap a set of documents for new ones, keeping the stream ordered by creation time.
+
+        The new documents are derived from the removed ones, e.g. merged by compaction,
+        so they are not mirrored: the mirror keeps the memories as they were recorded.
+
+        Parameters:
+            remove_ids (list): buffer_idx of the documents to remove.
+            documents (list): Documents to add in their place, with `created_at` already set.
+            vectors (array-like): One embedding per added document.
+
+        Returns:
+            list: The buffer_idx of each added document.
+        """
+        with self._lock:
+            self.remove_documents(remove_ids)
+            ids = self.add_embedded_documents(documents, vectors, mirror=False) if documents else []
+            self.memory_stream.sort(key=lambda doc: doc.metadata["created_at"])
+        return ids
+
+    def export_state(self):
+        """
+        Return the hot memory stream and its normalized embeddings, aligned row by row.
+
+        Returns:
+            tuple: (list of documents, float32 array of shape (n, dim)).
+        """
+        with self._lock:
+            documents = list(self.memory_stream)
+            if not documents:
+                return documents, np.zeros((0, self._vectors.dim if self._vectors else 0), dtype=np.float32)
+            ids = [doc.metadata["buffer_idx"] for doc in documents]
+            return documents, self._vectors.embeddings(ids).copy()
+
+    def restore_state(self, documents: List[Document], normalized_embeddings):
+        """
+        Replace the memory stream with documents exported by `export_state`.
+
+        Nothing is embedded or scored again: the embeddings are loaded as they are
+        and recency and importance are read back from the document metadata.
+        """
+        with self._lock:
+            ids = [doc.metadata["buffer_idx"] for doc in documents]
+            self._by_id = dict(zip(ids, documents))
+            self._next_id = max(ids) + 1 if ids else 0
+            self._last_accessed = np.zeros(1024, dtype=np.float64)
+            self._salience = np.zeros(1024, dtype=np.float64)
+            self._grow(self._next_id)
+            if self.entity_index is not None:
+                self.entity_index.clear()
+            for item_id, doc in zip(ids, documents):
+                self._last_accessed[item_id] = doc.metadata["last_accessed_at"].timestamp()
+                self._salience[item_id] = self._document_salience(doc)
+                if self.entity_index is not None:
+                    self.entity_index.add(item_id, doc.page_content)
+            self._vectors = None
+            self._ann = None
+            if ids:
+                dim = normalized_embeddings.shape[1]
+                self._vectors = VectorDatabase.from_arrays(dim, normalized_embeddings, ids, [doc.page_content for doc in documents])
+                if hnswlib is not None and len(ids) >= self._ann_size():
+                    self._build_ann()
+            self.memory_stream[:] = documents
+            self._version += 1
+
+    @property
+    def lock(self):
+        """Reentrant lock guarding the stream, held to read and rewrite it atomically."""
+        return self._lock
+
+    def get_embeddings(self, ids: List[int]):
+        """Return the normalized embeddings of the given documents."""
+        with self._lock:
+            return self._vectors.embeddings(ids).copy()
+
+    def _search(self, query_vector, k, restrict_ids=None):
+        if self._vectors is None or len(self._vectors) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if restrict_ids is not None:
+            ids, scores = self._vectors.query(query_vector, k, restrict_ids=restrict_ids)
+        elif self._ann is not None:
+            ids, scores = self._ann.query(VectorDatabase._normalize(query_vector), k)
+        else:
+            ids, scores = self._vectors.query(query_vector, k)
+        return ids[0], scores[0]
+
+    def _evict(self, current_time: datetime.datetime):
+        """Move the least valuable hot memories to the cold tier, keeping the `k` most recent ones."""
+        target = int(self.max_hot_memories * EVICT_TO)
+        candidates = self.memory_stream[:-self.k] if self.k else list(self.memory_stream)
+        count = len(self.memory_stream) - target
+        if count <= 0 or not candidates:
+            return
+        ids = np.fromiter((doc.metadata["buffer_idx"] for doc in candidates), dtype=np.int64, count=len(candidates))
+        hours_passed = (current_time.timestamp() - self._last_accessed[ids]) / 3600
+        value = np.power(1.0 - self.decay_rate, hours_passed) * (self._salience[ids] + 1e-3)
+        count = min(count, len(ids))
+        evicted = ids[np.argpartition(value, count - 1)[:count]].tolist()
+
+        if self.cold_store is not None:
+            documents = [self._by_id[item_id] for item_id in evicted]
+            summarized, vectors = summarize_memories(documents, self._vectors.embeddings(evicted))
+            self.cold_store.append(summarized, vectors)
+        self.remove_documents(evicted)
+        logger.debug(f"Evicted {len(evicted)} memories to the cold tier")
+
+    def _rescore(self, ids, relevance, current_time: datetime.datetime):
+        hours_passed = (current_time.timestamp() - self._last_accessed[ids]) / 3600
+        scores = np.power(1.0 - self.decay_rate, hours_passed) + self._salience[ids] + relevance
+        k = min(self.k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(ids) else np.arange(len(ids))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self._by_id[int(item_id)] for item_id in ids[top]], scores[top].tolist()
+
+    def _cold_candidates(self, query_vector, current_time: datetime.datetime):
+        scored = []
+        for doc, similarity in self.cold_store.search(query_vector, self.k):
+            hours_passed = (current_time - doc.metadata["last_accessed_at"]).total_seconds() / 3600
+            score = (1.0 - self.decay_rate) ** hours_passed + self._document_salience(doc) + (1.0 + similarity) / 2
+            scored.append((doc, score))
+        return scored
+
+    def _entity_candidates(self, query: str):
+        """Return the ids of the memories mentioning the entities of a query, or None to search everything."""
+        if self.entity_index is None:
+            return None
+        entities = self.entity_index.entities_in(query)
+        if not entities:
+            return None
+        ids = self.entity_index.ids_for(entities)
+        # too few mentions to fill a result, let the full search find related memories
+        return ids if len(ids) >= self.k else None
+
+    def get_entity_documents(self, entity: str) -> List[Document]:
+        """
+        Return the memories mentioning an entity, ranked by recency and importance only.
+
+        Nothing is embedded: every mention counts as fully relevant.
+        """
+        current_time = datetime.datetime.now()
+        with self._lock:
+            ids = [item_id for item_id in self.entity_index.ids_for([entity]) if item_id in self._by_id]
+            if not ids:
+                return []
+            documents, _ = self._rescore(np.array(ids, dtype=np.int64), np.ones(len(ids)), current_time)
+            for doc in documents:
+                doc.metadata["last_accessed_at"] = current_time
+                self._last_accessed[doc.metadata["buffer_idx"]] = current_time.timestamp()
+        return documents
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        entity = self.entity_index.as_entity(query) if self.entity_index is not None else None
+        if entity is not None and len(self.entity_index.ids_for([entity])) >= self.k:
+            # a bare name: rank the memories mentioning it without calling the embedding model
+            return self.get_entity_documents(entity)
+        query_vector = self.embeddings.embed_query(query)
+        current_time = datetime.datetime.now()
+        with self._lock:
+            candidates = {doc.metadata["buffer_idx"]: self.default_salience or 0.0 for doc in self.memory_stream[-self.k:]}
+            ids, similarities = self._search(query_vector, self.search_k, restrict_ids=self._entity_candidates(query))
+            # cosine similarity mapped to [0, 1] like Atlas' normalized score
+            relevances = ((1.0 + similarities) / 2).tolist()
+            candidates.update(zip(ids.tolist(), relevances))
+            scored = []
+            if candidates:
+                candidate_ids = np.fromiter(candidates.keys(), dtype=np.int64, count=len(candidates))
+                relevance = np.fromiter(candidates.values(), dtype=np.float64, count=len(candidates))
+                scored = list(zip(*self._rescore(candidate_ids, relevance, current_time)))
+
+        if self.cold_store is not None and len(self.cold_store) and (
+            len(scored) < self.k or max(relevances, default=0.0) < self.cold_fallback_relevance
+        ):
+            scored = sorted(scored + self._cold_candidates(query_vector, current_time), key=lambda x: x[1], reverse=True)[:self.k]
+
+        result = []
+        with self._lock:
+            # Ensure frequently accessed memories aren't forgotten
+            for doc, _ in scored:
+                doc.metadata["last_accessed_at"] = current_time
+                item_id = doc.metadata.get("buffer_idx")
+                if item_id is not None and item_id in self._by_id:
+                    self._last_accessed[item_id] = current_time.timestamp()
+                result.append(doc)
+        return result
@@ -0,0 +1,139 @@
+import re
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.logger import logger
+
+TEMPLATE_WORDS = 3  # leading words that must match for two memories to be merged
+SIMILARITY_THRESHOLD = 0.95
+COMPACTION_INTERVAL = 60  # seconds between two compaction passes
+
+
+def template_key(text: str) -> str:
+    """
+    Return the template a memory was generated from, approximated by its first words.
+
+    "You see Akio near Cook food" and "You see Akio near Collect wood" share the
+    key "you see akio", so they are only merged if their embeddings also agree.
+    """
+    words = re.sub(r"[^\w\s]", " ", text.lower())
+    words = re.sub(r"\d+", "#", words).split()
+    return " ".join(words[:TEMPLATE_WORDS])
+
+
+def find_clusters(documents: List[Document], embeddings: np.ndarray, similarity_threshold: float = SIMILARITY_THRESHOLD) -> List[List[int]]:
+    """
+    Group near-duplicate memories.
+
+    Memories are bucketed by template key, then greedily assigned to the first
+    cluster in their bucket whose seed is at least `similarity_threshold` cosine
+    similar.
+
+    Parameters:
+        documents (list): Memories to cluster.
+        embeddings (np.ndarray): Normalized embeddings, one row per document.
+        similarity_threshold (float): Minimum cosine similarity to a cluster seed.
+
+    Returns:
+        list: Index lists of the clusters holding more than one memory.
+    """
+    buckets: Dict[str, List[int]] = {}
+    for i, doc in enumerate(documents):
+        buckets.setdefault(template_key(doc.page_content), []).append(i)
+
+    clusters = []
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        similarities = embeddings[members] @ embeddings[members].T
+        assigned = np.full(len(members), False)
+        for seed in range(len(members)):
+            if assigned[seed]:
+                continue
+            cluster = np.flatnonzero(~assigned & (similarities[seed] >= similarity_threshold))
+            assigned[cluster] = True
+            if len(cluster) > 1:
+                clusters.append([members[i] for i in cluster])
+    return clusters
+
+
+def merge_cluster(documents: List[Document]) -> Document:
+    """
+    Merge near-duplicate memories into a single one carrying a count and time range.
+
+    The newest wording is kept, importance is the highest of the cluster and the
+    merged memory is dated at the cluster's most recent occurrence.
+    """
+    documents = sorted(documents, key=lambda doc: doc.metadata["created_at"])
+    newest = documents[-1]
+    metadata = {key: value for key, value in newest.metadata.items() if key != "buffer_idx"}
+    metadata["count"] = sum(doc.metadata.get("count", 1) for doc in documents)
+    metadata["first_seen"] = min(doc.metadata.get("first_seen", doc.metadata["created_at"]) for doc in documents)
+    metadata["created_at"] = newest.metadata["created_at"]
+    metadata["last_accessed_at"] = max(doc.metadata["last_accessed_at"] for doc in documents)
+    if any("importance" in doc.metadata for doc in documents):
+        metadata["importance"] = max(doc.metadata.get("importance", 0.0) for doc in documents)
+    return Document(page_content=newest.page_content, metadata=metadata)
+
+
+def compact_memories(retriever, similarity_threshold: float = SIMILARITY_THRESHOLD) -> Dict[str, int]:
+    """
+    Merge near-duplicate memories of a LocalTimeWeightedRetriever in place.
+
+    Each merged memory is embedded with the normalized mean of its cluster, so
+    nothing is sent to the embedding model. The retriever's lock is held from
+    the snapshot to the swap.
+
+    Returns:
+        dict: Number of memories before and after compaction and clusters merged.
+    """
+    # eviction and writes wait for the whole pass, so the snapshot is still current when it is swapped
+    with retriever.lock:
+        documents = list(retriever.memory_stream)
+        before = len(documents)
+        if before < 2:
+            return {"before": before, "after": before, "clusters": 0}
+
+        ids = [doc.metadata["buffer_idx"] for doc in documents]
+        embeddings = retriever.get_embeddings(ids)
+        clusters = find_clusters(documents, embeddings, similarity_threshold)
+        if not clusters:
+            return {"before": before, "after": before, "clusters": 0}
+
+        remove_ids, merged, vectors = [], [], []
+        for cluster in clusters:
+            remove_ids.extend(ids[i] for i in cluster)
+            merged.append(merge_cluster([documents[i] for i in cluster]))
+            vectors.append(embeddings[cluster].mean(axis=0))
+        retriever.replace_documents(remove_ids, merged, np.vstack(vectors))
+        return {"before": before, "after": len(retriever.memory_stream), "clusters": len(clusters)}
+
+
+def start_compaction_job(memories: Dict[str, object], interval: float = COMPACTION_INTERVAL) -> threading.Thread:
+    """
+    Periodically compact the memory of every agent in a daemon thread.
+
+    Parameters:
+        memories (dict): AgentMemory objects keyed by agent name.
+        interval (float): Seconds between two compaction passes.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            for agent_name, memory in list(memories.items()):
+                if not hasattr(memory.memory_retriever, "replace_documents"):
+                    continue
+                try:
+                    result = compact_memories(memory.memory_retriever)
+                    if result["clusters"]:
+                        logger.info(f"Compacted memories of {agent_name}: {result['before']} -> {result['after']}")
+                except Exception as e:
+                    logger.error(f"Memory compaction failed for {agent_name}: {e}")
+
+    thread = threading.Thread(target=run, daemon=True, name="memory-compaction")
+    thread.start()
+    return thread
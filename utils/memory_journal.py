@@ -0,0 +1,227 @@
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils.logger import logger
+
+MEMORY_DIRECTORY = "memories"
+
+
+class AgentJournal:
+    """
+    Append-only JSONL journal holding the memories of a single agent.
+
+    Every memory is written as one line at the end of the file, so adding a memory
+    costs the same no matter how long the game has been running. Writes are
+    flushed to the OS immediately and fsynced in batches. A sparse offset index
+    (the byte offset of every `index_stride`-th entry) lets tail reads seek
+    straight to the end of the file instead of parsing it from the beginning.
+
+    Attributes:
+        path (str): Location of the journal file.
+        fsync_every (int): Number of appends after which the file is fsynced.
+        fsync_interval (float): Maximum number of seconds between two fsyncs while appending.
+        index_stride (int): Number of entries between two indexed offsets.
+        count (int): Number of entries in the journal.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 32, fsync_interval: float = 1.0, index_stride: int = 64):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.index_stride = index_stride
+        self.count = 0
+        self._offsets: List[int] = []
+        self._pending = 0
+        self._last_sync = time.time()
+        self._lock = threading.Lock()
+        self._build_index()
+        self._file = open(self.path, "ab")
+
+    def _build_index(self):
+        """Scan an existing journal once to rebuild the entry count and offset index."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                if self.count % self.index_stride == 0:
+                    self._offsets.append(offset)
+                offset += len(line)
+                self.count += 1
+
+    def append(self, entry: Dict[str, Any]):
+        """
+        Append one entry to the journal.
+
+        Parameters:
+            entry (dict): JSON serialisable memory entry.
+        """
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with self._lock:
+            if self.count % self.index_stride == 0:
+                self._offsets.append(self._file.tell())
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.time()
+
+    def sync(self):
+        """Force every pending write to disk."""
+        with self._lock:
+            if self._pending:
+                self._sync()
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        """
+        Read the last `n` entries of the journal.
+
+        Parameters:
+            n (int): Number of entries to return.
+
+        Returns:
+            list: The entries, oldest first.
+        """
+        with self._lock:
+            count = self.count
+            if count == 0 or n <= 0:
+                return []
+            start = max(0, count - n)
+            block = start // self.index_stride
+            offset = self._offsets[block]
+            skip = start - block * self.index_stride
+            end = self._file.tell()
+
+        entries = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read(end - offset)
+        for line in data.splitlines()[skip:]:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping corrupt line in {self.path}")
+        return entries
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        """Return every entry in the journal, oldest first."""
+        return self.tail(self.count)
+
+    def truncate(self, count: int = 0):
+        """
+        Remove every entry after the first `count`, all of them by default.
+
+        Parameters:
+            count (int): Number of entries to keep, e.g. the count recorded by a checkpoint.
+        """
+        with self._lock:
+            if count >= self.count:
+                return
+            self._file.close()
+            size = 0
+            if count:
+                block = count // self.index_stride
+                size = self._offsets[block]
+                with open(self.path, "rb") as f:
+                    f.seek(size)
+                    for _ in range(count - block * self.index_stride):
+                        size += len(f.readline())
+            with open(self.path, "r+b") as f:
+                f.truncate(size)
+            self._file = open(self.path, "ab")
+            self.count = count
+            self._offsets = self._offsets[:-(-count // self.index_stride)]
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            if self._pending:
+                self._sync()
+            self._file.close()
+
+
+class MemoryJournal:
+    """
+    Registry of per-agent memory journals stored under a common directory.
+
+    Attributes:
+        directory (str): Directory holding the `{agent}_memories.jsonl` files.
+    """
+
+    def __init__(self, directory: str = MEMORY_DIRECTORY, **journal_kwargs):
+        self.directory = directory
+        self._journal_kwargs = journal_kwargs
+        self._journals: Dict[str, AgentJournal] = {}
+        self._lock = threading.Lock()
+
+    def journal(self, agent_name: str) -> AgentJournal:
+        """Return the journal of an agent, opening it on first use."""
+        journal = self._journals.get(agent_name)
+        if journal is None:
+            with self._lock:
+                journal = self._journals.get(agent_name)
+                if journal is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    path = os.path.join(self.directory, f"{agent_name}_memories.jsonl")
+                    journal = AgentJournal(path, **self._journal_kwargs)
+                    self._journals[agent_name] = journal
+        return journal
+
+    def append(self, agent_name: str, memory_content: str, timestamp: Optional[datetime] = None, **extra):
+        """
+        Record a memory of an agent.
+
+        Parameters:
+            agent_name (str): Name of the agent the memory belongs to.
+            memory_content (str): The memory text.
+            timestamp (datetime): Time of the memory, defaults to now.
+        """
+        timestamp = timestamp or datetime.now()
+        entry = {"memory": memory_content, "timestamp": timestamp.isoformat()}
+        entry.update(extra)
+        self.journal(agent_name).append(entry)
+
+    def tail(self, agent_name: str, n: int = 50) -> List[Dict[str, Any]]:
+        """Return the last `n` memories of an agent."""
+        return self.journal(agent_name).tail(n)
+
+    def read(self, agent_name: str) -> List[Dict[str, Any]]:
+        """Return every memory of an agent."""
+        return self.journal(agent_name).read_all()
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of entries of every open journal, keyed by agent name."""
+        return {agent_name: journal.count for agent_name, journal in list(self._journals.items())}
+
+    def truncate(self, agent_name: str, count: int):
+        """Keep only the first `count` memories of an agent."""
+        self.journal(agent_name).truncate(count)
+
+    def reset(self, agent_names: List[str]):
+        """Start an empty journal for each of the given agents."""
+        for agent_name in agent_names:
+            self.journal(agent_name).truncate()
+
+    def sync(self):
+        for journal in list(self._journals.values()):
+            journal.sync()
+
+    def close(self):
+        for journal in list(self._journals.values()):
+            journal.close()
+        self._journals.clear()
+
+
+memory_journal = MemoryJournal()
+atexit.register(memory_journal.close)
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.memory_compaction import find_clusters, merge_cluster
+
+DATE_KEYS = ("created_at", "last_accessed_at", "first_seen")
+
+
+def encode_metadata(metadata):
+    encoded = {key: value for key, value in metadata.items() if key != "buffer_idx"}
+    for key in DATE_KEYS:
+        if isinstance(encoded.get(key), datetime):
+            encoded[key] = encoded[key].isoformat()
+    return encoded
+
+
+def decode_metadata(metadata):
+    for key in DATE_KEYS:
+        if isinstance(metadata.get(key), str):
+            metadata[key] = datetime.fromisoformat(metadata[key])
+    return metadata
+
+
+def summarize_memories(documents: List[Document], embeddings: np.ndarray) -> Tuple[List[Document], np.ndarray]:
+    """Collapse near-duplicates among evicted memories before they are written to the cold tier."""
+    clusters = find_clusters(documents, embeddings)
+    merged_indices = {i for cluster in clusters for i in cluster}
+    kept = [i for i in range(len(documents)) if i not in merged_indices]
+    summarized = [documents[i] for i in kept] + [merge_cluster([documents[i] for i in cluster]) for cluster in clusters]
+    vectors = [embeddings[kept]] + [embeddings[cluster].mean(axis=0, keepdims=True) for cluster in clusters]
+    vectors = np.vstack(vectors)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return summarized, vectors.astype(np.float32)
+
+
+class ColdMemoryStore:
+    """
+    On-disk tier holding the memories an agent evicted from RAM.
+
+    Embeddings are appended as raw float32 rows to `{agent}_cold.f32` and read
+    back through a memory map, so searching the cold tier never loads it into
+    memory as a whole. Texts and metadata go to `{agent}_cold.jsonl`; only the
+    byte offset of each line is kept in RAM.
+
+    Attributes:
+        dim (int): Dimension of the stored embeddings, known after the first write.
+    """
+
+    def __init__(self, directory: str, agent_name: str, reset: bool = False, chunk_rows: int = 8192):
+        os.makedirs(directory, exist_ok=True)
+        self.vector_path = os.path.join(directory, f"{agent_name}_cold.f32")
+        self.document_path = os.path.join(directory, f"{agent_name}_cold.jsonl")
+        self.chunk_rows = chunk_rows
+        self.dim = None
+        self._offsets: List[int] = []
+        self._lock = threading.Lock()
+        if reset:
+            for path in (self.vector_path, self.document_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        elif os.path.exists(self.document_path):
+            with open(self.document_path, "rb") as f:
+                offset = 0
+                for line in f:
+                    self._offsets.append(offset)
+                    offset += len(line)
+            if self._offsets:
+                self.dim = os.path.getsize(self.vector_path) // (4 * len(self._offsets))
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def truncate(self, count: int):
+        """Drop every memory after the first `count`, e.g. those evicted after a checkpoint was saved."""
+        with self._lock:
+            if count >= len(self._offsets):
+                return
+            with open(self.document_path, "r+b") as f:
+                f.truncate(self._offsets[count])
+            with open(self.vector_path, "r+b") as f:
+                f.truncate(count * self.dim * 4)
+            del self._offsets[count:]
+
+    def append(self, documents: List[Document], normalized_vectors: np.ndarray):
+        """Write evicted memories and their normalized embeddings to disk."""
+        if not documents:
+            return
+        vectors = np.ascontiguousarray(normalized_vectors, dtype=np.float32)
+        with self._lock:
+            self.dim = vectors.shape[1]
+            with open(self.vector_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.document_path, "ab") as f:
+                offset = f.tell()
+                for doc in documents:
+                    line = (json.dumps({"text": doc.page_content, "metadata": encode_metadata(doc.metadata)}) + "\n").encode("utf-8")
+                    self._offsets.append(offset)
+                    f.write(line)
+                    offset += len(line)
+
+    def _read_documents(self, rows) -> List[Document]:
+        documents = []
+        with open(self.document_path, "rb") as f:
+            for row in rows:
+                f.seek(self._offsets[row])
+                entry = json.loads(f.readline())
+                documents.append(Document(page_content=entry["text"], metadata=decode_metadata(entry["metadata"])))
+        return documents
+
+    def search(self, query_vector, k: int) -> List[Tuple[Document, float]]:
+        """
+        Exact cosine search over the cold tier.
+
+        Returns:
+            list: (document, cosine similarity) pairs, most similar first.
+        """
+        with self._lock:
+            count = len(self._offsets)
+        if count == 0 or k <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)  # never normalize the caller's array in place
+        matrix = np.memmap(self.vector_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for start in range(0, count, self.chunk_rows):
+            scores = np.concatenate([best_scores, matrix[start:start + self.chunk_rows] @ query])
+            rows = np.concatenate([best_rows, np.arange(start, min(start + self.chunk_rows, count))])
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                scores, rows = scores[top], rows[top]
+            best_scores, best_rows = scores, rows
+        order = np.argsort(-best_scores)
+        documents = self._read_documents(best_rows[order].tolist())
+        return list(zip(documents, best_scores[order].tolist()))
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from utils.logger import logger
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # disabled by default, set e.g. METRICS_PORT=9464 to serve /metrics
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Latency distribution over the most recent `window` observations.
+
+    Quantiles come from a bounded window, so they follow the current behaviour
+    of the game rather than its whole history; count and sum are cumulative.
+    """
+
+    def __init__(self, window: int = 4096):
+        self.count = 0
+        self.total = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            self._samples.append(value)
+
+    def quantiles(self, quantiles=QUANTILES) -> Dict[float, float]:
+        with self._lock:
+            samples = np.fromiter(self._samples, dtype=np.float64, count=len(self._samples))
+        if len(samples) == 0:
+            return {q: float("nan") for q in quantiles}
+        return dict(zip(quantiles, np.quantile(samples, quantiles).tolist()))
+
+
+class MetricsRegistry:
+    """
+    Process-wide registry of histograms and gauges, rendered in Prometheus text format.
+
+    Metrics are created on first use and identified by name and labels, e.g.
+    `metrics.observe("llm_call_seconds", 1.2, call_site="_generate_reaction")`.
+    Gauges are either set explicitly or computed on scrape from a callback,
+    which is how queue depths are exported.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self._gauges: Dict[Tuple[str, tuple], float] = {}
+        self._callbacks: Dict[Tuple[str, tuple], Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> Tuple[str, tuple]:
+        return name, tuple(sorted(labels.items()))
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = self._key(name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name: str, value: float, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    @contextmanager
+    def timed(self, name: str, **labels):
+        """Time the enclosed block into the histogram `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def inc_gauge(self, name: str, amount: float = 1.0, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0.0) + amount
+
+    @contextmanager
+    def in_flight(self, name: str, **labels):
+        """Count the enclosed block in the gauge `name` while it runs."""
+        self.inc_gauge(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.inc_gauge(name, -1, **labels)
+
+    def register_gauge(self, name: str, callback: Callable[[], float], **labels):
+        """Export a gauge whose value is read from `callback` on every scrape."""
+        with self._lock:
+            self._callbacks[self._key(name, labels)] = callback
+
+    @staticmethod
+    def _format_labels(labels: tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(labels) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            gauges = dict(self._gauges)
+            callbacks = dict(self._callbacks)
+        for key, callback in callbacks.items():
+            try:
+                gauges[key] = float(callback())
+            except Exception as e:
+                logger.debug(f"Gauge {key[0]} failed: {e}")
+
+        lines = []
+        typed = set()
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            for q, value in histogram.quantiles().items():
+                lines.append(f"{name}{self._format_labels(labels, ('quantile', str(q)))} {value}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.total}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+        for (name, labels), value in sorted(gauges.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge")
+                typed.add(name)
+            lines.append(f"{name}{self._format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Dict[float, float]]:
+        """Return the quantiles of every histogram, keyed by name and labels, for logging."""
+        with self._lock:
+            histograms = list(self._histograms.items())
+        return {f"{name}{self._format_labels(labels)}": histogram.quantiles() for (name, labels), histogram in histograms}
+
+
+metrics = MetricsRegistry()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "127.0.0.1") -> Optional[threading.Thread]:
+    """
+    Serve `metrics.render()` at http://host:port/metrics from a daemon thread.
+
+    Returns:
+        Thread: The server thread, or None when the endpoint is disabled.
+    """
+    if not port:
+        return None
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    app = FastAPI()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def read_metrics():
+        return metrics.render()
+
+    # running outside the main thread, uvicorn leaves the game's signal handlers alone
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True, name="metrics-server")
+    thread.start()
+    logger.info(f"Metrics served at http://{host}:{port}/metrics")
+    return thread
@@ -1,33 +1,153 @@
 from pymongo import MongoClient
+import atexit
+import datetime
 import os
+import threading
+import time
+import uuid
+from utils.logger import logger
 
 ATLAS_CONNECTION_STRING=os.getenv("ATLAS_CONNECTION_STRING")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+# "field" stamps every document with the run id in shared collections,
+# "database" gives every run its own database, dropped once the run is over
+MONGO_RUN_ISOLATION = os.getenv("MONGO_RUN_ISOLATION", "field")
+STALE_RUN_HOURS = 24  # run databases left behind by crashed runs are dropped after this long
+RUNS_COLLECTION = "runs"
 
-def create_mongo_client():
-    client = MongoClient(ATLAS_CONNECTION_STRING)
-    return client
+RUN_ID = os.getenv("RUN_ID") or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
 
-def get_atlas_collection(db_name, collection_name):
-    client = create_mongo_client()
-    collection = client[db_name][collection_name]
+_client = None
+_client_lock = threading.Lock()
+_registered_runs = set()
+_kept_runs = set()
+
+
+def get_mongo_client():
+    """Return the process-wide MongoClient. It pools its connections and is safe to share between threads."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(ATLAS_CONNECTION_STRING, maxPoolSize=MONGO_MAX_POOL_SIZE)
+    return _client
+
+
+def set_run_id(run_id):
+    """Continue an earlier run, e.g. when resuming from a checkpoint. Call before opening collections."""
+    global RUN_ID
+    RUN_ID = run_id
+
+
+class RunScopedCollection:
+    """
+    Collection wrapper isolating one run in a collection shared by several runs.
+
+    Inserted documents are copied and stamped with the run id, and reads and
+    deletes are restricted to the documents of this run. Anything else is
+    delegated to the underlying pymongo collection.
+    """
+
+    def __init__(self, collection, run_id):
+        self.collection = collection
+        self.run_id = run_id
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def _scope(self, filter=None):
+        return {**(filter or {}), "run_id": self.run_id}
+
+    def insert_one(self, document, *args, **kwargs):
+        return self.collection.insert_one({**document, "run_id": self.run_id}, *args, **kwargs)
+
+    def insert_many(self, documents, *args, **kwargs):
+        return self.collection.insert_many([{**document, "run_id": self.run_id} for document in documents], *args, **kwargs)
+
+    def find(self, filter=None, *args, **kwargs):
+        return self.collection.find(self._scope(filter), *args, **kwargs)
 
-    collection.delete_many({})
-    return collection
+    def find_one(self, filter=None, *args, **kwargs):
+        return self.collection.find_one(self._scope(filter), *args, **kwargs)
+
+    def count_documents(self, filter=None, *args, **kwargs):
+        return self.collection.count_documents(self._scope(filter), *args, **kwargs)
+
+    def delete_many(self, filter=None, *args, **kwargs):
+        return self.collection.delete_many(self._scope(filter), *args, **kwargs)
+
+
+def _register_run(db_name):
+    """Record the run in the shared database so its database can be dropped once it is over."""
+    if db_name in _registered_runs:
+        return
+    _registered_runs.add(db_name)
+    runs = get_mongo_client()[db_name][RUNS_COLLECTION]
+    runs.update_one({"run_id": RUN_ID},
+                    {"$setOnInsert": {"started_at": datetime.datetime.now()}, "$set": {"finished_at": None}},
+                    upsert=True)
+    run_id = RUN_ID
+
+    def mark_finished():
+        runs.update_one({"run_id": run_id}, {"$set": {"finished_at": datetime.datetime.now()}})
+    atexit.register(mark_finished)
+
+
+def get_run_database(db_name):
+    """Return the database holding this run's collections."""
+    client = get_mongo_client()
+    if MONGO_RUN_ISOLATION == "database":
+        _register_run(db_name)
+        return client[f"{db_name}_{RUN_ID}"]
+    return client[db_name]
+
+
+def _scoped(db, collection_name):
+    collection = db[collection_name]
+    if MONGO_RUN_ISOLATION == "database":
+        return collection
+    # idempotent, and cheap once the index exists
+    threading.Thread(target=collection.create_index, args=("run_id",), daemon=True).start()
+    return RunScopedCollection(collection, RUN_ID)
+
+
+def get_atlas_collection(db_name, collection_name):
+    return _scoped(get_run_database(db_name), collection_name)
 
 
 def get_atlas_collections(db_name, collection_names):
-    client = create_mongo_client()
-    db = client[db_name]
+    db = get_run_database(db_name)
+    return [_scoped(db, collection_name) for collection_name in collection_names]
+
+
+def keep_runs(run_ids):
+    """Never drop the databases of these runs, e.g. because a checkpoint can still resume them."""
+    _kept_runs.update(run_id for run_id in run_ids if run_id)
 
-    collections = []
 
-    for collection_name in collection_names:
-        collection = db[collection_name]
-        collection.delete_many({})
-        collections.append(collection)
-    
-    return collections
+def drop_finished_runs(db_name):
+    """
+    Drop the databases of runs that are over, in a daemon thread.
 
+    A run is over once it recorded its end, or when it started more than
+    STALE_RUN_HOURS ago and never did, which is what a crashed run leaves.
+    Runs passed to `keep_runs` are never dropped. Only applies to the "database" isolation mode.
+    """
+    if MONGO_RUN_ISOLATION != "database":
+        return None
 
-    
+    def run():
+        try:
+            runs = get_mongo_client()[db_name][RUNS_COLLECTION]
+            stale = datetime.datetime.now() - datetime.timedelta(hours=STALE_RUN_HOURS)
+            for entry in runs.find({"run_id": {"$nin": [RUN_ID, *_kept_runs]},
+                                    "$or": [{"finished_at": {"$ne": None}}, {"started_at": {"$lt": stale}}]}):
+                get_mongo_client().drop_database(f"{db_name}_{entry['run_id']}")
+                runs.delete_one({"_id": entry["_id"]})
+                logger.info(f"Dropped the database of run {entry['run_id']}")
+        except Exception as e:
+            logger.error(f"Failed to drop finished run databases: {e}")
 
+    thread = threading.Thread(target=run, daemon=True, name="drop-finished-runs")
+    thread.start()
+    return thread
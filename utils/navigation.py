@@ -0,0 +1,128 @@
+import os
+import queue
+import threading
+from typing import Iterable, Tuple
+
+import numpy as np
+
+from utils.agent_state import DIRECTIONS
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.walkability import WalkabilityMap
+
+NAV_CELL_SIZE = int(os.getenv("NAV_CELL_SIZE", "10"))  # pixels per grid cell
+OFF_PATH_COST = float(os.getenv("OFF_PATH_COST", "4"))  # cost of crossing a cell off the paths, relative to a path cell
+STEP_LENGTHS = np.hypot(DIRECTIONS[:, 0], DIRECTIONS[:, 1])
+
+
+class NavGrid:
+    """
+    Navigation grid with cached flow fields.
+
+    The walkability map is sampled at the centers of `cell_size` pixel
+    cells. Crossing a cell off the paths costs `off_path_cost` times as much
+    as a path cell, so agents head to the nearest path and travel along it.
+    For each target cell, a flow field stores the index into
+    agent_state.DIRECTIONS of the next step towards the target from every
+    cell. Agents look up their next step in O(1), however many there are.
+
+    Fields are computed once per target cell by a background thread. Until a
+    field is ready, and inside the target cell, its codes are -1 and agents
+    fall back to the greedy step.
+    """
+
+    def __init__(self, walkability: WalkabilityMap, width: int, height: int, cell_size: int = NAV_CELL_SIZE, off_path_cost: float = OFF_PATH_COST):
+        self.cell_size = cell_size
+        self.cols = -(-width // cell_size)
+        self.rows = -(-height // cell_size)
+        centers_x = (np.arange(self.cols) + 0.5) * cell_size
+        centers_y = (np.arange(self.rows) + 0.5) * cell_size
+        grid_x, grid_y = np.meshgrid(centers_x, centers_y)
+        self.walkable = walkability.walkable(grid_x.ravel(), grid_y.ravel()).reshape(self.rows, self.cols)
+        self.cost = np.where(self.walkable, 1.0, off_path_cost)
+        self.flow = np.full((8, self.rows, self.cols), -1, dtype=np.int8)
+        self._fields = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def cell(self, xs, ys) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the (row, col) of points, clipped to the grid."""
+        rows = np.clip((np.asarray(ys) // self.cell_size).astype(int), 0, self.rows - 1)
+        cols = np.clip((np.asarray(xs) // self.cell_size).astype(int), 0, self.cols - 1)
+        return rows, cols
+
+    def field_index(self, x: float, y: float) -> int:
+        """
+        Return the index of the flow field towards a point, scheduling its computation on first use.
+
+        Parameters:
+            x (float): X-coordinate of the target.
+            y (float): Y-coordinate of the target.
+
+        Returns:
+            int: Index of the field in `flow`.
+        """
+        row, col = self.cell(x, y)
+        target = (int(row), int(col))
+        with self._lock:
+            index = self._fields.get(target)
+            if index is not None:
+                return index
+            index = self._fields[target] = len(self._fields)
+            if index == len(self.flow):
+                grown = np.full((2 * len(self.flow), self.rows, self.cols), -1, dtype=np.int8)
+                grown[:len(self.flow)] = self.flow
+                self.flow = grown
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True, name="flow-fields")
+                self._worker.start()
+        self._queue.put((index, target))
+        return index
+
+    def precompute(self, targets: Iterable[Tuple[float, float]]):
+        """Schedule the flow fields towards every target, e.g. the task locations and the meeting point."""
+        for x, y in targets:
+            self.field_index(x, y)
+
+    def directions(self, fields: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Return the direction codes of agents following the given fields, -1 where they should step greedily."""
+        rows, cols = self.cell(xs, ys)
+        return self.flow[fields, rows, cols]
+
+    def direction(self, field: int, x: float, y: float) -> int:
+        """Scalar version of `directions`."""
+        row, col = self.cell(x, y)
+        return int(self.flow[field, row, col])
+
+    def _shifted(self, array: np.ndarray, direction) -> np.ndarray:
+        """Return, for every cell, the value of its neighbour in the given direction (inf off the grid)."""
+        dx, dy = int(direction[0]), int(direction[1])
+        padded = np.pad(array, 1, constant_values=np.inf)
+        return padded[1 + dy:1 + dy + self.rows, 1 + dx:1 + dx + self.cols]
+
+    def _flow_field(self, target: Tuple[int, int]) -> np.ndarray:
+        # Bellman-Ford relaxation over the whole grid at once, converging in about a grid diameter of sweeps
+        step_costs = [length * self.cost for length in STEP_LENGTHS]
+        distance = np.full((self.rows, self.cols), np.inf)
+        distance[target] = 0.0
+        while True:
+            relaxed = distance
+            for direction, step_cost in zip(DIRECTIONS, step_costs):
+                relaxed = np.minimum(relaxed, self._shifted(distance, direction) + step_cost)
+            if np.array_equal(relaxed, distance):
+                break
+            distance = relaxed
+        through = np.stack([self._shifted(distance, direction) + step_cost for direction, step_cost in zip(DIRECTIONS, step_costs)])
+        codes = through.argmin(axis=0).astype(np.int8)
+        codes[target] = -1
+        return codes
+
+    def _run(self):
+        while True:
+            index, target = self._queue.get()
+            with metrics.timed("flow_field_seconds"):
+                codes = self._flow_field(target)
+            with self._lock:
+                self.flow[index] = codes
+            logger.debug(f"Flow field {index} towards cell {target} ready")
@@ -0,0 +1,70 @@
+import queue
+import threading
+from datetime import datetime
+from typing import Optional
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+class ReflectionQueue:
+    """
+    Background job queue running agent reflections off the interactive path.
+
+    At most one reflection per agent is queued or running at a time; further
+    requests for that agent are dropped until it finishes.
+
+    Attributes:
+        pending (set): Names of the agents with a queued or running reflection.
+    """
+
+    def __init__(self, workers: int = 2):
+        self.pending = set()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._run, daemon=True, name=f"reflection-{i}").start()
+
+    def submit(self, memory, agent_name: str, now: Optional[datetime] = None) -> bool:
+        """
+        Queue a reflection for an agent.
+
+        Parameters:
+            memory (AgentMemory): The memory to reflect on.
+            agent_name (str): Name of the agent, used for deduplication.
+            now (datetime): Time the reflection was triggered.
+
+        Returns:
+            bool: False if a reflection for this agent is already pending.
+        """
+        with self._lock:
+            if agent_name in self.pending:
+                return False
+            self.pending.add(agent_name)
+        self._queue.put((memory, agent_name, now))
+        return True
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def join(self):
+        """Block until every queued reflection has finished."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            memory, agent_name, now = self._queue.get()
+            try:
+                insights = memory.pause_to_reflect(now=now, agent_name=agent_name)
+                logger.info(f"{agent_name} reflected and gained {len(insights)} insights")
+            except Exception as e:
+                logger.error(f"Reflection failed for {agent_name}: {e}")
+            finally:
+                memory.reflecting = False
+                with self._lock:
+                    self.pending.discard(agent_name)
+                self._queue.task_done()
+
+
+reflection_queue = ReflectionQueue()
+metrics.register_gauge("reflection_queue_depth", reflection_queue.qsize)
@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+from langchain_core.documents import Document
+
+
+class RetrievalCache:
+    """
+    Per-agent LRU cache of retrieval results.
+
+    Entries are keyed on the query and the version of the memory store they were
+    computed against. Any write to the store changes its version, so stale
+    results are never returned and simply age out of the LRU.
+
+    Attributes:
+        hits (int): Retrievals answered from the cache.
+        misses (int): Retrievals that went to the vector store.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, List[Document]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str, version: Hashable) -> Optional[List[Document]]:
+        """Return the cached documents for a query at a given store version, or None."""
+        with self._lock:
+            documents = self._entries.get((query, version))
+            if documents is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((query, version))
+            self.hits += 1
+            return list(documents)
+
+    def put(self, query: str, version: Hashable, documents: List[Document]):
+        with self._lock:
+            self._entries[(query, version)] = list(documents)
+            self._entries.move_to_end((query, version))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,355 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.conversation_store import MEETING, ConversationStore
+from utils.logger import logger
+from utils.vector_db import VectorDatabase
+
+STORAGE_DB_NAME = "langchain_db"
+# "atlas", "sqlite" or "memory"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "atlas" if os.getenv("ATLAS_CONNECTION_STRING") else "sqlite")
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", "storage/game.sqlite")
+
+
+class MemoryMirror:
+    """Collection-like adapter handing the memories a retriever mirrors to a storage backend."""
+
+    def __init__(self, backend: "StorageBackend", agent_name: str):
+        self.backend = backend
+        self.agent_name = agent_name
+
+    def insert_many(self, documents: List[Dict[str, Any]]):
+        self.backend.add_memories(self.agent_name, documents)
+
+
+class StorageBackend(ABC):
+    """
+    Persistence used by the game: conversations, token usage, memory documents and vector search.
+
+    Memory records are dicts holding "text", "embedding" and the document metadata,
+    the shape LocalTimeWeightedRetriever mirrors them in. Conversations are the
+    {"villager1", "villager2", "conversation"} dicts produced by the game.
+    Everything is scoped to `run_id`.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+
+    @abstractmethod
+    def append_conversations(self, conversations: List[Dict[str, Any]], day: int, meeting: Optional[int] = None,
+                             now: Optional[datetime.datetime] = None):
+        """Store a batch of utterances. `meeting` applies to utterances addressed to the meeting."""
+
+    @abstractmethod
+    def dialogue_between(self, a: str, b: str, day: int) -> List[Dict[str, Any]]:
+        """Return everything a and b said to each other on a game day, oldest first."""
+
+    @abstractmethod
+    def meeting_transcript(self, meeting: int) -> List[Dict[str, Any]]:
+        """Return everything said in a meeting, oldest first."""
+
+    @abstractmethod
+    def record_usage(self, records: List[Dict[str, Any]]):
+        """Store a batch of token usage records."""
+
+    @abstractmethod
+    def add_memories(self, agent_name: str, records: List[Dict[str, Any]]):
+        """Store memory records of an agent."""
+
+    @abstractmethod
+    def search_memories(self, agent_name: str, query_vector, k: int = 4) -> List[Tuple[Dict[str, Any], float]]:
+        """Return the k stored memories of an agent closest to the query, as (record, cosine similarity) pairs."""
+
+    def memory_mirror(self, agent_name: str) -> MemoryMirror:
+        return MemoryMirror(self, agent_name)
+
+    def close(self):
+        pass
+
+
+class InMemoryStorage(StorageBackend):
+    """Keeps everything in process, for tests, benchmarks and offline runs."""
+
+    def __init__(self, run_id: str):
+        super().__init__(run_id)
+        self.utterances: List[Dict[str, Any]] = []
+        self.usage: List[Dict[str, Any]] = []
+        self.memories: Dict[str, List[Dict[str, Any]]] = {}
+        self._vectors: Dict[str, VectorDatabase] = {}
+        self._lock = threading.Lock()
+
+    def append_conversations(self, conversations, day, meeting=None, now=None):
+        now = now or datetime.datetime.now()
+        with self._lock:
+            for convo in conversations:
+                self.utterances.append({
+                    "speaker": convo["villager1"], "listener": convo["villager2"], "text": convo["conversation"],
+                    "time": now, "day": day, "meeting": meeting if convo["villager2"] == MEETING else None,
+                })
+
+    def dialogue_between(self, a, b, day):
+        with self._lock:
+            return [u for u in self.utterances
+                    if u["day"] == day and u["meeting"] is None and {u["speaker"], u["listener"]} == {a, b}]
+
+    def meeting_transcript(self, meeting):
+        with self._lock:
+            return [u for u in self.utterances if u["meeting"] == meeting]
+
+    def record_usage(self, records):
+        with self._lock:
+            self.usage.extend(records)
+
+    def add_memories(self, agent_name, records):
+        if not records:
+            return
+        with self._lock:
+            stored = self.memories.setdefault(agent_name, [])
+            vectors = self._vectors.get(agent_name)
+            if vectors is None:
+                vectors = self._vectors[agent_name] = VectorDatabase(len(records[0]["embedding"]))
+            ids = list(range(len(stored), len(stored) + len(records)))
+            stored.extend(records)
+            vectors.add_batch([record["embedding"] for record in records], [record["text"] for record in records], ids=ids)
+
+    def search_memories(self, agent_name, query_vector, k=4):
+        with self._lock:
+            vectors = self._vectors.get(agent_name)
+            if vectors is None:
+                return []
+            ids, scores = vectors.query(query_vector, k)
+            return [(self.memories[agent_name][int(i)], float(s)) for i, s in zip(ids[0], scores[0])]
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Embedded single-file storage, no network involved.
+
+    Embeddings are stored as float32 blobs. Vector search loads an agent's
+    embeddings into a VectorDatabase on first use and keeps it up to date
+    with later writes.
+    """
+
+    def __init__(self, run_id: str, path: str = STORAGE_SQLITE_PATH):
+        super().__init__(run_id)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._vectors: Dict[str, VectorDatabase] = {}
+        with self._lock:
+            self._db.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS utterances (
+                    run_id TEXT, day INTEGER, meeting INTEGER, participants TEXT,
+                    speaker TEXT, listener TEXT, text TEXT, time TEXT);
+                CREATE INDEX IF NOT EXISTS utterances_by_day ON utterances (run_id, day, participants);
+                CREATE INDEX IF NOT EXISTS utterances_by_meeting ON utterances (run_id, meeting);
+                CREATE TABLE IF NOT EXISTS token_usage (run_id TEXT, time TEXT, record TEXT);
+                CREATE TABLE IF NOT EXISTS memories (
+                    id INTEGER PRIMARY KEY, run_id TEXT, agent TEXT, text TEXT, metadata TEXT, embedding BLOB);
+                CREATE INDEX IF NOT EXISTS memories_by_agent ON memories (run_id, agent);
+            """)
+
+    @staticmethod
+    def _participants(a: str, b: str) -> str:
+        return "|".join(sorted({a, b}))
+
+    def append_conversations(self, conversations, day, meeting=None, now=None):
+        now = (now or datetime.datetime.now()).isoformat()
+        rows = [
+            (self.run_id, day, meeting if convo["villager2"] == MEETING else None,
+             convo["villager1"] if convo["villager2"] == MEETING else self._participants(convo["villager1"], convo["villager2"]),
+             convo["villager1"], convo["villager2"], convo["conversation"], now)
+            for convo in conversations
+        ]
+        with self._lock:
+            self._db.executemany("INSERT INTO utterances VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def _utterances(self, where: str, params: tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT speaker, listener, text, time, day, meeting FROM utterances WHERE run_id = ? AND {where} ORDER BY rowid",
+                (self.run_id, *params)).fetchall()
+        return [{"speaker": r[0], "listener": r[1], "text": r[2], "time": datetime.datetime.fromisoformat(r[3]),
+                 "day": r[4], "meeting": r[5]} for r in rows]
+
+    def dialogue_between(self, a, b, day):
+        return self._utterances("day = ? AND participants = ? AND meeting IS NULL", (day, self._participants(a, b)))
+
+    def meeting_transcript(self, meeting):
+        return self._utterances("meeting = ?", (meeting,))
+
+    def record_usage(self, records):
+        rows = [(self.run_id, str(record.get("time", "")), json.dumps(record, default=str)) for record in records]
+        with self._lock:
+            self._db.executemany("INSERT INTO token_usage VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def _load_vectors(self, agent_name: str) -> Optional[VectorDatabase]:
+        vectors = self._vectors.get(agent_name)
+        if vectors is not None:
+            return vectors
+        rows = self._db.execute("SELECT id, text, embedding FROM memories WHERE run_id = ? AND agent = ?",
+                                (self.run_id, agent_name)).fetchall()
+        if not rows:
+            return None
+        embeddings = np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        vectors = VectorDatabase(embeddings.shape[1], capacity=len(rows))
+        vectors.add_batch(embeddings, [row[1] for row in rows], ids=[row[0] for row in rows])
+        self._vectors[agent_name] = vectors
+        return vectors
+
+    def add_memories(self, agent_name, records):
+        if not records:
+            return
+        embeddings = np.asarray([record["embedding"] for record in records], dtype=np.float32)
+        with self._lock:
+            vectors = self._load_vectors(agent_name)
+            ids = []
+            for record, embedding in zip(records, embeddings):
+                metadata = {key: value for key, value in record.items() if key not in ("text", "embedding", "_id")}
+                cursor = self._db.execute(
+                    "INSERT INTO memories (run_id, agent, text, metadata, embedding) VALUES (?, ?, ?, ?, ?)",
+                    (self.run_id, agent_name, record["text"], json.dumps(metadata, default=str), embedding.tobytes()))
+                ids.append(cursor.lastrowid)
+            self._db.commit()
+            if vectors is None:
+                self._load_vectors(agent_name)
+            else:
+                vectors.add_batch(embeddings, [record["text"] for record in records], ids=ids)
+
+    def search_memories(self, agent_name, query_vector, k=4):
+        with self._lock:
+            vectors = self._load_vectors(agent_name)
+            if vectors is None:
+                return []
+            ids, scores = vectors.query(query_vector, k)
+            results = []
+            for item_id, score in zip(ids[0].tolist(), scores[0].tolist()):
+                text, metadata = self._db.execute("SELECT text, metadata FROM memories WHERE id = ?", (item_id,)).fetchone()
+                results.append(({"text": text, **json.loads(metadata)}, score))
+        return results
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class AtlasStorage(StorageBackend):
+    """
+    MongoDB Atlas storage through the shared client of utils.mongoClient.
+
+    Conversations go through ConversationStore, memories to one collection per
+    agent and vector search runs Atlas' $vectorSearch over `vector_index`.
+    """
+
+    def __init__(self, run_id: str, db_name: str = STORAGE_DB_NAME, memory_collections: Optional[Dict[str, str]] = None,
+                 conversation_collection: str = "conversations", usage_collection: str = "token_tracking",
+                 vector_search_index: str = "vector_index"):
+        super().__init__(run_id)
+        from utils.mongoClient import drop_finished_runs, get_atlas_collection
+        self._get_collection = get_atlas_collection
+        self.db_name = db_name
+        self.memory_collections = memory_collections or {}
+        self.vector_search_index = vector_search_index
+        self.conversations = ConversationStore(get_atlas_collection(db_name, conversation_collection), run_id)
+        self.usage = get_atlas_collection(db_name, usage_collection)
+        self._memories: Dict[str, Any] = {}
+        drop_finished_runs(db_name)
+
+    def _memory_collection(self, agent_name: str):
+        collection = self._memories.get(agent_name)
+        if collection is None:
+            collection = self._get_collection(self.db_name, self.memory_collections.get(agent_name, agent_name))
+            self._memories[agent_name] = collection
+        return collection
+
+    def append_conversations(self, conversations, day, meeting=None, now=None):
+        self.conversations.append(conversations, day, meeting=meeting, now=now)
+
+    def dialogue_between(self, a, b, day):
+        return self.conversations.dialogue_between(a, b, day)
+
+    def meeting_transcript(self, meeting):
+        return self.conversations.meeting_transcript(meeting)
+
+    def record_usage(self, records):
+        # insert_many adds an _id to each record, keep the caller's dicts untouched
+        self.usage.insert_many([dict(record) for record in records], ordered=False)
+
+    def add_memories(self, agent_name, records):
+        if records:
+            self._memory_collection(agent_name).insert_many(records)
+
+    def search_memories(self, agent_name, query_vector, k=4):
+        from utils.mongoClient import RunScopedCollection
+        collection = self._memory_collection(agent_name)
+        search = {"index": self.vector_search_index, "path": "embedding",
+                  "queryVector": list(map(float, query_vector)), "numCandidates": 10 * k, "limit": k}
+        if isinstance(collection, RunScopedCollection):
+            # shared collection, run_id must be a filter field of the index
+            search["filter"] = {"run_id": self.run_id}
+            collection = collection.collection
+        pipeline = [
+            {"$vectorSearch": search},
+            {"$project": {"_id": 0, "embedding": 0, "score": {"$meta": "vectorSearchScore"}}},
+        ]
+        results = []
+        for record in collection.aggregate(pipeline):
+            # Atlas normalizes cosine similarity to [0, 1]
+            results.append((record, 2 * record.pop("score") - 1))
+        return results
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """Return the process-wide storage backend, created on first use so a resumed run id is picked up."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = get_storage_backend()
+                logger.info(f"Using {type(_storage).__name__} for run {_storage.run_id}")
+    return _storage
+
+
+def configure_storage(backend: StorageBackend):
+    """Use an explicitly built backend as the process-wide one."""
+    global _storage
+    with _storage_lock:
+        _storage = backend
+
+
+def get_storage_backend(kind: str = STORAGE_BACKEND, run_id: Optional[str] = None, **kwargs) -> StorageBackend:
+    """
+    Create the storage backend selected by STORAGE_BACKEND.
+
+    Parameters:
+        kind (str): "atlas", "sqlite" or "memory".
+        run_id (str): Run the data belongs to, defaults to utils.mongoClient.RUN_ID.
+        **kwargs: Passed to the backend constructor.
+    """
+    if run_id is None:
+        import utils.mongoClient as mongoClient
+        run_id = mongoClient.RUN_ID
+    if kind == "atlas":
+        return AtlasStorage(run_id, **kwargs)
+    if kind == "sqlite":
+        return SQLiteStorage(run_id, **kwargs)
+    if kind == "memory":
+        return InMemoryStorage(run_id)
+    raise ValueError(f"Unknown storage backend '{kind}'")
@@ -0,0 +1,186 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv(".env")
+
+TELEMETRY_DB_NAME = "langchain_db"
+TELEMETRY_DIR = os.getenv("TELEMETRY_DIR", "telemetry")
+# comma separated list of "storage", "mongo", "jsonl" and "sqlite"
+TELEMETRY_TARGETS = os.getenv("TELEMETRY_TARGETS", "storage")
+
+
+class MongoTarget:
+    """Writes batches to a Mongo collection, connecting on the first write."""
+
+    def __init__(self, collection_name: str, db_name: str = TELEMETRY_DB_NAME):
+        self.collection_name = collection_name
+        self.db_name = db_name
+        self._collection = None
+
+    def write(self, records: List[Dict[str, Any]]):
+        if self._collection is None:
+            from utils.mongoClient import get_atlas_collection
+            self._collection = get_atlas_collection(self.db_name, self.collection_name)
+        # insert_many adds an _id to each record, keep the buffered dicts untouched
+        with metrics.timed("mongo_write_seconds", target="telemetry"):
+            self._collection.insert_many([dict(record) for record in records], ordered=False)
+
+
+class StorageTarget:
+    """Writes batches to the token usage of the game's storage backend."""
+
+    def write(self, records: List[Dict[str, Any]]):
+        from utils.storage import get_storage
+        get_storage().record_usage(records)
+
+
+class JSONLTarget:
+    """Appends batches to a local JSON lines file."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+
+    def write(self, records: List[Dict[str, Any]]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+
+
+class SQLiteTarget:
+    """Appends batches to a SQLite table holding one JSON document per row."""
+
+    def __init__(self, path: str, table: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.table = table
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} (time REAL, record TEXT)")
+        self._db.commit()
+
+    def write(self, records: List[Dict[str, Any]]):
+        now = time.time()
+        self._db.executemany(f"INSERT INTO {self.table} VALUES (?, ?)",
+                             [(now, json.dumps(record, default=str)) for record in records])
+        self._db.commit()
+
+
+def create_targets(spec: str, name: str) -> list:
+    """
+    Build telemetry targets from a comma separated spec.
+
+    Parameters:
+        spec (str): e.g. "mongo,jsonl".
+        name (str): Collection, file and table name of the stream.
+    """
+    targets = []
+    for kind in (part.strip().lower() for part in spec.split(",")):
+        if kind == "storage":
+            targets.append(StorageTarget())
+        elif kind == "mongo":
+            targets.append(MongoTarget(name))
+        elif kind == "jsonl":
+            targets.append(JSONLTarget(os.path.join(TELEMETRY_DIR, f"{name}.jsonl")))
+        elif kind == "sqlite":
+            targets.append(SQLiteTarget(os.path.join(TELEMETRY_DIR, "telemetry.sqlite"), name))
+        elif kind:
+            logger.warning(f"Unknown telemetry target '{kind}' ignored")
+    return targets
+
+
+class TelemetrySink:
+    """
+    Buffered, asynchronous sink for telemetry records.
+
+    `emit` only appends to an in-memory ring buffer, so the code being measured
+    never waits on a write. A background thread drains the buffer in batches
+    and writes each batch to every target. Records pushed out of a full buffer
+    are counted in `dropped`, records a target failed to write in `lost`;
+    neither ever raises into the caller.
+
+    Attributes:
+        emitted (int): Records accepted by `emit`.
+        dropped (int): Records overwritten because the buffer was full.
+        lost (int): Records a target failed to write, counted once per target.
+    """
+
+    def __init__(self, targets: list, capacity: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.targets = targets
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.emitted = 0
+        self.dropped = 0
+        self.lost = 0
+        self._buffer = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="telemetry-flusher")
+        self._thread.start()
+
+    def emit(self, record: Dict[str, Any]):
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(record)
+            self.emitted += 1
+            self._idle.clear()
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.set()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            count = min(len(self._buffer), self.batch_size)
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        for target in self.targets:
+            try:
+                target.write(batch)
+            except Exception as e:
+                self.lost += len(batch)
+                logger.error(f"Telemetry target {type(target).__name__} lost {len(batch)} records: {e}")
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            batch = self._drain()
+            while batch:
+                self._write(batch)
+                batch = self._drain()
+            with self._lock:
+                if not self._buffer:
+                    self._idle.set()
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """Wait until the buffer has been written out. Returns False on timeout."""
+        self._wakeup.set()
+        return self._idle.wait(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "emitted": self.emitted,
+            "buffered": len(self._buffer),
+            "dropped": self.dropped,
+            "lost": self.lost,
+        }
+
+
+token_telemetry = TelemetrySink(create_targets(TELEMETRY_TARGETS, "token_tracking"))
+metrics.register_gauge("telemetry_buffered_records", lambda: len(token_telemetry._buffer))
+atexit.register(token_telemetry.flush)
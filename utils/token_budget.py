@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+from utils.logger import logger
+
+# USD per million (prompt, completion) tokens.
+# track_tokens used to charge gpt-35-turbo 0.5*10e-6 and 1.5*10e-6 per token, i.e. $5 and $15
+# per million, ten times the list price. Costs are now a tenth of what that formula reported,
+# so a daily budget sized on the old figures reaches frugal (0.75) and exhausted (1.0) ten
+# times later: divide such a budget by ten to keep the same throttling point.
+MODEL_PRICING = {
+    "gpt-35-turbo": (0.5, 1.5),
+    "gpt-35-turbo-16k": (3.0, 4.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-32k": (60.0, 120.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (5.0, 15.0),
+    "gpt-4o-mini": (0.15, 0.6),
+}
+
+# USD, unset or 0 means unlimited
+AGENT_DAILY_BUDGET = float(os.getenv("AGENT_DAILY_BUDGET", "0"))
+GAME_DAILY_BUDGET = float(os.getenv("GAME_DAILY_BUDGET", "0"))
+ROLLING_WINDOW = 300  # seconds covered by the rolling spend rate
+
+# Cognition profiles by budget pressure, from the cheapest to the richest.
+# last_k: recent memories put in a reaction prompt
+# summarize_related_memories: spend two extra LLM calls summarizing related memories
+# refresh_summary: allow the agent summary to be recomputed
+# cooldown_factor: multiplier on conversation and observation cooldowns
+COGNITION_PROFILES = (
+    (1.0, {"name": "exhausted", "last_k": 3, "summarize_related_memories": False, "refresh_summary": False, "cooldown_factor": 4.0}),
+    (0.75, {"name": "frugal", "last_k": 8, "summarize_related_memories": False, "refresh_summary": False, "cooldown_factor": 2.0}),
+    (0.0, {"name": "normal", "last_k": 15, "summarize_related_memories": True, "refresh_summary": True, "cooldown_factor": 1.0}),
+)
+
+
+def model_cost(model_name: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Return the cost in USD of a call, or None for a model missing from the pricing table."""
+    prices = MODEL_PRICING.get(model_name)
+    if prices is None:
+        return None
+    return round((prices[0] * prompt_tokens + prices[1] * completion_tokens) / 1e6, 9)
+
+
+class TokenLedger:
+    """
+    In-process token and cost accounting.
+
+    Every LLM call is recorded against the agent that made it, the call site
+    (e.g. `_score_memory_importance`) and the current game day. Aggregates are
+    kept per agent, per call site, per day and per (agent, day), along with a
+    rolling spend rate per agent over the last `ROLLING_WINDOW` seconds.
+
+    Budgets turn into a pressure: the fraction of the agent's daily budget, or
+    of the whole game's daily budget, already spent, whichever is higher. The
+    pressure selects one of the `COGNITION_PROFILES`.
+
+    Attributes:
+        day (int): Current game day, set by the game loop.
+    """
+
+    def __init__(self, agent_daily_budget: float = AGENT_DAILY_BUDGET, game_daily_budget: float = GAME_DAILY_BUDGET):
+        self.agent_daily_budget = agent_daily_budget
+        self.game_daily_budget = game_daily_budget
+        self.day = 1
+        self._by_agent = defaultdict(lambda: defaultdict(int))
+        self._by_call_site = defaultdict(lambda: defaultdict(int))
+        self._by_day = defaultdict(lambda: defaultdict(int))
+        self._by_agent_day = defaultdict(lambda: defaultdict(int))
+        self._recent = defaultdict(deque)
+        self._profiles: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def set_day(self, day: int):
+        with self._lock:
+            self.day = day
+
+    def record(self, agent_name: Optional[str], call_site: str, model_name: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        """
+        Record one LLM call.
+
+        Returns:
+            float: Cost of the call in USD, or None if the model has no known price.
+        """
+        agent_name = agent_name or "unknown"
+        cost = model_cost(model_name, prompt_tokens, completion_tokens)
+        now = time.time()
+        with self._lock:
+            for totals in (self._by_agent[agent_name], self._by_call_site[call_site],
+                           self._by_day[self.day], self._by_agent_day[(agent_name, self.day)]):
+                totals["calls"] += 1
+                totals["prompt_tokens"] += prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+                totals["cost"] += cost or 0.0
+            recent = self._recent[agent_name]
+            recent.append((now, cost or 0.0))
+            while recent and recent[0][0] < now - ROLLING_WINDOW:
+                recent.popleft()
+        return cost
+
+    def spend_rate(self, agent_name: str) -> float:
+        """Return the agent's spend in USD per hour over the rolling window."""
+        with self._lock:
+            recent = list(self._recent.get(agent_name, ()))
+        return sum(cost for _, cost in recent) * 3600 / ROLLING_WINDOW
+
+    def pressure(self, agent_name: str) -> float:
+        """Return the highest fraction of an applicable daily budget already spent."""
+        with self._lock:
+            agent_spend = self._by_agent_day[(agent_name, self.day)]["cost"] if (agent_name, self.day) in self._by_agent_day else 0.0
+            game_spend = self._by_day[self.day]["cost"] if self.day in self._by_day else 0.0
+        pressure = 0.0
+        if self.agent_daily_budget > 0:
+            pressure = max(pressure, agent_spend / self.agent_daily_budget)
+        if self.game_daily_budget > 0:
+            pressure = max(pressure, game_spend / self.game_daily_budget)
+        return pressure
+
+    def cognition(self, agent_name: str) -> Dict:
+        """Return the cognition profile the agent can currently afford."""
+        pressure = self.pressure(agent_name)
+        profile = next(profile for threshold, profile in COGNITION_PROFILES if pressure >= threshold)
+        if self._profiles.get(agent_name, "normal") != profile["name"]:
+            logger.info(f"{agent_name} switches to {profile['name']} cognition at {pressure:.0%} of its budget")
+            self._profiles[agent_name] = profile["name"]
+        return profile
+
+    def report(self) -> Dict[str, Dict]:
+        """Return plain-dict copies of every aggregate."""
+        with self._lock:
+            return {
+                "by_agent": {agent: dict(totals) for agent, totals in self._by_agent.items()},
+                "by_call_site": {site: dict(totals) for site, totals in self._by_call_site.items()},
+                "by_day": {day: dict(totals) for day, totals in self._by_day.items()},
+            }
+
+
+token_ledger = TokenLedger()
@@ -1,40 +1,33 @@
-import os
-from openai import AzureOpenAI
-from dotenv import load_dotenv
 import datetime
-from utils.logger import logger
-from pymongo import MongoClient
-
-load_dotenv(".env")
-
-ATLAS_CONNECTION_STRING=os.getenv("ATLAS_CONNECTION_STRING")
-
-# Connect to your Atlas cluster
-client = MongoClient(ATLAS_CONNECTION_STRING)
-
-# Define collection and index name
-db_name = "langchain_db"
-collection_name = "token_tracking"
-atlas_collection = client[db_name][collection_name]
+from utils.telemetry import token_telemetry
+from utils.token_budget import token_ledger
+from utils.metrics import metrics
 
 def token_tracker(func):
     def wrapper(*args, **kwargs):
-        response = func(*args, **kwargs)
+        with metrics.in_flight("llm_calls_in_flight"), metrics.timed("llm_call_seconds", call_site=func.__name__):
+            response = func(*args, **kwargs)
 
+        # the caller is an Agent (name) or an AgentMemory (owner)
+        agent_name = getattr(args[0], "name", None) or getattr(args[0], "owner", None) if args else None
         usage_info = {
             "completion": response.content,
             "completion_tokens": response.response_metadata["token_usage"]["completion_tokens"],
             "prompt_tokens": response.response_metadata["token_usage"]["prompt_tokens"],
             "total_tokens": response.response_metadata["token_usage"]["total_tokens"],
             "model_name": response.response_metadata["model_name"],
+            "agent": agent_name,
+            "call_site": func.__name__,
+            "day": token_ledger.day,
             "time": datetime.datetime.now()
         }
 
-        if usage_info["model_name"] == "gpt-35-turbo":
-            usage_info["cost"] = 0.5*10e-6 * usage_info["prompt_tokens"] + 1.5*10e-6 * usage_info["completion_tokens"]
-            usage_info['cost'] = round(usage_info['cost'],9)
-        
-        atlas_collection.insert_one(usage_info)
+        cost = token_ledger.record(agent_name, func.__name__, usage_info["model_name"], usage_info["prompt_tokens"], usage_info["completion_tokens"])
+        if cost is not None:
+            usage_info["cost"] = cost
+
+        # buffered and written by a background thread, never blocks the LLM call path
+        token_telemetry.emit(usage_info)
 
         return response.content.strip()
     return wrapper
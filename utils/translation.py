@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "cache/translations.jsonl")
+TRANSLATION_TARGET_LANG = os.getenv("TRANSLATION_TARGET_LANG", "JA")
+# "deepl" or "stub"
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "deepl" if os.getenv("DEEPL_AUTH_KEY") else "stub")
+
+
+class DeepLBackend:
+    """Translates a batch of texts with one DeepL request."""
+
+    def __init__(self, auth_key: str):
+        import deepl
+        self.translator = deepl.Translator(auth_key)
+
+    def translate(self, texts: List[str], target_lang: str) -> List[str]:
+        return [result.text for result in self.translator.translate_text(texts, target_lang=target_lang)]
+
+
+class StubBackend:
+    """Offline stand-in returning the text tagged with the target language."""
+
+    def translate(self, texts: List[str], target_lang: str) -> List[str]:
+        return [f"[{target_lang}] {text}" for text in texts]
+
+
+class TranslationService:
+    """
+    Content-keyed, asynchronous translation of conversations.
+
+    `translate` never blocks: it returns the cached translation, or None after
+    queueing the text. A background worker collects queued texts for up to
+    `batch_delay` seconds and translates them in a single backend request.
+    Translations are cached in memory and appended to a JSON lines file, so a
+    text is only ever paid for once. `take_completed` hands out the
+    translations finished since its last call, for texts whose `translate`
+    call came back empty.
+
+    Attributes:
+        requests (int): Texts sent to the backend.
+        batches (int): Backend requests made.
+    """
+
+    def __init__(self, backend, target_lang: str = TRANSLATION_TARGET_LANG, cache_path: Optional[str] = TRANSLATION_CACHE_PATH,
+                 batch_size: int = 50, batch_delay: float = 0.2):
+        self.backend = backend
+        self.target_lang = target_lang
+        self.cache_path = cache_path
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.requests = 0
+        self.batches = 0
+        self._cache: Dict[str, str] = {}
+        self._pending = set()
+        self._completed: Dict[str, str] = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        if cache_path:
+            directory = os.path.dirname(cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(cache_path):
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        self._cache[entry["key"]] = entry["translation"]
+        threading.Thread(target=self._run, daemon=True, name="translation-worker").start()
+
+    def key(self, text: str) -> str:
+        """Return the id of a text's translation, stable across runs."""
+        return hashlib.sha256(f"{self.target_lang}\0{text}".encode("utf-8")).hexdigest()
+
+    def translate(self, text: str) -> Optional[str]:
+        """Return the translation of a text if it is ready, queueing it otherwise."""
+        text = text.strip()
+        if not text:
+            return ""
+        key = self.key(text)
+        with self._lock:
+            translation = self._cache.get(key)
+            if translation is not None or key in self._pending:
+                return translation
+            self._pending.add(key)
+        self._queue.put((key, text))
+        return None
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            keys, texts = [key for key, _ in batch], [text for _, text in batch]
+            try:
+                with metrics.timed("translation_seconds"):
+                    translations = self.backend.translate(texts, self.target_lang)
+            except Exception as e:
+                logger.error(f"Translation of {len(texts)} texts failed: {e}")
+                translations = None
+            with self._lock:
+                # failed texts leave the pending set and are retried on their next request
+                self._pending.difference_update(keys)
+                if translations is None:
+                    continue
+                self.requests += len(texts)
+                self.batches += 1
+                self._cache.update(zip(keys, translations))
+                self._completed.update(zip(keys, translations))
+            if self.cache_path:
+                with open(self.cache_path, "a", encoding="utf-8") as f:
+                    for key, translation in zip(keys, translations):
+                        f.write(json.dumps({"key": key, "translation": translation}, ensure_ascii=False) + "\n")
+
+    def take_completed(self) -> Dict[str, str]:
+        """Return the translations finished since the last call, keyed by translation id."""
+        with self._lock:
+            completed, self._completed = self._completed, {}
+        return completed
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached": len(self._cache), "pending": len(self._pending), "requests": self.requests, "batches": self.batches}
+
+
+def create_translation_service(kind: str = TRANSLATION_BACKEND) -> TranslationService:
+    if kind == "deepl":
+        return TranslationService(DeepLBackend(os.getenv("DEEPL_AUTH_KEY")))
+    return TranslationService(StubBackend())
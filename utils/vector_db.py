@@ -1,18 +1,242 @@
+import json
 import numpy as np
 
+
 class VectorDatabase:
-    def __init__(self, dim):
+    """
+    In-process vector store backed by a contiguous, pre-normalized float32 matrix.
+
+    Embeddings are normalized once when they are added, so cosine similarity is a
+    single matrix product at query time. The matrix grows geometrically and deleted
+    rows are filled with the last row, so the live rows always stay contiguous.
+
+    Attributes:
+        dim (int): Dimension of the stored embeddings.
+    """
+
+    def __init__(self, dim, capacity=1024):
         self.dim = dim
-        self.data = []
+        capacity = max(capacity, 1)  # the capacity doubles when it runs out, so it may never be 0
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._size = 0
+        self._rows = {}
+        self._texts = {}
+        self._metadata = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def add(self, embedding, text, metadata=None, item_id=None):
+        """
+        Add a single embedding.
+
+        Returns:
+            int: The id of the stored item.
+        """
+        return self.add_batch([embedding], [text], [metadata], None if item_id is None else [item_id])[0]
+
+    def add_batch(self, embeddings, texts, metadatas=None, ids=None):
+        """
+        Add several embeddings at once.
+
+        Parameters:
+            embeddings (array-like): Embeddings of shape (n, dim).
+            texts (list): Text stored with each embedding.
+            metadatas (list): Optional metadata dict stored with each embedding.
+            ids (list): Optional ids, generated when omitted.
+
+        Returns:
+            list: The ids of the stored items.
+        """
+        vectors = self._normalize(embeddings)
+        n = vectors.shape[0]
+        if n == 0:
+            return []
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}")
+        if ids is None:
+            ids = list(range(self._next_id, self._next_id + n))
+        if metadatas is None:
+            metadatas = [None] * n
+        ids = [int(item_id) for item_id in ids]
+        # validate the whole batch before touching the store, so a bad batch leaves it unchanged
+        if len(ids) != n or len(texts) != n or len(metadatas) != n:
+            raise ValueError(f"Expected {n} ids, texts and metadatas, got {len(ids)}, {len(texts)} and {len(metadatas)}")
+        if len(set(ids)) != n:
+            raise ValueError("Ids within a batch must be unique")
+        stored = [item_id for item_id in ids if item_id in self._rows]
+        if stored:
+            raise ValueError(f"Id {stored[0]} is already stored")
+        self._reserve(n)
+
+        start = self._size
+        self._matrix[start:start + n] = vectors
+        self._ids[start:start + n] = ids
+        for offset, (item_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+            self._rows[item_id] = start + offset
+            self._texts[item_id] = text
+            self._metadata[item_id] = metadata or {}
+            self._next_id = max(self._next_id, item_id + 1)
+        self._size += n
+        return ids
 
-    def add(self, embedding, text):
-        self.data.append({'embedding': np.array(embedding), 'text': text})
+    def delete(self, item_id):
+        """
+        Delete an item by id.
+
+        Returns:
+            bool: True if the item existed.
+        """
+        row = self._rows.pop(item_id, None)
+        if row is None:
+            return False
+        last = self._size - 1
+        if row != last:
+            moved_id = int(self._ids[last])
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._size = last
+        del self._texts[item_id]
+        del self._metadata[item_id]
+        return True
+
+    def get(self, item_id):
+        """Return the stored item as a dict with its normalized embedding."""
+        row = self._rows[item_id]
+        return {
+            "id": item_id,
+            "embedding": self._matrix[row],
+            "text": self._texts[item_id],
+            "metadata": self._metadata[item_id],
+        }
+
+    def embeddings(self, ids=None):
+        """Return the normalized embeddings of the given ids (all rows if omitted)."""
+        if ids is None:
+            return self._matrix[:self._size]
+        return self._matrix[[self._rows[i] for i in ids]]
+
+    def ids(self):
+        return self._ids[:self._size]
+
+    def query(self, query_embeddings, top_k=5, restrict_ids=None):
+        """
+        Batched top-k search returning raw arrays.
+
+        Parameters:
+            query_embeddings (array-like): One query of shape (dim,) or several of shape (q, dim).
+            top_k (int): Number of results per query.
+            restrict_ids (iterable): Only consider these ids when given.
+
+        Returns:
+            tuple: (ids, scores), both of shape (q, k) and sorted by descending cosine similarity.
+        """
+        queries = self._normalize(query_embeddings)
+        if restrict_ids is None:
+            matrix = self._matrix[:self._size]
+            candidate_ids = self._ids[:self._size]
+        else:
+            rows = [self._rows[i] for i in restrict_ids if i in self._rows]
+            matrix = self._matrix[rows]
+            candidate_ids = self._ids[rows]
+
+        n = matrix.shape[0]
+        k = min(top_k, n)
+        if k == 0:
+            empty = np.zeros((queries.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        scores = queries @ matrix.T
+        if k < n:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n), (queries.shape[0], n))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return candidate_ids[top], np.take_along_axis(top_scores, order, axis=1)
+
+    def search_batch(self, query_embeddings, top_k=5):
+        """Search several queries with one matrix multiply, returning one result list per query."""
+        ids, scores = self.query(query_embeddings, top_k)
+        return [
+            [
+                {"id": int(i), "text": self._texts[int(i)], "metadata": self._metadata[int(i)], "score": float(s)}
+                for i, s in zip(row_ids, row_scores)
+            ]
+            for row_ids, row_scores in zip(ids, scores)
+        ]
 
     def search(self, query_embedding, top_k=5):
-        query_embedding = np.array(query_embedding)
-        similarities = []
-        for item in self.data:
-            similarity = np.dot(query_embedding, item['embedding']) / (np.linalg.norm(query_embedding) * np.linalg.norm(item['embedding']))
-            similarities.append((similarity, item))
-        similarities = sorted(similarities, key=lambda x: x[0], reverse=True)
-        return [item for _, item in similarities[:top_k]]
+        return self.search_batch(query_embedding, top_k)[0]
+
+    def save(self, path):
+        """
+        Save the store as `{path}.npy` (embeddings), `{path}.ids.npy` and `{path}.json` (texts and metadata).
+        """
+        np.save(f"{path}.npy", self._matrix[:self._size])
+        np.save(f"{path}.ids.npy", self._ids[:self._size])
+        ids = [int(i) for i in self._ids[:self._size]]
+        with open(f"{path}.json", "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "next_id": self._next_id,
+                "texts": [self._texts[i] for i in ids],
+                "metadata": [self._metadata[i] for i in ids],
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        """Load a store written by `save`."""
+        with open(f"{path}.json", "r") as f:
+            meta = json.load(f)
+        matrix = np.load(f"{path}.npy")
+        ids = np.load(f"{path}.ids.npy")
+        db = cls.from_arrays(meta["dim"], matrix, ids, meta["texts"], meta["metadata"])
+        db._next_id = max(db._next_id, meta["next_id"])
+        return db
+
+    @classmethod
+    def from_arrays(cls, dim, normalized_embeddings, ids, texts, metadatas=None):
+        """Build a store from embeddings that are already normalized, without renormalizing them."""
+        n = len(ids)
+        db = cls(dim, capacity=max(1024, n))
+        db._matrix[:n] = normalized_embeddings
+        db._ids[:n] = ids
+        db._size = n
+        metadatas = metadatas or [None] * n
+        for row, (item_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+            item_id = int(item_id)
+            db._rows[item_id] = row
+            db._texts[item_id] = text
+            db._metadata[item_id] = metadata or {}
+        db._next_id = int(max(ids)) + 1 if n else 0
+        return db
@@ -0,0 +1,78 @@
+from typing import Optional
+
+import numpy as np
+
+
+class WalkabilityMap:
+    """
+    Rasterized walkability of the map.
+
+    The Path rects are painted into a NumPy bool bitmap with one entry per
+    `resolution` x `resolution` pixels, so point queries are an array lookup
+    instead of a test against every rect. Points outside the map are not
+    walkable.
+
+    The bitmap is rebuilt by `ensure` only when it is given a different list
+    of paths, or the list changed length. Call `build` after moving a rect in
+    place.
+
+    Attributes:
+        bitmap (np.ndarray): (rows, cols) bool array, True where walkable.
+        resolution (int): Pixels per bitmap entry along each axis.
+    """
+
+    def __init__(self, paths=None, width: Optional[int] = None, height: Optional[int] = None, resolution: int = 1):
+        self.resolution = resolution
+        self.bitmap = np.zeros((0, 0), dtype=bool)
+        self._paths = None
+        self._count = 0
+        self._size = (width, height)
+        if paths is not None:
+            self.build(paths, width, height)
+
+    def build(self, paths, width: Optional[int] = None, height: Optional[int] = None):
+        """
+        Rasterize a path layout.
+
+        Parameters:
+            paths (list): Path objects, each with a pygame Rect.
+            width (int): Map width in pixels, the paths' extent by default.
+            height (int): Map height in pixels, the paths' extent by default.
+        """
+        width = width or self._size[0] or max((path.rect.right for path in paths), default=0)
+        height = height or self._size[1] or max((path.rect.bottom for path in paths), default=0)
+        self._size = (width, height)
+        res = self.resolution
+        self.bitmap = np.zeros((-(-height // res), -(-width // res)), dtype=bool)
+        for path in paths:
+            rect = path.rect.clip((0, 0, width, height))
+            if rect.width and rect.height:
+                self.bitmap[rect.top // res:-(-rect.bottom // res), rect.left // res:-(-rect.right // res)] = True
+        self._paths = paths
+        self._count = len(paths)
+        return self
+
+    def ensure(self, paths):
+        """Rebuild if the path layout changed since the last build, and return the map."""
+        if paths is not self._paths or len(paths) != self._count:
+            self.build(paths)
+        return self
+
+    def is_walkable(self, x: float, y: float) -> bool:
+        """Return True if the point is on a path."""
+        col, row = int(x // self.resolution), int(y // self.resolution)
+        rows, cols = self.bitmap.shape
+        return 0 <= row < rows and 0 <= col < cols and bool(self.bitmap[row, col])
+
+    def walkable(self, xs, ys) -> np.ndarray:
+        """Batched `is_walkable`: return a bool array over the points."""
+        cols = np.floor_divide(np.asarray(xs, dtype=np.float64), self.resolution).astype(np.int64)
+        rows = np.floor_divide(np.asarray(ys, dtype=np.float64), self.resolution).astype(np.int64)
+        height, width = self.bitmap.shape
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        result = np.zeros(inside.shape, dtype=bool)
+        result[inside] = self.bitmap[rows[inside], cols[inside]]
+        return result
+
+
+walkability = WalkabilityMap()
@@ -0,0 +1,165 @@
+import json
+import os
+import struct
+from typing import Any, Dict, Union
+from urllib.parse import parse_qs, urlparse
+
+from utils.logger import logger
+
+try:
+    import msgpack
+except ImportError:  # optional, clients asking for it get JSON instead
+    msgpack = None
+
+JSON = "json"
+BINARY = "binary"
+MSGPACK = "msgpack"
+ENCODINGS = (JSON, BINARY, MSGPACK) if msgpack is not None else (JSON, BINARY)
+WIRE_ENCODING = os.getenv("WIRE_ENCODING", JSON)  # encoding of the game -> server messages
+HELLO_PREFIX = '{"hello"'  # {"hello": {"encoding": "binary"}} switches a client's encoding
+
+'''
+Binary layout, little endian:
+
+    header   2s magic "WS", B version, B flags (isDay 1, isConvo 2, is_morning_meeting 4),
+             f blendFactor, H numVillagers, H agent count, H task count
+    agents   per agent: f x, f y, B alive
+    tasks    per task:  f x, f y, B flags (completed 1, sabotaged 2)
+    rest     I length, then compact JSON of every other field, including the
+             agent ids and task labels in record order
+'''
+MAGIC = b"WS"
+VERSION = 1
+HEADER = struct.Struct("<2sBBfHHH")
+AGENT = "ffB"
+TASK = "ffB"
+LENGTH = struct.Struct("<I")
+FLAGS = ("isDay", "isConvo", "is_morning_meeting")
+FIXED_KEYS = FLAGS + ("blendFactor", "numVillagers", "villagers", "tasks")
+# what malformed input raises on its way through the encoders, reported as a ValueError
+MALFORMED = (KeyError, TypeError, IndexError, ValueError, OverflowError, struct.error)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def _encode_binary(state: Dict[str, Any]) -> bytes:
+    agents, tasks = state["villagers"], state["tasks"]
+    flags = sum(1 << i for i, key in enumerate(FLAGS) if state.get(key))
+    agent_values = []
+    for agent in agents:
+        agent_values.extend((agent["x"], agent["y"], agent["alive"]))
+    task_values = []
+    for task in tasks:
+        task_values.extend((task["x"], task["y"], task["completed"] | task["sabotaged"] << 1))
+    rest = {key: value for key, value in state.items() if key not in FIXED_KEYS}
+    rest["agentIds"] = [agent["agent_id"] for agent in agents]
+    rest["taskLabels"] = [task["label"] for task in tasks]
+    rest = _dumps(rest).encode("utf-8")
+    return b"".join((
+        HEADER.pack(MAGIC, VERSION, flags, state["blendFactor"], state["numVillagers"], len(agents), len(tasks)),
+        struct.pack("<" + AGENT * len(agents), *agent_values),
+        struct.pack("<" + TASK * len(tasks), *task_values),
+        LENGTH.pack(len(rest)),
+        rest,
+    ))
+
+
+def _decode_binary(payload: bytes) -> Dict[str, Any]:
+    _, version, flags, blend_factor, num_villagers, num_agents, num_tasks = HEADER.unpack_from(payload)
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary game state version {version}")
+    offset = HEADER.size
+    agents = struct.unpack_from("<" + AGENT * num_agents, payload, offset)
+    offset += struct.calcsize("<" + AGENT * num_agents)
+    tasks = struct.unpack_from("<" + TASK * num_tasks, payload, offset)
+    offset += struct.calcsize("<" + TASK * num_tasks)
+    (length,) = LENGTH.unpack_from(payload, offset)
+    offset += LENGTH.size
+    rest = json.loads(payload[offset:offset + length].decode("utf-8"))
+
+    state = {key: bool(flags & 1 << i) for i, key in enumerate(FLAGS)}
+    state["blendFactor"] = blend_factor
+    state["numVillagers"] = num_villagers
+    state["villagers"] = [
+        {"agent_id": agent_id, "x": agents[3 * i], "y": agents[3 * i + 1], "alive": bool(agents[3 * i + 2])}
+        for i, agent_id in enumerate(rest.pop("agentIds"))
+    ]
+    state["tasks"] = [
+        {"x": tasks[3 * i], "y": tasks[3 * i + 1], "label": label,
+         "completed": bool(tasks[3 * i + 2] & 1), "sabotaged": bool(tasks[3 * i + 2] & 2)}
+        for i, label in enumerate(rest.pop("taskLabels"))
+    ]
+    state.update(rest)
+    return state
+
+
+def encode(state: Dict[str, Any], encoding: str = JSON) -> Union[str, bytes]:
+    """
+    Serialize a game state.
+
+    Parameters:
+        state (dict): Game state, as built by send_game_state.
+        encoding (str): json (a text frame), binary or msgpack (binary frames).
+
+    Returns:
+        str | bytes: The encoded message.
+
+    Raises:
+        ValueError: If the state cannot be encoded, e.g. it lacks the fields of the binary layout.
+    """
+    try:
+        if encoding == BINARY:
+            return _encode_binary(state)
+        if encoding == MSGPACK and msgpack is not None:
+            return msgpack.packb(state, use_single_float=True)
+        return _dumps(state)
+    except MALFORMED as e:
+        raise ValueError(f"Cannot encode the game state as {encoding}: {e!r}") from e
+
+
+def decode(payload: Union[str, bytes]) -> Dict[str, Any]:
+    """
+    Deserialize a game state in any encoding, detected from the payload.
+
+    Raises:
+        ValueError: If the payload is malformed, truncated or in an unavailable encoding.
+    """
+    try:
+        if isinstance(payload, str):
+            return json.loads(payload)
+        if payload[:2] == MAGIC:
+            return _decode_binary(payload)
+        if msgpack is None:
+            raise ValueError("Payload is neither JSON nor the binary encoding, and msgpack is not installed")
+        return msgpack.unpackb(payload)
+    except MALFORMED as e:
+        raise ValueError(f"Cannot decode the game state: {e!r}") from e
+
+
+def negotiate(requested: str) -> str:
+    """Return the requested encoding if it is available, JSON otherwise."""
+    if requested in ENCODINGS:
+        return requested
+    if requested:
+        logger.warning(f"Encoding {requested} is not available, falling back to {JSON}")
+    return JSON
+
+
+def encoding_from_path(path: str) -> str:
+    """Return the encoding requested by a connection URL such as /?encoding=binary."""
+    requested = parse_qs(urlparse(path or "").query).get("encoding", [""])[0]
+    return negotiate(requested)
+
+
+def hello_encoding(message: Union[str, bytes]):
+    """Return the encoding requested by a hello message, or None if the message is not one."""
+    if not isinstance(message, str) or not message.startswith(HELLO_PREFIX):
+        return None
+    try:
+        requested = json.loads(message)["hello"].get("encoding", JSON)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        logger.warning(f"Ignoring malformed hello message: {message[:100]}")
+        return None
+    return negotiate(requested)
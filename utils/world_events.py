@@ -0,0 +1,66 @@
+import itertools
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from utils.logger import logger
+
+
+class WorldEventLog:
+    """
+    Shared layer for events witnessed by several agents at once.
+
+    A canonical description of the event is embedded and scored for importance
+    once. Every witness then receives its own wording of the event as a memory
+    that reuses the canonical embedding and importance, so a witnessed event
+    costs one embedding and one LLM call whatever the number of witnesses.
+
+    Attributes:
+        events (deque): The most recent events, newest last.
+    """
+
+    def __init__(self, history: int = 500):
+        self.events = deque(maxlen=history)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def record(self, canonical_text: str, witnesses: Dict[str, Tuple["AgentMemory", str]], now: Optional[datetime] = None) -> Optional[int]:
+        """
+        Record an event and fan it out to the memories of its witnesses.
+
+        Parameters:
+            canonical_text (str): Agent independent description of the event.
+            witnesses (dict): (memory, wording) pairs keyed by agent name.
+            now (datetime): Time of the event.
+
+        Returns:
+            int: The id of the event, or None if nobody witnessed it.
+        """
+        if not witnesses:
+            return None
+        with self._lock:
+            event_id = next(self._ids)
+        scorer = next(iter(witnesses.values()))[0]
+        importance_score = scorer._score_memory_importance(canonical_text)
+        retriever = scorer.memory_retriever
+        embeddings = getattr(retriever, "embeddings", None) or retriever.vectorstore.embeddings
+        embedding = embeddings.embed_documents([canonical_text])[0]
+
+        for agent_name, (memory, wording) in witnesses.items():
+            try:
+                memory.add_shared_memory(wording, embedding, importance_score, event_id=event_id, now=now, agent_name=agent_name)
+            except Exception as e:
+                logger.error(f"Failed to add event {event_id} to the memory of {agent_name}: {e}")
+
+        self.events.append({
+            "event_id": event_id,
+            "text": canonical_text,
+            "importance": importance_score,
+            "witnesses": list(witnesses),
+            "time": (now or datetime.now()).isoformat(),
+        })
+        return event_id
+
+
+world_events = WorldEventLog()
@@ -5,17 +5,21 @@ import random
 from utils.agent import Agent
 from langchain_core.language_models import BaseLanguageModel
 from utils.agentmemory import AgentMemory
+from utils.agent_state import AgentStateStore, StateField, agent_states, ARRIVAL_DISTANCE, SPEED
+from utils.walkability import walkability
 from dotenv import load_dotenv
 import os
+import numpy as np
 
 load_dotenv()
 
-SPEED = 2
-
 class Villager:
     """
     Represents a villager in the game.
 
+    Position, target, speed and status flags are views over the villager's
+    slot in an AgentStateStore, which moves every agent at once in `step`.
+
     Attributes:
         killed_villagers (list): List to keep track of killed villagers.
         agent_id (str): The ID of the villager.
@@ -34,6 +38,8 @@ class Villager:
         last_talk_attempt_time (float): The last time the villager attempted to talk.
         talking (bool): Indicates if the villager is currently talking.
         paths (list): The paths the villager can move on.
+        state (AgentStateStore): The store holding the villager's slot.
+        slot (int): The villager's index in the store.
         font (pygame.font.Font): The font used for rendering text.
         alive (bool): Indicates if the villager is alive.
         observation_countdown (float): Countdown timer for observations.
@@ -41,11 +47,20 @@ class Villager:
     """
 
     killed_villagers = []
+    completed_verb = "has completed"
 
-    def __init__(self, name, x, y, background_texts, llm: BaseLanguageModel, memory: AgentMemory, occupation="", meeting_location=(0, 0), paths=[]):
+    x = StateField("x")
+    y = StateField("y")
+    speed = StateField("speed")
+    alive = StateField("alive", bool)
+    talking = StateField("talking", bool)
+    task_doing = StateField("doing", bool)
+
+    def __init__(self, name, x, y, background_texts, llm: BaseLanguageModel, memory: AgentMemory, occupation="", meeting_location=(0, 0), paths=[],
+                 state: AgentStateStore = None):
         self.agent_id = name
-        self.x = x
-        self.y = y
+        self.state = state or agent_states
+        self.slot = self.state.allocate(x, y, SPEED, uses_paths=bool(paths))
         self.meeting_location = meeting_location
         self.background_texts = background_texts
         self.agent = Agent(name=name, status=occupation, memory=memory, llm=llm, description=background_texts)
@@ -60,10 +75,28 @@ class Villager:
         self.talking = False
         self.paths = paths
         self.font = pygame.font.SysFont(None, 24)
-        self.alive = True
         self.observation_countdown = time.time()
         self.location_observation_countdown = time.time()
 
+    @property
+    def current_task(self):
+        return self._current_task
+
+    @current_task.setter
+    def current_task(self, task):
+        self._current_task = task
+        self.state.tasked[self.slot] = task is not None
+
+    @property
+    def task_location(self):
+        if np.isnan(self.state.target_x[self.slot]):
+            return None
+        return (float(self.state.target_x[self.slot]), float(self.state.target_y[self.slot]))
+
+    @task_location.setter
+    def task_location(self, location):
+        self.state.set_target(self.slot, location)
+
     def assign_task(self, task, location, time_to_complete_task, task_complete_function):
         """
         Assign a task to the villager.
@@ -111,45 +144,22 @@ class Villager:
     def update(self):
         """
         Update the villager's state.
+
+        Movement towards the task happens for all agents at once in AgentStateStore.step,
+        called once per frame after every agent's update.
         """
         if not self.alive or self.talking:
             return
 
         if self.task_doing:
             if self.task_complete():
-                logger.info(f"{self.agent_id} has completed the task '{self.current_task}'!")
+                logger.info(f"{self.agent_id} {self.completed_verb} the task '{self.current_task}'!")
                 self.task_complete_function()
                 self.current_task = None
                 self.time_to_complete_task = None
                 self.task_doing = False
-        else:
-            if self.current_task is not None:
-                directions = [
-                    (0, -1), (0, 1), (-1, 0), (1, 0),
-                    (-1, -1), (-1, 1), (1, -1), (1, 1)
-                ]
-                current_distance = self.distance_to_target(self.x, self.y)
-                moved = False
-
-                for direction in directions:
-                    next_x = self.x + SPEED * direction[0]
-                    next_y = self.y + SPEED * direction[1]
-
-                    if self.distance_to_target(next_x, next_y) < current_distance:
-                        self.x = next_x
-                        self.y = next_y
-                        moved = True
-                        break
-
-                if not moved:
-                    next_x = self.x + SPEED
-                    next_y = self.y
-                    if self.is_on_path(next_x, next_y, self.paths):
-                        self.x = next_x
-                        self.y = next_y
-
-                if current_distance <= 2:
-                    self.start_task()
+        elif self.current_task is not None and self.distance_to_target(self.x, self.y) <= ARRIVAL_DISTANCE:
+            self.start_task()
 
     def is_on_path(self, x, y, paths):
         """
@@ -163,10 +173,9 @@ class Villager:
         Returns:
             bool: True if the coordinates are on a path, False otherwise.
         """
-        for path in paths:
-            if path.rect.collidepoint(x, y):
-                return True
-        return False
+        if not paths:
+            return False
+        return walkability.ensure(paths).is_walkable(x, y)
 
     def distance_to_target(self, x, y):
         """
@@ -218,54 +227,13 @@ class Werewolf(Villager):
         kill_cooldown (float): Cooldown timer for the werewolf's kill ability.
     """
 
-    def __init__(self, agent_id, x, y, background_texts, llm: BaseLanguageModel, memory: AgentMemory, occupation="", meeting_location=(0, 0)):
-        super().__init__(agent_id, x, y, background_texts, llm, memory, occupation, meeting_location)
+    completed_verb = "(Werewolf) sabotaged"
+
+    def __init__(self, agent_id, x, y, background_texts, llm: BaseLanguageModel, memory: AgentMemory, occupation="", meeting_location=(0, 0), paths=[]):
+        super().__init__(agent_id, x, y, background_texts, llm, memory, occupation, meeting_location, paths=paths)
         self.is_werewolf = True
         self.kill_cooldown = time.time()
 
-    def update(self):
-        """
-        Update the werewolf's state.
-        """
-        if self.talking:
-            return
-
-        if self.task_doing:
-            if self.task_complete():
-                logger.info(f"{self.agent_id} (Werewolf) sabotaged the task '{self.current_task}'!")
-                self.task_complete_function()
-                self.current_task = None
-                self.time_to_complete_task = None
-                self.task_doing = False
-        else:
-            if self.current_task is not None:
-                directions = [
-                    (0, -1), (0, 1), (-1, 0), (1, 0),
-                    (-1, -1), (-1, 1), (1, -1), (1, 1)
-                ]
-                current_distance = self.distance_to_target(self.x, self.y)
-                moved = False
-
-                for direction in directions:
-                    next_x = self.x + SPEED * direction[0]
-                    next_y = self.y + SPEED * direction[1]
-
-                    if self.distance_to_target(next_x, next_y) < current_distance :
-                        self.x = next_x
-                        self.y = next_y
-                        moved = True
-                        break
-
-                if not moved:
-                    next_x = self.x + SPEED
-                    next_y = self.y
-                    if self.is_on_path(next_x, next_y, self.paths):
-                        self.x = next_x
-                        self.y = next_y
-
-                if current_distance <= 2:
-                    self.start_task()
-
 # Player class update to handle team tasks
 class Player(Villager):
     """
@@ -278,12 +246,16 @@ class Player(Villager):
 
     def __init__(self, name, x, y, background_texts, llm: BaseLanguageModel, memory: AgentMemory, occupation="", meeting_location=(0, 0), paths=[], is_werewolf=False):
         super().__init__(name, x, y, background_texts, llm, memory, occupation, meeting_location, paths=paths)
-        self.speed = 2
+        self.speed = SPEED
         self.is_werewolf = is_werewolf
 
     def handle_input(self):
         """
         Handle player input for movement.
+
+        The player stays on the paths, sliding along their edges. A player
+        who is off the paths, e.g. after walking to a task, may move anywhere
+        until back on them.
         """
         if not self.alive:
             return
@@ -297,6 +269,16 @@ class Player(Villager):
             dy -= self.speed
         if keys[pygame.K_DOWN]:
             dy += self.speed
+        if not dx and not dy:
+            return
+        if self.paths and self.is_on_path(self.x, self.y, self.paths):
+            # try the full move, then each axis alone
+            for step_x, step_y in ((dx, dy), (dx, 0), (0, dy)):
+                if (step_x or step_y) and self.is_on_path(self.x + step_x, self.y + step_y, self.paths):
+                    dx, dy = step_x, step_y
+                    break
+            else:
+                return
         self.x += dx
         self.y += dy
 
@@ -308,7 +290,7 @@ class Player(Villager):
         super().update()
 
         # Check if near a task location to complete it
-        if self.current_task is not None and not self.task_doing and self.distance_to_target(self.x, self.y) <= 2:
+        if self.current_task is not None and not self.task_doing and self.distance_to_target(self.x, self.y) <= ARRIVAL_DISTANCE:
             self.start_task()
 
     def distance_to_task(self, x, y):